@@ -1,12 +1,44 @@
+import asyncio
+from contextlib import asynccontextmanager
+import warmup  # first: marks the start of the app import for cold-start timing
 from fastapi import FastAPI, Depends, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, JSONResponse
+from typing import List, Literal, Optional
 from pydantic import BaseModel
 from auth.routes import router as auth_router
-from auth.utils import verify_token
+from auth.utils import verify_token, shutdown_hash_pool
 from chat.routes import router as chat_router
-from retrieval.retriever import answer_query
+from chat.store import store
+from retrieval.retriever import answer_query, answer_events, on_snapshot_swapped, run_blocking, watch_corpus
+from retrieval.snapshot import sync_forever
+from retrieval.batch import answer_batch_events
+from config import settings
+from sse import event_stream
+from metrics import REGISTRY, MetricsMiddleware
+from database.connection import close_pool
 
-app = FastAPI(title="Smart Research Backend", version="1.0")
+
+@asynccontextmanager
+async def lifespan(app):
+    # warm up in the background: /health answers at once, /ready after warmup
+    tasks = [asyncio.ensure_future(warmup.warm_up())]
+    if settings.SNAPSHOT_DIR and settings.SNAPSHOT_SYNC_INTERVAL > 0:
+        # follow (and, on one worker, publish) new corpus snapshots
+        tasks.append(asyncio.ensure_future(sync_forever(run_blocking, on_snapshot_swapped)))
+    elif not settings.SNAPSHOT_DIR and settings.CORPUS_POLL_INTERVAL > 0:
+        # no snapshots: notice corpus updates made by other processes
+        tasks.append(asyncio.ensure_future(watch_corpus()))
+    yield
+    for task in tasks:
+        task.cancel()
+    # push queued chat messages / titles before the worker exits
+    store.writer.close()
+    shutdown_hash_pool()
+    close_pool()
+
+
+app = FastAPI(title="Smart Research Backend", version="1.0", lifespan=lifespan)
 
 # ----------------------
 # CORS
@@ -17,7 +49,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "ETag", "X-Next-Cursor"],
 )
+app.add_middleware(MetricsMiddleware)
 
 # ----------------------
 # JWT Dependency
@@ -46,6 +80,17 @@ class AnswerRequest(BaseModel):
     query: str
     mode: str = "simple"
     domain: str = "all"
+    # deep mode only; defaults to DEEP_SUMMARY_STRATEGY
+    summary_strategy: Optional[Literal["structured", "extractive", "two_call"]] = None
+
+class BatchQuery(BaseModel):
+    query: str
+    domain: Optional[str] = None  # defaults to the batch's domain
+
+class BatchAnswerRequest(BaseModel):
+    queries: List[BatchQuery]
+    mode: str = "simple"
+    domain: str = "all"
 
 # ----------------------
 # Endpoints
@@ -53,17 +98,48 @@ class AnswerRequest(BaseModel):
 @app.post("/answer")
 async def answer(req: AnswerRequest, user=Depends(require_token)):
     return await answer_query({
-        "query": req.query,
+        "Actualquery": req.query,
         "mode": req.mode,
-        "domain": req.domain
+        "domain": req.domain,
+        "summary_strategy": req.summary_strategy
     })
 
+@app.post("/answer/stream")
+async def answer_stream(req: AnswerRequest, user=Depends(require_token)):
+    return event_stream(answer_events({
+        "Actualquery": req.query,
+        "mode": req.mode,
+        "domain": req.domain,
+        "summary_strategy": req.summary_strategy
+    }))
+
+@app.post("/answer/batch")
+async def answer_batch(req: BatchAnswerRequest, user=Depends(require_token)):
+    # one SSE "result" event per query as it finishes, then "done"
+    if not req.queries:
+        raise HTTPException(400, "queries must not be empty")
+    if len(req.queries) > settings.BATCH_MAX_QUERIES:
+        raise HTTPException(413, f"at most {settings.BATCH_MAX_QUERIES} queries per batch")
+    items = [{"query": q.query, "domain": q.domain or req.domain} for q in req.queries]
+    return event_stream(answer_batch_events(items, req.mode))
+
 
 
 @app.get("/")
 def home():
     return {"status": "Smart Research Backend Running!"}
 
+@app.get("/metrics")
+def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 def health():
     return {"status": "API is running"}
+
+@app.get("/ready")
+def ready():
+    # readiness: 503 until clients are built and the indexes are loaded
+    status = "ready" if warmup.state["ready"] else "warming_up"
+    return JSONResponse({"status": status, **warmup.state}, status_code=200 if warmup.state["ready"] else 503)
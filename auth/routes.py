@@ -1,24 +1,32 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from auth.models import SignupModel, LoginModel
-from auth.utils import hash_password, verify_password, create_token
+from auth.utils import hash_password_async, verify_password_async, create_token, AuthBusy
 from supabaseclient import get_client
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 @router.post("/signup")
-def signup(data: SignupModel):
+async def signup(data: SignupModel):
     supabase = get_client()
-    existing = supabase.table("users").select("id").eq("email", data.email).execute()
+    existing = await run_in_threadpool(
+        supabase.table("users").select("id").eq("email", data.email).execute
+    )
 
     if existing.data:
         raise HTTPException(400, "Email already registered")
 
-    hashed = hash_password(data.password)
-    result = supabase.table("users").insert({
-        "name": data.name,
-        "email": data.email,
-        "password_hash": hashed
-    }).execute()
+    try:
+        hashed = await hash_password_async(data.password)
+    except AuthBusy:
+        raise HTTPException(503, "Too many signup requests, please retry")
+    result = await run_in_threadpool(
+        supabase.table("users").insert({
+            "name": data.name,
+            "email": data.email,
+            "password_hash": hashed
+        }).execute
+    )
 
     if not result.data:
         raise HTTPException(500, "Failed to create user")
@@ -30,10 +38,12 @@ def signup(data: SignupModel):
     return {"message": "Signup successful", "token": token}
 
 @router.post("/login")
-def login(data: LoginModel):
+async def login(data: LoginModel):
     supabase = get_client()
 
-    result = supabase.table("users").select("*").eq("email", data.email).execute()
+    result = await run_in_threadpool(
+        supabase.table("users").select("*").eq("email", data.email).execute
+    )
 
     if not result.data:
         raise HTTPException(400, "Invalid email or password")
@@ -41,7 +51,11 @@ def login(data: LoginModel):
     user = result.data[0]
     
 
-    if not verify_password(data.password, user["password_hash"]):
+    try:
+        valid = await verify_password_async(data.password, user["password_hash"])
+    except AuthBusy:
+        raise HTTPException(503, "Too many login requests, please retry")
+    if not valid:
         raise HTTPException(400, "Invalid email or password")
 
     token = create_token(user["id"], user["email"])
@@ -1,13 +1,83 @@
+import asyncio
+import hashlib
+import multiprocessing
+import threading
+import time
 import bcrypt
+from concurrent.futures import ProcessPoolExecutor
 from jose import jwt
 from datetime import datetime, timedelta
+from cache import TTLCache
 from config import settings
+from metrics import REGISTRY
+
+
+class AuthBusy(Exception):
+    """Too many password hashes queued; the caller should retry later."""
+
+
+def _hashpw(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _checkpw(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
 
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    return _hashpw(password.encode(), settings.BCRYPT_ROUNDS).decode()
 
 def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode(), hashed.encode())
+    return _checkpw(password.encode(), hashed.encode())
+
+
+# bcrypt runs in its own bounded process pool: a login burst costs CPU
+# there instead of starving the threadpool the sync endpoints share
+_pool = None
+_pool_lock = threading.Lock()
+_pending = 0
+
+
+def get_hash_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=settings.AUTH_HASH_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pool
+
+
+async def _run_hash(fn, *args):
+    """Admission-limited call into the hash pool (raises AuthBusy when full)."""
+    global _pending
+    if _pending >= settings.AUTH_MAX_PENDING:
+        raise AuthBusy()
+    _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_hash_pool(), fn, *args)
+    finally:
+        _pending -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    return (await _run_hash(_hashpw, password.encode(), settings.BCRYPT_ROUNDS)).decode()
+
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    return await _run_hash(_checkpw, password.encode(), hashed.encode())
+
+
+def shutdown_hash_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
 
 def create_token(user_id: int, email: str):
     payload = {
@@ -17,5 +87,23 @@ def create_token(user_id: int, email: str):
     }
     return jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALGO)
 
+
+_verified = TTLCache(maxsize=settings.TOKEN_CACHE_SIZE, ttl=settings.TOKEN_CACHE_TTL)
+REGISTRY.register_cache("token", _verified.stats)
+
+
 def verify_token(token: str):
-    return jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGO])
+    """Decode + verify a JWT; verified claims are cached until min(TTL, exp)."""
+    key = hashlib.sha256(token.encode()).digest()
+    claims = _verified.get(key)
+    if claims is not None:
+        return dict(claims)
+
+    claims = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGO])
+    exp = claims.get("exp")
+    ttl = settings.TOKEN_CACHE_TTL
+    if exp is not None:
+        ttl = min(ttl, float(exp) - time.time())
+    if ttl > 0:
+        _verified.set(key, dict(claims), ttl=ttl)
+    return claims
@@ -1,32 +1,194 @@
 
 
+import re
+import threading
+import time
+from collections import Counter
 import requests
 import os
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
+from cache import TTLCache
+from config import settings, DOMAINS
+from logs import get_logger, error_fields
+from metrics import REGISTRY
+from retrieval.llm import get_chat_model
 
 load_dotenv()
 
+WORD_RE = re.compile(r"[a-z]+")
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+MIN_WORD_LEN = 3  # shorter tokens are never sent for correction
+MIN_FIX_COUNT = 3  # corpus occurrences a local fix needs (rarer words may be typos themselves)
+FIX_LEAD = 3.0     # ... and how many times more frequent than the next candidate
+VOCAB_RETRY_S = 30  # wait before re-fetching the corpus after a failed load
+
+_vocab = Counter()
+_vocab_ready = False
+_vocab_lock = threading.Lock()
+_load_lock = threading.Lock()
+_generation = 0      # bumped by invalidate_vocabulary()
+_retry_at = 0.0
+
+_corrections = TTLCache(
+    maxsize=settings.AUTOCORRECT_CACHE_SIZE,
+    ttl=settings.AUTOCORRECT_CACHE_TTL,
+)
+REGISTRY.register_cache("autocorrect", _corrections.stats)
+
+log = get_logger("autocorrect")
+
+
+def tokenize(text: str):
+    return WORD_RE.findall(text.lower())
+
+
+def build_vocabulary(texts, ready: bool = True, generation: int = None):
+    """
+    Replace the local dictionary with word counts from the given texts + DOMAINS.
+    Not marked ready when the corpus changed (generation) while it was built.
+    """
+    global _vocab, _vocab_ready
+    vocab = Counter()
+    for text in texts:
+        if text:
+            vocab.update(tokenize(text))
+    for d in DOMAINS:
+        vocab.update(tokenize(d))
+    with _vocab_lock:
+        _vocab = vocab
+        _vocab_ready = ready and generation in (None, _generation)
+    log.info("vocabulary loaded", words=len(vocab), ready=_vocab_ready)
+
+
+def load_vocabulary():
+    """Build the dictionary from papers.enriched_text and titles (once per corpus version)."""
+    global _retry_at
+    if _vocab_ready or time.monotonic() < _retry_at:
+        return
+    # only one thread downloads the corpus; a stale dictionary keeps
+    # serving while it is rebuilt, an empty one waits for the load
+    if not _load_lock.acquire(blocking=not _vocab):
+        return
+    try:
+        if _vocab_ready or time.monotonic() < _retry_at:
+            return
+        from supabaseclient import get_client
+        from retrieval.index import fetch_papers
+
+        generation = _generation
+        try:
+            rows = fetch_papers(get_client(), columns="title, enriched_text")
+        except Exception as e:
+            log.warning("vocabulary load failed", retry_s=VOCAB_RETRY_S, **error_fields(e))
+            _retry_at = time.monotonic() + VOCAB_RETRY_S
+            if not _vocab:
+                # domain words only until the corpus can be fetched
+                build_vocabulary([], ready=False)
+            return
+        texts = [r.get("title") for r in rows] + [r.get("enriched_text") for r in rows]
+        build_vocabulary(texts, generation=generation)
+    finally:
+        _load_lock.release()
+
+
+def invalidate_vocabulary():
+    """Corpus changed: rebuild on next use (the current dictionary serves meanwhile)."""
+    global _vocab_ready, _generation, _retry_at
+    with _vocab_lock:
+        _generation += 1
+        _vocab_ready = False
+        _retry_at = 0.0
+
+
+def edits1(word: str):
+    splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    deletes = [a + b[1:] for a, b in splits if b]
+    transposes = [a + b[1] + b[0] + b[2:] for a, b in splits if len(b) > 1]
+    replaces = [a + c + b[1:] for a, b in splits if b for c in LETTERS]
+    inserts = [a + c + b for a, b in splits for c in LETTERS]
+    return set(deletes + transposes + replaces + inserts)
+
+
+def match_case(word: str, original: str) -> str:
+    """word with the letter case of original, position by position ("berts", "BERTz" -> "BERTs")."""
+    if original.isupper():
+        return word.upper()
+    out = []
+    for i, ch in enumerate(word):
+        ref = original[min(i, len(original) - 1)]
+        out.append(ch.upper() if ref.isupper() else ch)
+    return "".join(out)
+
+
+def local_fix(word: str):
+    """
+    The edit-distance-1 dictionary word for an unknown token, or None when
+    no candidate is frequent enough and clearly ahead of the others (the
+    token may be a valid term missing from the corpus: leave it to the LLM).
+    """
+    counts = sorted((_vocab[w] for w in edits1(word) if w in _vocab), reverse=True)
+    if not counts or counts[0] < MIN_FIX_COUNT:
+        return None
+    if len(counts) > 1 and counts[0] < FIX_LEAD * counts[1]:
+        return None
+    return max((w for w in edits1(word) if w in _vocab), key=_vocab.__getitem__)
+
+
+def local_correct(query: str):
+    """
+    Tier 1: dictionary + edit-distance check.
+    Returns the query unchanged when every token is known, a locally
+    corrected query when each unknown token has a clear edit-distance-1
+    match, or None when the LLM is needed.
+    """
+    if not _vocab:
+        return None
+
+    fixes = {}
+    for word in set(tokenize(query)):
+        if len(word) < MIN_WORD_LEN or word in _vocab:
+            continue
+        fix = local_fix(word)
+        if fix is None:
+            return None
+        fixes[word] = fix
+
+    if not fixes:
+        return query
+    return re.sub(
+        r"[A-Za-z]+",
+        lambda m: match_case(fixes[m.group(0).lower()], m.group(0)) if m.group(0).lower() in fixes else m.group(0),
+        query,
+    )
+
+
 def gemini_autocorrect(query: str) -> str:
     """
-    Uses LangChain ChatGoogleGenerativeAI for autocorrection
+    Tiered autocorrection: local dictionary, then cached results,
+    then LangChain ChatGoogleGenerativeAI for whatever is left.
     """
+    load_vocabulary()
+
+    local = local_correct(query)
+    if local is not None:
+        return local
+
+    key = " ".join(query.split()).lower()
+    cached = _corrections.get(key)
+    if cached is not None:
+        return cached
+
     try:
-        print(f"\n[Gemini] Attempting correction for: '{query}'")
-        
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash-lite"
-        )
-        
         prompt = f"Correct spelling and grammar: '{query}' Return ONLY the corrected text."
-        response = llm.invoke(prompt)
+        response = get_chat_model().invoke(prompt)
         corrected = response.content.strip()
-        
-        print(f"[Gemini] Corrected: '{corrected}'")
+
+        log.debug("llm correction", query=query, corrected=corrected)
+        _corrections.set(key, corrected)
         return corrected
-        
+
     except Exception as e:
-        print(f"[Gemini] Exception: {type(e).__name__}: {str(e)}")
+        log.warning("llm correction failed", **error_fields(e))
         return query
 
 
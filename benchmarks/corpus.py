@@ -0,0 +1,140 @@
+"""
+Synthetic papers corpus (1k - 1M rows) across the four DOMAINS.
+
+Every domain has a handful of topics; a paper's title and enriched_text draw
+from its topic's vocabulary and its embedding is the topic centroid plus
+noise. TopicEmbeddings embeds text the same way, so generated queries land
+on the right papers for both the vector and the BM25 path.
+"""
+import hashlib
+import time
+import numpy as np
+from config import DOMAINS
+
+FILLER = ["method", "results", "analysis", "proposed", "evaluation", "performance",
+          "approach", "framework", "experimental", "model", "data", "study"]
+
+
+class SyntheticCorpus:
+    def __init__(self, topics_per_domain: int = 8, words_per_topic: int = 12,
+                 dim: int = 768, doc_noise: float = 0.5, seed: int = 0):
+        self.dim = dim
+        self.doc_noise = doc_noise
+        self.rng = np.random.default_rng(seed)
+        self.domains = sorted(DOMAINS)
+
+        self.topics = []        # [(domain, [words])]
+        self.word_topic = {}
+        for d, domain in enumerate(self.domains):
+            for t in range(topics_per_domain):
+                topic = len(self.topics)
+                words = [f"d{d}t{t}w{j}" for j in range(words_per_topic)]
+                self.topics.append((domain, words))
+                for w in words:
+                    self.word_topic[w] = topic
+
+        centroids = self.rng.standard_normal((len(self.topics), dim)).astype(np.float32)
+        self.centroids = centroids / np.linalg.norm(centroids, axis=1, keepdims=True)
+
+    def _noisy(self, topic_ids, scale: float, rng):
+        noise = rng.standard_normal((len(topic_ids), self.dim)).astype(np.float32)
+        vecs = self.centroids[topic_ids] + noise * (scale / np.sqrt(self.dim))
+        return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+    def _text(self, topic: int, n_words: int, rng):
+        _, words = self.topics[topic]
+        picks = rng.integers(0, len(words), n_words)
+        filler = rng.integers(0, len(FILLER), n_words // 3)
+        return " ".join([words[i] for i in picks] + [FILLER[i] for i in filler])
+
+    def _body(self, topic: int, text_words: int, paragraphs: int, rng):
+        """Paragraphs on the paper's topic, with some drifting to a sibling topic."""
+        if paragraphs <= 1:
+            return self._text(topic, text_words, rng)
+        siblings = [t for t, (d, _) in enumerate(self.topics) if d == self.topics[topic][0]]
+        words = text_words // paragraphs
+        parts = [
+            self._text(topic if j == 0 or rng.random() < 0.5 else int(rng.choice(siblings)), words, rng)
+            for j in range(paragraphs)
+        ]
+        return "\n\n".join(parts)
+
+    def papers(self, n: int, text_words: int = 60, chunk: int = 50000, start_id: int = 0,
+               paragraphs: int = 1):
+        """Yield n paper rows shaped like the Supabase papers table."""
+        produced = 0
+        while produced < n:
+            size = min(chunk, n - produced)
+            topic_ids = self.rng.integers(0, len(self.topics), size)
+            vectors = self._noisy(topic_ids, self.doc_noise, self.rng)
+            for i, topic in enumerate(topic_ids):
+                pid = start_id + produced + i
+                yield {
+                    "paperid": pid,
+                    "title": self._text(topic, 6, self.rng),
+                    "authors": [f"Author {pid % 997}", f"Author {pid % 991}"],
+                    "year": 2000 + pid % 25,
+                    "enriched_text": self._body(topic, text_words, paragraphs, self.rng),
+                    "domain": self.topics[topic][0],
+                    "embedding": vectors[i],
+                }
+            produced += size
+
+    def queries(self, n: int, words: int = 4, seed: int = 1):
+        """[(query text, domain)] with one topic per query."""
+        rng = np.random.default_rng(seed)
+        out = []
+        for _ in range(n):
+            topic = int(rng.integers(0, len(self.topics)))
+            out.append((self._text(topic, words, rng), self.topics[topic][0]))
+        return out
+
+    def embed(self, text: str, noise: float = 0.3):
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+        rng = np.random.default_rng(seed)
+        topics = [self.word_topic[w] for w in text.lower().split() if w in self.word_topic]
+        if not topics:
+            v = rng.standard_normal(self.dim).astype(np.float32)
+            return v / np.linalg.norm(v)
+        base = self.centroids[topics].mean(axis=0)
+        v = base / np.linalg.norm(base) + rng.standard_normal(self.dim).astype(np.float32) * (noise / np.sqrt(self.dim))
+        return v / np.linalg.norm(v)
+
+
+class TopicEmbeddings:
+    """Embedding-model stand-in that agrees with a SyntheticCorpus."""
+
+    def __init__(self, corpus: SyntheticCorpus, latency: float = 0.0):
+        self.corpus = corpus
+        self.latency = latency
+        self.calls = 0
+
+    def embed_query(self, text: str):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return self.corpus.embed(text).tolist()
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [self.corpus.embed(t).tolist() for t in texts]
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Write a synthetic papers corpus as JSONL")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("out")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = SyntheticCorpus(dim=args.dim, seed=args.seed)
+    with open(args.out, "w", encoding="utf-8") as f:
+        for row in corpus.papers(args.rows):
+            row["embedding"] = row["embedding"].round(6).tolist()
+            f.write(json.dumps(row) + "\n")
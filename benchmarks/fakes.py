@@ -0,0 +1,306 @@
+"""
+Offline stand-ins for Supabase, the embedding model, the LLM providers and
+Tavily, each with configurable latency and payload size. install() swaps them
+into the running app so benchmarks never touch the network.
+"""
+import asyncio
+import itertools
+import operator
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from ingestion.embedder import FakeEmbeddings
+
+# import-time client construction needs *some* credentials
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "offline-benchmark")
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+os.environ.setdefault("TAVILY_API_KEY", "offline-benchmark")
+os.environ.setdefault("JWT_SECRET", "offline-benchmark")
+
+
+OPS = {"eq": operator.eq, "lt": operator.lt, "gt": operator.gt, "lte": operator.le, "gte": operator.ge}
+
+
+def _split_top(expr: str):
+    """Split a PostgREST logic expression on commas outside parentheses / quotes."""
+    parts, depth, quoted, current = [], 0, False, ""
+    for ch in expr:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch in "()":
+            depth += 1 if ch == "(" else -1
+        elif not quoted and ch == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        current += ch
+    return parts + [current]
+
+
+def _condition(expr: str):
+    """'a.lt.1', 'and(a.eq.1,b.lt.2)' -> predicate(row)."""
+    m = re.fullmatch(r"(and|or)\((.*)\)", expr)
+    if m:
+        preds = [_condition(p) for p in _split_top(m.group(2))]
+        combine = all if m.group(1) == "and" else any
+        return lambda row: combine(p(row) for p in preds)
+    column, op, value = expr.split(".", 2)
+    value = value.strip('"')
+
+    def pred(row):
+        current = row.get(column)
+        if isinstance(current, (int, float)) and not isinstance(current, bool):
+            return OPS[op](current, type(current)(value))
+        return OPS[op](str(current), value)
+    return pred
+
+
+class Result:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+    """The slice of the postgrest query builder this codebase uses."""
+
+    def __init__(self, db, table: str):
+        self.db = db
+        self.table = table
+        self.columns = None
+        self.filters = []
+        self.order_by = []
+        self.window = None
+        self.op = "select"
+        self.payload = None
+        self.negate = False
+        self.count = None
+
+    def select(self, columns: str = "*", count: str = None):
+        self.columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+        self.count = count
+        return self
+
+    @property
+    def not_(self):
+        self.negate = True
+        return self
+
+    def _filter(self, predicate):
+        negate, self.negate = self.negate, False
+        self.filters.append((lambda row: not predicate(row)) if negate else predicate)
+        return self
+
+    def eq(self, column, value):
+        return self._filter(lambda row: str(row.get(column)) == str(value))
+
+    def in_(self, column, values):
+        values = {str(v) for v in values}
+        return self._filter(lambda row: str(row.get(column)) in values)
+
+    def gte(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and str(row[column]) >= str(value))
+
+    def is_(self, column, value):
+        return self._filter(lambda row: row.get(column) is value)
+
+    def or_(self, expr: str):
+        return self._filter(_condition(f"or({expr})"))
+
+    def order(self, column, desc: bool = False):
+        self.order_by.append((column, desc))
+        return self
+
+    def limit(self, n: int):
+        self.window = (0, n)
+        return self
+
+    def range(self, start: int, end: int):
+        self.window = (start, end - start + 1)
+        return self
+
+    def insert(self, rows):
+        self.op, self.payload = "insert", rows
+        return self
+
+    def upsert(self, rows, **kwargs):
+        self.op, self.payload = "insert", rows
+        return self
+
+    def update(self, fields: dict):
+        self.op, self.payload = "update", fields
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def _match(self, row):
+        return all(predicate(row) for predicate in self.filters)
+
+    def execute(self):
+        if self.db.latency:
+            time.sleep(self.db.latency)
+        with self.db.lock:
+            rows = self.db.tables.setdefault(self.table, [])
+            if self.op == "insert":
+                new = self.payload if isinstance(self.payload, list) else [self.payload]
+                created = []
+                for row in new:
+                    row = {"id": next(self.db.ids), "created_at": datetime.now(timezone.utc).isoformat(), **row}
+                    rows.append(row)
+                    created.append(row)
+                return Result(created)
+            matched = [r for r in rows if self._match(r)]
+            if self.op == "update":
+                for r in matched:
+                    r.update(self.payload)
+                return Result(matched)
+            if self.op == "delete":
+                self.db.tables[self.table] = [r for r in rows if not self._match(r)]
+                return Result(matched)
+
+        for column, desc in reversed(self.order_by):
+            matched.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+        total = len(matched) if self.count else None
+        if self.window:
+            start, n = self.window
+            matched = matched[start:start + n]
+        if self.columns:
+            matched = [{c: r.get(c) for c in self.columns} for r in matched]
+        return Result(matched, total)
+
+
+class FakeSupabase:
+    """In-memory tables behind the supabase-py builder API."""
+
+    def __init__(self, tables=None, latency: float = 0.0):
+        self.tables = tables or {}
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+
+    def table(self, name: str):
+        return FakeQuery(self, name)
+
+
+class FakeMessage:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeChatModel:
+    """Sync/async LangChain-style chat model (get_chat_model().invoke)."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def invoke(self, prompt):
+        if self.latency:
+            time.sleep(self.latency)
+        # autocorrect: echo the quoted query back unchanged
+        start, end = prompt.find("'"), prompt.rfind("'")
+        return FakeMessage(prompt[start + 1:end] if end > start else prompt)
+
+
+class FakeLLM:
+    """
+    LLMProvider stand-in: complete() after latency seconds, stream() yields
+    tokens words after ttft seconds at token_interval spacing (plus a
+    conclusion section when the prompt asks for one). Both add
+    prefill_per_token seconds per (estimated) prompt token.
+    """
+
+    def __init__(self, latency: float = 0.5, ttft: float = 0.2, tokens: int = 200,
+                 token_interval: float = 0.002, prefill_per_token: float = 0.0):
+        self.latency = latency
+        self.ttft = ttft
+        self.tokens = tokens
+        self.token_interval = token_interval
+        self.prefill_per_token = prefill_per_token
+        self.gemini = FakeChatModel(latency=min(latency, 0.05))
+        self.calls = 0
+
+    def _prefill(self, prompt: str) -> float:
+        return self.prefill_per_token * len(prompt) / 4
+
+    def _text(self, n: int) -> str:
+        return " ".join(f"word{i % 50}" for i in range(n)) + "."
+
+    async def complete(self, prompt: str, timeout: float = None) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.latency + self._prefill(prompt))
+        if "Latest question:" in prompt:
+            # standalone rewrite: hand the question back unchanged
+            return prompt.split("Latest question:", 1)[1].split("\n", 1)[0].strip()
+        return self._text(min(self.tokens, 60))
+
+    async def stream(self, prompt: str, timeout: float = None):
+        self.calls += 1
+        await asyncio.sleep(self.ttft + self._prefill(prompt))
+        for i in range(self.tokens):
+            if self.token_interval:
+                await asyncio.sleep(self.token_interval)
+            yield f"word{i % 50} "
+        if "### Conclusion" in prompt:
+            yield "### Conclusion fake summary."
+
+    def stats(self):
+        return {"calls": self.calls}
+
+
+class FakeTavily:
+    """TavilySearchResults stand-in: results results of snippet_chars each."""
+
+    def __init__(self, latency: float = 0.3, results: int = 4, snippet_chars: int = 600):
+        self.latency = latency
+        self.results = results
+        self.snippet_chars = snippet_chars
+        self.calls = 0
+
+    async def ainvoke(self, query: str):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        snippet = (query + " ") * (self.snippet_chars // (len(query) + 1) + 1)
+        return [
+            {"title": f"Result {i} for {query}", "url": f"https://example.org/{i}", "content": snippet[:self.snippet_chars]}
+            for i in range(self.results)
+        ]
+
+
+def install(papers, embeddings=None, db_latency: float = 0.002,
+            llm: FakeLLM = None, tavily: FakeTavily = None):
+    """
+    Point the app at the fakes. papers are rows as produced by
+    SyntheticCorpus.papers; embeddings defaults to FakeEmbeddings (use
+    TopicEmbeddings so queries match the corpus). Returns the FakeSupabase.
+    """
+    import supabaseclient
+    import retrieval.llm
+    import retrieval.retriever as retriever
+    from retrieval.embedding_cache import CachedEmbeddings
+    from retrieval.index import invalidate_index
+    from retrieval.web_search import web_cache
+    from config import settings
+
+    db = FakeSupabase({"papers": list(papers)}, latency=db_latency)
+    supabaseclient.supabase = db
+
+    retriever.model = CachedEmbeddings(
+        embeddings or FakeEmbeddings(),
+        model_name="fake",
+        maxsize=settings.EMBED_CACHE_SIZE,
+        ttl=settings.EMBED_CACHE_TTL,
+    )
+    retrieval.llm._provider = llm or FakeLLM()
+
+    fake_tavily = tavily or FakeTavily()
+    web_cache.tool = lambda k: fake_tavily
+    web_cache.results.clear()
+
+    invalidate_index()
+    retriever.answer_cache.invalidate()
+    return db
@@ -0,0 +1,129 @@
+"""
+IVF coarse index against the exact scan: recall@k and latency per nprobe,
+for domain-filtered and "all" queries (with and without domain routing),
+plus recall after inserting papers into an already trained index. A share
+of the papers has no domain (None), as group_by_domain allows.
+
+    python -m benchmarks.ivf --rows 100000 --nprobe 1 2 4 8 16 32 --out ivf.json
+"""
+import time
+import numpy as np
+from benchmarks.corpus import SyntheticCorpus
+from benchmarks.report import percentiles, emit
+from config import settings
+
+
+def _run(search, queries):
+    samples, hits = [], []
+    for q, domain in queries:
+        t = time.perf_counter()
+        rows = search(q, domain)
+        samples.append(time.perf_counter() - t)
+        hits.append([r[4] for r in rows])
+    return samples, hits
+
+
+def _recall(exact, approx):
+    found = sum(len(set(e) & set(a)) for e, a in zip(exact, approx))
+    total = sum(len(e) for e in exact)
+    return round(found / total, 4) if total else 1.0
+
+
+def bench(corpus, rows: int, n_queries: int, nprobes, k: int, min_sim: float, insert_frac: float,
+          no_domain_frac: float = 0.0):
+    from retrieval.index import PaperIndex
+    from retrieval.ivf import IVFIndex
+    from retrieval.snapshot import carry_ivf
+
+    papers = list(corpus.papers(rows))
+    no_domain = int(rows * no_domain_frac)
+    for paper in papers[:no_domain]:
+        paper["domain"] = None
+    index = PaperIndex(papers, quantization="none")
+    t = time.perf_counter()
+    index.ivf = IVFIndex.train(index.matrix, index.slices)
+    result = {"rows": rows, "no_domain_rows": no_domain, "lists": len(index.ivf),
+              "train_s": round(time.perf_counter() - t, 3), "ivf_bytes": index.ivf.nbytes(), "runs": []}
+
+    texts = corpus.queries(n_queries, seed=7)
+    embedded = [(corpus.embed(text), domain) for text, domain in texts]
+    cases = {
+        "domain": embedded,
+        "all": [(q, "all") for q, _ in embedded],
+    }
+    routed = sum(1 for q, d in embedded if index.ivf.route(index._unit(q)) == d)
+    result["routing_accuracy"] = round(routed / len(embedded), 4)
+
+    for case, queries in cases.items():
+        ivf, index.ivf = index.ivf, None
+        exact_samples, exact_hits = _run(lambda q, d: index.search(q, d, k, min_sim), queries)
+        index.ivf = ivf
+        result["runs"].append({"case": case, "nprobe": "exact", "recall": 1.0,
+                               "latency": percentiles(exact_samples)})
+        for nprobe in nprobes:
+            for margin in ([0.05, -1.0] if case == "all" else [None]):
+                samples, hits = _run(
+                    lambda q, d: _ivf_search(index, q, d, k, min_sim, nprobe, margin), queries
+                )
+                run = {"case": case, "nprobe": nprobe, "recall": _recall(exact_hits, hits),
+                       "latency": percentiles(samples)}
+                if margin is not None:
+                    run["routing"] = margin >= 0
+                result["runs"].append(run)
+
+    # incremental insertion: train on part of the corpus, then carry the lists
+    # over to the full layout and add the rest, as a snapshot publish does
+    if insert_frac > 0:
+        base = int(rows * (1 - insert_frac))
+        base_index = PaperIndex(papers[:base], quantization="none")
+        trained = IVFIndex.train(base_index.matrix, base_index.slices)
+        position = {m[4]: i for i, m in enumerate(base_index.meta)}
+        carry_ivf(trained, index.matrix, index.meta, [{"_row": position.get(m[4])} for m in index.meta])
+        ivf, index.ivf = index.ivf, trained
+        queries = cases["domain"]
+        _, hits = _run(lambda q, d: _ivf_search(index, q, d, k, min_sim, nprobes[-1], None), queries)
+        index.ivf = None
+        _, exact_hits = _run(lambda q, d: index.search(q, d, k, min_sim), queries)
+        index.ivf = ivf
+        result["incremental"] = {"trained_rows": base, "added_rows": rows - base,
+                                 "nprobe": nprobes[-1], "recall": _recall(exact_hits, hits)}
+    return result
+
+
+def _ivf_search(index, q, domain, k, min_sim, nprobe, margin):
+    qu = index._unit(q)
+    ids = index.ivf.probe(qu, domain, nprobe, margin)
+    if not len(ids):
+        return []
+    return index.top_k(0, np.asarray(index.matrix[ids]) @ qu, k, min_sim, ids)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="IVF recall / latency vs nprobe against the exact scan")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--min-sim", type=float, default=0.0)
+    parser.add_argument("--insert-frac", type=float, default=0.1,
+                        help="share of rows added after training for the incremental check")
+    parser.add_argument("--no-domain-frac", type=float, default=0.02,
+                        help="share of papers with domain None")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    # the IVF is trained explicitly per run, not by PaperIndex itself
+    settings.INDEX_IVF = "off"
+    corpus = SyntheticCorpus(dim=args.dim, seed=args.seed)
+    results = [bench(corpus, rows, args.queries, sorted(args.nprobe), args.k, args.min_sim, args.insert_frac,
+                     args.no_domain_frac)
+               for rows in args.rows]
+    emit("ivf", vars(args), results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+End-to-end load generator for /answer, /chat/message and /answer/batch.
+
+By default the app runs in-process against the fakes (synthetic corpus,
+fake Supabase / embeddings / LLM / Tavily with configurable latency);
+--url points it at a running server instead.
+
+    python -m benchmarks.load --requests 500 --concurrency 32 --out load.json
+"""
+import asyncio
+import random
+import time
+from collections import Counter
+import httpx
+from benchmarks import fakes
+from benchmarks.corpus import SyntheticCorpus, TopicEmbeddings
+from benchmarks.report import percentiles, emit
+
+
+async def run_endpoint(client, endpoint: str, payloads, concurrency: int, headers):
+    queue = asyncio.Queue()
+    for p in payloads:
+        queue.put_nowait(p)
+    samples, statuses, errors = [], Counter(), Counter()
+
+    async def worker():
+        while True:
+            try:
+                payload = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            t = time.perf_counter()
+            try:
+                resp = await client.post(endpoint, json=payload, headers=headers)
+                statuses[resp.status_code] += 1
+                if resp.status_code == 200:
+                    samples.append(time.perf_counter() - t)
+            except Exception as e:
+                errors[type(e).__name__] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    return {
+        "endpoint": endpoint,
+        "requests": len(payloads),
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "latency": percentiles(samples),
+        "status": {str(k): v for k, v in statuses.items()},
+        "errors": dict(errors),
+    }
+
+
+async def run_batch(client, payloads, batch_size: int, headers):
+    """/answer/batch over the same payloads, batch_size queries per request."""
+    samples, statuses, first_result = [], Counter(), []
+    answered = 0
+    started = time.perf_counter()
+    for lo in range(0, len(payloads), batch_size):
+        chunk = payloads[lo:lo + batch_size]
+        body = {"mode": chunk[0]["mode"],
+                "queries": [{"query": p["query"], "domain": p["domain"]} for p in chunk]}
+        t = time.perf_counter()
+        first = None
+        async with client.stream("POST", "/answer/batch", json=body, headers=headers) as resp:
+            statuses[resp.status_code] += 1
+            async for line in resp.aiter_lines():
+                if line == "event: result":
+                    answered += 1
+                    if first is None:
+                        first = time.perf_counter() - t
+                        first_result.append(first)
+        samples.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - started
+    return {
+        "endpoint": "/answer/batch",
+        "requests": len(payloads),
+        "batch_size": batch_size,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_qps": round(answered / elapsed, 2) if elapsed else 0.0,
+        "batch_latency": percentiles(samples),
+        # in-process (ASGITransport) responses are buffered: only meaningful with --url
+        "first_result_latency": percentiles(first_result),
+        "answered": answered,
+        "status": {str(k): v for k, v in statuses.items()},
+    }
+
+
+def build_payloads(corpus, args):
+    rng = random.Random(args.seed)
+    pool = corpus.queries(args.query_pool or args.requests, seed=args.seed)
+    answer = []
+    chat = []
+    for i in range(args.requests):
+        text, domain = rng.choice(pool)
+        answer.append({"query": text, "mode": args.mode, "domain": domain})
+        # a few messages per session so chat memory is exercised
+        chat.append({"message": text, "mode": args.mode, "user_id": str(1 + i % args.users),
+                     "session_id": None})
+    return answer, chat
+
+
+async def main_async(args):
+    corpus = SyntheticCorpus(dim=args.dim, seed=args.seed)
+    answer_payloads, chat_payloads = build_payloads(corpus, args)
+
+    if args.url:
+        transport = None
+        base_url = args.url
+        token = args.token
+    else:
+        fakes.install(
+            corpus.papers(args.rows, text_words=args.text_words, paragraphs=args.paragraphs),
+            embeddings=TopicEmbeddings(corpus, latency=args.embed_latency),
+            db_latency=args.db_latency,
+            llm=fakes.FakeLLM(latency=args.llm_latency, ttft=args.llm_ttft, tokens=args.llm_tokens,
+                              prefill_per_token=args.llm_prefill),
+            tavily=fakes.FakeTavily(latency=args.web_latency, snippet_chars=args.web_chars),
+        )
+        from app import app
+        from auth.utils import create_token
+        # app errors count as 500s in the report instead of aborting the run
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        base_url = "http://bench"
+        token = create_token(1, "bench@example.org")
+
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    results = []
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.timeout) as client:
+        # first requests pay for index / vocabulary builds; keep them out of the numbers
+        for p in answer_payloads[:args.warmup]:
+            await client.post("/answer", json=p, headers=headers)
+        if "answer" in args.endpoints:
+            results.append(await run_endpoint(client, "/answer", answer_payloads, args.concurrency, headers))
+        if "chat" in args.endpoints:
+            # one session per user so chat memory builds up across messages
+            sessions = {}
+            for user in range(1, args.users + 1):
+                resp = await client.post("/chat/new", params={"userId": str(user)}, headers=headers)
+                if resp.status_code == 200:
+                    sessions[str(user)] = resp.json()["session_id"]
+            for p in chat_payloads:
+                p["session_id"] = sessions.get(p["user_id"])
+            results.append(await run_endpoint(client, "/chat/message", chat_payloads, args.concurrency, headers))
+        if "batch" in args.endpoints:
+            results.append(await run_batch(client, answer_payloads, args.batch_size, headers))
+    return results
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="throughput / p50 / p95 / p99 for /answer, /chat/message and /answer/batch")
+    parser.add_argument("--url", help="running server (default: in-process app with fakes)")
+    parser.add_argument("--token", help="bearer token for --url")
+    parser.add_argument("--endpoints", nargs="+", default=["answer", "chat"], choices=["answer", "chat", "batch"])
+    parser.add_argument("--batch-size", type=int, default=32, help="queries per /answer/batch request")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mode", default="simple", choices=["simple", "deep"])
+    parser.add_argument("--query-pool", type=int, default=0, help="distinct queries (0 = all unique)")
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=10000, help="synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--text-words", type=int, default=800, help="enriched_text length per paper")
+    parser.add_argument("--paragraphs", type=int, default=8)
+    parser.add_argument("--db-latency", type=float, default=0.005)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-ttft", type=float, default=0.2)
+    parser.add_argument("--llm-tokens", type=int, default=200)
+    parser.add_argument("--llm-prefill", type=float, default=0.0002, help="seconds per prompt token")
+    parser.add_argument("--web-latency", type=float, default=0.3)
+    parser.add_argument("--web-chars", type=int, default=600)
+    parser.add_argument("--warmup", type=int, default=2, help="unmeasured /answer requests first")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    params = {k: v for k, v in vars(args).items() if k != "token"}
+    emit("load", params, results, args.out)
+
+
+if __name__ == "__main__":
+    main()
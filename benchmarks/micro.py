@@ -0,0 +1,115 @@
+"""
+Retrieval micro-benchmarks over synthetic corpora of increasing size:
+index build time / memory, snapshot write / load time, per-query latency of the resident index (exact and
+int8), BM25, the full hybrid retrieve(), and the old per-row
+cosine_similarity loop for reference.
+
+    python -m benchmarks.micro --sizes 1000 10000 100000 --out micro.json
+"""
+import json
+import tempfile
+import time
+from benchmarks import fakes
+from benchmarks.corpus import SyntheticCorpus, TopicEmbeddings
+from benchmarks.report import percentiles, emit
+
+
+def _time_queries(fn, queries):
+    samples = []
+    for q in queries:
+        t = time.perf_counter()
+        fn(q)
+        samples.append(time.perf_counter() - t)
+    return percentiles(samples)
+
+
+def bench_size(corpus, rows: int, n_queries: int, legacy_max: int):
+    import retrieval.index as index_mod
+    import retrieval.retriever as retriever
+    from retrieval.index import PaperIndex
+    from retrieval.bm25 import BM25Index
+    from retrieval.snapshot import write_snapshot, open_snapshot
+
+    papers = list(corpus.papers(rows))
+    queries = corpus.queries(n_queries)
+    q_embs = [(corpus.embed(text), domain) for text, domain in queries]
+    result = {"rows": rows, "build_s": {}, "bytes": {}, "latency": {}}
+
+    t = time.perf_counter()
+    exact = PaperIndex(papers, quantization="none")
+    result["build_s"]["index"] = round(time.perf_counter() - t, 3)
+    result["bytes"]["index"] = exact.memory_bytes()
+
+    t = time.perf_counter()
+    exact.lexical = BM25Index(exact.meta, exact.slices)
+    result["build_s"]["bm25"] = round(time.perf_counter() - t, 3)
+    result["bytes"]["bm25"] = exact.lexical.nbytes()
+
+    t = time.perf_counter()
+    int8 = PaperIndex(papers, quantization="int8")
+    result["build_s"]["index_int8"] = round(time.perf_counter() - t, 3)
+    result["bytes"]["index_int8"] = int8.memory_bytes()
+
+    # memory-mapped snapshot: publish once, then what every other worker pays to load it
+    with tempfile.TemporaryDirectory() as directory:
+        t = time.perf_counter()
+        write_snapshot(directory, papers)
+        result["build_s"]["snapshot_write"] = round(time.perf_counter() - t, 3)
+        t = time.perf_counter()
+        PaperIndex.from_snapshot(open_snapshot(directory), quantization="none")
+        result["build_s"]["snapshot_load"] = round(time.perf_counter() - t, 4)
+
+    top_k, min_sim = retriever.TOP_K, retriever.MIN_SIM
+    lat = result["latency"]
+    lat["index_all"] = _time_queries(lambda q: exact.search(q[0], "all", top_k, min_sim), q_embs)
+    lat["index_domain"] = _time_queries(lambda q: exact.search(q[0], q[1], top_k, min_sim), q_embs)
+    lat["index_int8_all"] = _time_queries(lambda q: int8.search(q[0], "all", top_k, min_sim), q_embs)
+    lat["bm25_all"] = _time_queries(lambda q: exact.lexical.search(q[0], "all", top_k), queries)
+
+    # full retrieve(): vector + BM25 + RRF through the resident index
+    index_mod._index = exact
+    lat["retrieve_hybrid"] = _time_queries(
+        lambda q: retriever.retrieve(q[0], q[1], q_emb=corpus.embed(q[0]).tolist()), queries
+    )
+    hits = [retriever.retrieve(text, domain, q_emb=corpus.embed(text).tolist()) for text, domain in queries]
+    result["on_topic_hit_rate"] = round(sum(
+        1 for (text, domain), h in zip(queries, hits)
+        if h and corpus.word_topic.get(text.split()[0]) == corpus.word_topic.get(h[0][0].split()[0])
+    ) / len(queries), 3)
+
+    # the original per-row loop over JSON-encoded embeddings (Supabase shape)
+    if rows <= legacy_max:
+        encoded = [(p["domain"], json.dumps(p["embedding"].tolist())) for p in papers]
+
+        def legacy(q):
+            q_json = json.dumps(q[0].tolist())
+            sims = [retriever.cosine_similarity(q_json, emb) for d, emb in encoded if d == q[1]]
+            return sorted(sims, reverse=True)[:top_k]
+
+        lat["legacy_cosine_loop"] = _time_queries(legacy, q_embs[:min(10, len(q_embs))])
+
+    index_mod._index = None
+    return result
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="retrieve / cosine_similarity scaling benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--legacy-max", type=int, default=10000,
+                        help="largest corpus to run the per-row cosine_similarity loop on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    corpus = SyntheticCorpus(dim=args.dim, seed=args.seed)
+    fakes.install([], embeddings=TopicEmbeddings(corpus))
+    results = [bench_size(corpus, rows, args.queries, args.legacy_max) for rows in args.sizes]
+    emit("micro", vars(args), results, args.out)
+
+
+if __name__ == "__main__":
+    main()
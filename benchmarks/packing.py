@@ -0,0 +1,86 @@
+"""
+Prompt size and latency with and without passage packing (CONTEXT_PACKING).
+
+Runs the answer pipeline in-process on a synthetic corpus of long,
+multi-paragraph papers with the fake LLM charging prefill time per prompt
+token, once with whole enriched_text sources and once packed.
+
+    python -m benchmarks.packing --queries 50 --out packing.json
+"""
+import asyncio
+import time
+import numpy as np
+from benchmarks import fakes
+from benchmarks.corpus import SyntheticCorpus, TopicEmbeddings
+from benchmarks.report import percentiles, emit
+
+
+def on_topic(corpus, query: str, text: str) -> float:
+    """Share of the context's topic words that belong to the query's topic."""
+    topic = corpus.word_topic.get(query.split()[0])
+    topics = [corpus.word_topic[w] for w in text.split() if w in corpus.word_topic]
+    return sum(1 for t in topics if t == topic) / len(topics) if topics else 0.0
+
+
+async def run(corpus, queries, mode: str, packing: bool):
+    import retrieval.retriever as retriever
+    from config import settings
+
+    settings.CONTEXT_PACKING = packing
+    retriever.answer_cache.invalidate()
+    latencies, prompt_tokens, context_tokens, relevance = [], [], [], []
+    for text, domain in queries:
+        results = retriever.retrieve(text, domain, q_emb=corpus.embed(text).tolist())
+        packed = retriever.build_context(text, results, corpus.embed(text).tolist(), mode)
+        context_tokens.append(packed.tokens)
+        relevance.append(on_topic(corpus, text, packed.text))
+
+        t = time.perf_counter()
+        result = await retriever.answer_query({"Actualquery": text, "mode": mode, "domain": domain})
+        latencies.append(time.perf_counter() - t)
+        prompt_tokens.append(result.get("prompt_tokens", 0))
+    return {
+        "mode": mode,
+        "packing": packing,
+        "prompt_tokens_mean": round(float(np.mean(prompt_tokens)), 1),
+        "prompt_tokens_p95": round(float(np.percentile(prompt_tokens, 95)), 1),
+        "context_tokens_mean": round(float(np.mean(context_tokens)), 1),
+        "context_on_topic": round(float(np.mean(relevance)), 3),
+        "latency": percentiles(latencies),
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="prompt tokens / latency before and after context packing")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--text-words", type=int, default=800)
+    parser.add_argument("--paragraphs", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--llm-prefill", type=float, default=0.0002, help="seconds per prompt token")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    corpus = SyntheticCorpus(dim=args.dim, seed=args.seed)
+    fakes.install(
+        corpus.papers(args.rows, text_words=args.text_words, paragraphs=args.paragraphs),
+        embeddings=TopicEmbeddings(corpus),
+        db_latency=0,
+        llm=fakes.FakeLLM(latency=0.05, ttft=0.05, tokens=50, token_interval=0,
+                          prefill_per_token=args.llm_prefill),
+        tavily=fakes.FakeTavily(latency=0.01),
+    )
+    queries = corpus.queries(args.queries, seed=args.seed + 1)
+
+    async def all_runs():
+        return [await run(corpus, queries, mode, packing)
+                for mode in ("simple", "deep") for packing in (False, True)]
+
+    emit("packing", vars(args), asyncio.run(all_runs()), args.out)
+
+
+if __name__ == "__main__":
+    main()
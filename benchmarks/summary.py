@@ -0,0 +1,78 @@
+"""
+Deep-mode summary strategies side by side (DEEP_SUMMARY_STRATEGY /
+summary_strategy): structured (conclusion section in the same stream),
+two_call (a second LLM call) and extractive (no LLM call).
+
+Runs the answer pipeline in-process against the fakes and reports latency
+to the "conclusion" event and to "done", LLM calls per answer and summary
+length for each strategy.
+
+    python -m benchmarks.summary --queries 30 --out summary.json
+"""
+import asyncio
+import time
+import numpy as np
+from benchmarks import fakes
+from benchmarks.corpus import SyntheticCorpus, TopicEmbeddings
+from benchmarks.report import percentiles, emit
+
+STRATEGIES = ("structured", "two_call", "extractive")
+
+
+async def run(queries, strategy: str, llm):
+    import retrieval.retriever as retriever
+
+    retriever.answer_cache.invalidate()
+    to_conclusion, to_done, words = [], [], []
+    calls = llm.calls
+    for text, domain in queries:
+        t = time.perf_counter()
+        req = {"Actualquery": text, "mode": "deep", "domain": domain, "summary_strategy": strategy}
+        async for event in retriever.answer_events(req):
+            if event["event"] == "conclusion":
+                to_conclusion.append(time.perf_counter() - t)
+                words.append(len(event["data"].split()))
+        to_done.append(time.perf_counter() - t)
+    return {
+        "strategy": strategy,
+        "conclusion_latency": percentiles(to_conclusion),
+        "latency": percentiles(to_done),
+        "llm_calls_per_answer": round((llm.calls - calls) / len(queries), 2),
+        "summary_words_mean": round(float(np.mean(words)), 1) if words else 0.0,
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="latency / LLM calls per deep-mode summary strategy")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--strategies", nargs="+", default=list(STRATEGIES), choices=STRATEGIES)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="complete() latency (two_call summary)")
+    parser.add_argument("--llm-ttft", type=float, default=0.2)
+    parser.add_argument("--llm-tokens", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    corpus = SyntheticCorpus(dim=args.dim, seed=args.seed)
+    llm = fakes.FakeLLM(latency=args.llm_latency, ttft=args.llm_ttft, tokens=args.llm_tokens)
+    fakes.install(
+        corpus.papers(args.rows),
+        embeddings=TopicEmbeddings(corpus),
+        db_latency=0,
+        llm=llm,
+        tavily=fakes.FakeTavily(latency=0.01),
+    )
+    queries = corpus.queries(args.queries, seed=args.seed + 1)
+
+    async def all_runs():
+        return [await run(queries, strategy, llm) for strategy in args.strategies]
+
+    emit("summary", vars(args), asyncio.run(all_runs()), args.out)
+
+
+if __name__ == "__main__":
+    main()
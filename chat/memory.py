@@ -0,0 +1,74 @@
+import asyncio
+from config import settings
+from retrieval.llm import get_provider
+from metrics import PROMPT_TOKENS
+
+CHARS_PER_TOKEN = 4
+
+
+def count_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0] + " ..."
+
+
+def build_memory_context(summary: str, turns, budget: int = None) -> str:
+    """
+    Rolling summary + the most recent turns verbatim, within a token budget.
+    turns are (question, answer) pairs, oldest first. When over budget the
+    oldest turns are dropped first, then long answers are clipped.
+    """
+    budget = budget or settings.MEMORY_TOKEN_BUDGET
+    header = f"CONVERSATION SUMMARY: {summary}\n" if summary else ""
+    header = truncate_tokens(header, settings.MEMORY_SUMMARY_TOKENS)
+    remaining = budget - count_tokens(header)
+
+    lines = []
+    for question, answer in reversed(turns):
+        turn = f"USER: {question}\nASSISTANT: {answer}\n"
+        cost = count_tokens(turn)
+        if cost > remaining:
+            clipped = f"USER: {question}\nASSISTANT: {truncate_tokens(answer, max(remaining - count_tokens(question) - 8, 0))}\n"
+            if lines or count_tokens(clipped) > remaining:
+                break
+            turn, cost = clipped, count_tokens(clipped)
+        lines.append(turn)
+        remaining -= cost
+
+    return header + "".join(reversed(lines))
+
+
+async def summarize_turn(summary: str, question: str, answer: str) -> str:
+    """Fold one new turn into the rolling summary (one short LLM call)."""
+    prompt = f"""
+Update the running summary of a research conversation with the new turn.
+Keep the topics, entities and open questions; stay under {settings.MEMORY_SUMMARY_TOKENS * 3 // 4} words.
+
+Current summary:
+{summary or "(empty)"}
+
+New turn:
+USER: {question}
+ASSISTANT: {truncate_tokens(answer, 600)}
+
+Updated summary:
+"""
+    PROMPT_TOKENS.observe(count_tokens(prompt), purpose="memory_summary")
+    return (await get_provider().complete(prompt, settings.LLM_TIMEOUT)).strip()
+
+
+_background = set()
+
+
+def schedule(coro):
+    """Run a coroutine off the response path, keeping a reference until done."""
+    task = asyncio.ensure_future(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return task
@@ -8,6 +8,7 @@ class ChatSession(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     title = Column(Text, nullable=True)
+    summary = Column(Text, nullable=True)  # rolling conversation memory
     created_at = Column(TIMESTAMP, server_default=func.now())
 
 
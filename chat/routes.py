@@ -1,8 +1,62 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
+import hashlib
+import json
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, Response
+from fastapi.responses import JSONResponse
 from auth.utils import verify_token
-from chat.service import create_new_session, process_user_message, get_chat_history,get_history_title_service, delete_chat_session
+from retrieval.retriever import run_blocking
+from chat.service import create_new_session, process_user_message, stream_user_message, get_chat_history,get_history_title_service, delete_chat_session
+from chat.service import messages_version, sessions_version
+from sse import event_stream
+from config import settings
+from logs import get_logger, error_fields
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
+log = get_logger("chat")
+
+
+def weak_etag(value) -> str:
+    raw = json.dumps(value, sort_keys=True, default=str, separators=(",", ":"))
+    return f'W/"{hashlib.sha1(raw.encode()).hexdigest()[:20]}"'
+
+
+def probe_etag(probe, *key):
+    """
+    ETag from a cheap change probe plus the request's page parameters, so a
+    revalidation can be answered before the page query runs. None if the
+    probe fails (the body is hashed instead).
+    """
+    try:
+        return weak_etag([*key, probe()])
+    except Exception as e:
+        log.warning("etag probe failed", **error_fields(e))
+        return None
+
+
+def not_modified(request: Request, etag: str, headers: dict = None):
+    """An empty 304 when If-None-Match already holds etag, else None."""
+    sent = request.headers.get("if-none-match", "")
+    candidates = {t.strip().removeprefix("W/") for t in sent.split(",") if t.strip()}
+    if etag and ("*" in candidates or etag.removeprefix("W/") in candidates):
+        return Response(status_code=304, headers={**(headers or {}), "ETag": etag,
+                                                  "Cache-Control": "private, no-cache"})
+    return None
+
+
+def conditional_json(request: Request, payload, headers: dict = None, etag: str = None):
+    """
+    JSON response with a weak ETag (etag, or a hash of the body); a matching
+    If-None-Match gets an empty 304 so repeat refreshes skip the transfer.
+    """
+    etag = etag or weak_etag(payload)
+    cached = not_modified(request, etag, headers)
+    if cached is not None:
+        return cached
+    headers = {**(headers or {}), "ETag": etag, "Cache-Control": "private, no-cache"}
+    return JSONResponse(payload, headers=headers)
+
+
+def page_limit(limit: int) -> int:
+    return max(1, min(limit or settings.HISTORY_PAGE_SIZE, settings.HISTORY_MAX_PAGE_SIZE))
 
 
 @router.post("/new")
@@ -33,19 +87,56 @@ async def send_message(data: dict):
     if not session_id:
         if not user_id:
             raise HTTPException(400, "user_id required when creating new session")
-        session_id = create_new_session(user_id)
+        session_id = await run_blocking(create_new_session, user_id)
     answer = await process_user_message(session_id, user_msg,user_id, mode)
     return answer
 
+@router.post("/message/stream")
+async def send_message_stream(data: dict):
+    if "message" not in data:
+        raise HTTPException(400, "Query is required")
+
+    session_id = data.get("session_id")
+    user_msg = data["message"]
+    mode = data.get("mode", "simple")
+    user_id = data["user_id"]
+    if not session_id:
+        if not user_id:
+            raise HTTPException(400, "user_id required when creating new session")
+        session_id = await run_blocking(create_new_session, user_id)
+    return event_stream(stream_user_message(session_id, user_msg, user_id, mode))
+
 @router.get("/history/{session_id}")
-def history(session_id: int):
-    msgs = get_chat_history(session_id)
-    return [
-        {"question": m[0], "content": m[1], "time": m[2], "corrected_query": m[3], "references": m[4]}
+def history(session_id: int, request: Request, limit: int = Query(None, ge=1),
+            cursor: str = None, fields: str = None):
+    """
+    Messages oldest first. ?fields=questions (or a column list) trims the
+    payload; the next page's cursor is in the X-Next-Cursor header.
+    """
+    etag = probe_etag(lambda: messages_version(session_id), "history", session_id, limit, cursor, fields)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    try:
+        msgs, next_cursor = get_chat_history(session_id, page_limit(limit), cursor, fields)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    payload = [
+        {("time" if k == "created_at" else k): v for k, v in m.items()}
         for m in msgs
     ]
+    return conditional_json(request, payload, {"X-Next-Cursor": next_cursor} if next_cursor else None, etag)
 
 @router.get("/getHistoryTitle/{user_id}")
-def get_history_title(user_id: str):
-    titles = get_history_title_service(user_id)
-    return {"history": titles}
+def get_history_title(user_id: str, request: Request, limit: int = Query(None, ge=1),
+                      cursor: str = None, fields: str = None):
+    """Sessions newest first; ?fields=titles for the sidebar, next_cursor for more."""
+    etag = probe_etag(lambda: sessions_version(user_id), "sessions", user_id, limit, cursor, fields)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached
+    try:
+        titles, next_cursor = get_history_title_service(user_id, page_limit(limit), cursor, fields)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return conditional_json(request, {"history": titles, "next_cursor": next_cursor}, etag=etag)
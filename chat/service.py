@@ -1,6 +1,15 @@
 
-from retrieval.retriever import answer_query
+import base64
+from datetime import datetime
+from retrieval.retriever import answer_query, answer_events, run_blocking
 from supabaseclient import get_client
+from chat.memory import build_memory_context, summarize_turn, schedule, truncate_tokens
+from chat.store import store, SessionState
+from config import settings
+from logs import get_logger, error_fields
+from metrics import span
+
+log = get_logger("chat")
 
 def create_new_session(user_id: int):
     supabase = get_client()
@@ -14,7 +23,9 @@ def create_new_session(user_id: int):
     if not result.data:
         raise Exception("Failed to create chat session")
 
-    return result.data[0]["id"]
+    session_id = result.data[0]["id"]
+    store.mark_new(session_id)
+    return session_id
 
 def isChatExists(session_id:str,user_id:str):
     supabase = get_client()
@@ -22,6 +33,7 @@ def isChatExists(session_id:str,user_id:str):
         supabase.table("chat_messages")
         .select("id")
         .eq("session_id", session_id)
+        .limit(1)
         .execute()
     )
 
@@ -41,56 +53,157 @@ def getChatTitle(query:str):
 
 
 def save_message(session_id: int, question: str, content: str, user_id: str,corrected_query:str,references:str):
-    supabase = get_client()
-    if not isChatExists(session_id, user_id):
+    """
+    Queue the message (and the title for a session's first message) on the
+    write-behind store; only a cold session costs a database read here.
+    """
+    state = store.get(session_id, load_session_state)
+    if not state.has_messages:
         title = getChatTitle(corrected_query if corrected_query else question)
-        supabase.table("chat_sessions").update({
-        "title": title
-        }).eq("id", session_id).eq("user_id", user_id).execute()
-  
-   
-    supabase.table("chat_messages").insert({
+        store.set_title(session_id, user_id, title)
+
+    store.record_message(session_id, {
         "session_id": session_id,
         "question": question,
         "content": content,
         "corrected_query": corrected_query,
         "references": references
-    }).execute()
+    }, corrected_query or question, truncate_tokens(content, settings.MEMORY_TOKEN_BUDGET))
 
 
-def get_history_title_service(user_id: str):
+# history projections: ?fields= takes a preset name or a comma list of columns
+SESSION_FIELDS = {"title", "created_at"}
+SESSION_PRESETS = {"full": ["title", "created_at"], "titles": ["title"]}
+MESSAGE_FIELDS = {"question", "content", "created_at", "corrected_query", "references"}
+MESSAGE_PRESETS = {
+    "full": ["question", "content", "created_at", "corrected_query", "references"],
+    "questions": ["question", "corrected_query", "created_at"],
+}
+
+
+def parse_fields(fields: str, allowed: set, presets: dict):
+    if not fields:
+        return presets["full"]
+    if fields in presets:
+        return presets[fields]
+    columns = [c.strip() for c in fields.split(",") if c.strip()]
+    unknown = [c for c in columns if c not in allowed]
+    if unknown or not columns:
+        raise ValueError(f"Unknown fields: {', '.join(unknown) or fields}")
+    return columns
+
+
+def encode_cursor(row) -> str:
+    """Opaque keyset cursor: (created_at, id) of the last row on the page."""
+    return base64.urlsafe_b64encode(f"{row['created_at']}|{row['id']}".encode()).decode().rstrip("=")
 
-    supabase = get_client()
 
+def decode_cursor(cursor: str):
+    """(created_at, id) from a cursor; created_at is re-serialized so only a timestamp reaches the filter."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at).isoformat(), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def fetch_page(query, cursor: str, limit: int, desc: bool):
+    """
+    Keyset pagination on (created_at, id): rows strictly after the cursor in
+    the given direction, limit + 1 fetched to know whether a next page exists.
+    Returns (rows, next_cursor). Backed by indexes on
+    chat_sessions (user_id, created_at, id) / chat_messages (session_id, created_at, id).
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        op = "lt" if desc else "gt"
+        query = query.or_(
+            f'created_at.{op}."{created_at}",and(created_at.eq."{created_at}",id.{op}.{row_id})'
+        )
+    result = (
+        query.order("created_at", desc=desc)
+        .order("id", desc=desc)
+        .limit(limit + 1)
+        .execute()
+    )
+    rows = result.data or []
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(rows[limit - 1])
+    return rows, None
+
+
+def messages_version(session_id: int):
+    """
+    Cheap change probe for a session's messages (rows are only inserted or
+    deleted): count and newest (created_at, id), one indexed query.
+    """
+    result = (
+        get_client().table("chat_messages")
+        .select("id, created_at", count="exact")
+        .eq("session_id", session_id)
+        .order("created_at", desc=True)
+        .order("id", desc=True)
+        .limit(1)
+        .execute()
+    )
+    newest = result.data[0] if result.data else {}
+    return [result.count, newest.get("created_at"), newest.get("id")]
+
+
+def sessions_version(user_id: str):
+    """
+    Cheap change probe for a user's sessions: they are inserted, titled
+    once and deleted, so count, titled count and newest (created_at, id).
+    """
+    supabase = get_client()
     result = (
         supabase.table("chat_sessions")
-        .select("id, title, created_at")
+        .select("id, created_at", count="exact")
         .eq("user_id", user_id)
         .order("created_at", desc=True)
+        .order("id", desc=True)
+        .limit(1)
+        .execute()
+    )
+    titled = (
+        supabase.table("chat_sessions")
+        .select("id", count="exact")
+        .eq("user_id", user_id)
+        .not_.is_("title", None)
+        .limit(1)
         .execute()
     )
+    newest = result.data[0] if result.data else {}
+    return [result.count, titled.count, newest.get("created_at"), newest.get("id")]
 
-    if not result.data:
-        return []
 
-    return [
-        {"session_id": row["id"], "title": row["title"], "created_at": row["created_at"]}
-        for row in result.data
-    ]
-    
-def get_chat_history(session_id: int, limit: int = 50):
+def get_history_title_service(user_id: str, limit: int = 50, cursor: str = None, fields: str = None):
+    """A page of the user's sessions, newest first: (items, next_cursor)."""
+    columns = parse_fields(fields, SESSION_FIELDS, SESSION_PRESETS)
     supabase = get_client()
+    query = (
+        supabase.table("chat_sessions")
+        .select(", ".join(["id", "created_at"] + [c for c in columns if c != "created_at"]))
+        .eq("user_id", user_id)
+    )
+    rows, next_cursor = fetch_page(query, cursor, limit, desc=True)
+    return [
+        {"session_id": row["id"], **{c: row[c] for c in columns}}
+        for row in rows
+    ], next_cursor
 
-    result = (
+def get_chat_history(session_id: int, limit: int = 50, cursor: str = None, fields: str = None):
+    """A page of a session's messages, oldest first: (items, next_cursor)."""
+    columns = parse_fields(fields, MESSAGE_FIELDS, MESSAGE_PRESETS)
+    supabase = get_client()
+    query = (
         supabase.table("chat_messages")
-        .select("question, content, created_at,corrected_query,references")
+        .select(", ".join(["id", "created_at"] + [c for c in columns if c != "created_at"]))
         .eq("session_id", session_id)
-        .order("created_at")
-        .limit(limit)
-        .execute()
     )
-
-    return [(row["question"], row["content"], row["created_at"],row["corrected_query"], row["references"]) for row in result.data]
+    rows, next_cursor = fetch_page(query, cursor, limit, desc=False)
+    return [{c: row[c] for c in columns} for row in rows], next_cursor
 
 def delete_chat_session(session_id: str):
     """
@@ -101,6 +214,7 @@ def delete_chat_session(session_id: str):
     session_check = supabase.table("chat_sessions").select("id").eq("id", session_id).execute()
     if not session_check.data:
         raise Exception(f"Chat session {session_id} not found")
+    store.forget(session_id)
     
     # First, delete all chat messages associated with this session
     supabase.table("chat_sessions").delete().eq("id", session_id).execute()
@@ -112,21 +226,80 @@ def delete_chat_session(session_id: str):
     return True
 
 
+def get_session_summary(session_id: int) -> str:
+    supabase = get_client()
+    try:
+        result = (
+            supabase.table("chat_sessions")
+            .select("summary")
+            .eq("id", session_id)
+            .limit(1)
+            .execute()
+        )
+    except Exception as e:
+        log.warning("summary load failed", session_id=session_id, **error_fields(e))
+        return ""
+    return (result.data[0].get("summary") or "") if result.data else ""
+
+
+def save_session_summary(session_id: int, summary: str):
+    store.set_summary(session_id, summary)
+
+
+def get_recent_turns(session_id: int, n: int):
+    """Last n (question, answer) pairs, oldest first."""
+    supabase = get_client()
+    result = (
+        supabase.table("chat_messages")
+        .select("question, content, corrected_query")
+        .eq("session_id", session_id)
+        .order("created_at", desc=True)
+        .limit(n)
+        .execute()
+    )
+    return [
+        (row["corrected_query"] or row["question"], row["content"])
+        for row in reversed(result.data or [])
+    ]
+
+
+def load_session_state(session_id: int) -> SessionState:
+    """Cold-cache load: summary + recent turns (existence follows from the turns)."""
+    known = message_count(session_id)
+    summary = get_session_summary(session_id)
+    turns = get_recent_turns(session_id, settings.MEMORY_RECENT_TURNS)
+    return SessionState(summary, turns, has_messages=bool(turns), known=known)
+
+
+def message_count(session_id: int) -> int:
+    return messages_version(session_id)[0] or 0
+
+
+def load_memory(session_id: int):
+    """Returns (rolling summary, budgeted prompt context) for a session."""
+    # other workers may have answered in this session since it was cached
+    state = store.get(session_id, load_session_state, probe=message_count)
+    return state.summary, build_memory_context(state.summary, list(state.turns))
+
+
+async def remember_turn(session_id: int, summary: str, question: str, answer: str):
+    """Fold the finished turn into the session's rolling summary."""
+    try:
+        new_summary = await summarize_turn(summary, question, answer)
+        save_session_summary(session_id, new_summary)
+    except Exception as e:
+        log.warning("summary update failed", session_id=session_id, **error_fields(e))
+
+
 async def process_user_message(session_id: int, user_msg: str, user_id:str,mode: str = "simple",):
     """
     Process a user message with optional mode:
     mode="simple" (default) or mode="deep"
     """
 
-    # Load chat history
-    history = get_chat_history(session_id)
-
-    # Build prompt for RAG / LLM
-    context = ""
-    for question, answer, created_at, corrected_query, references in history:
-        user_question = corrected_query if corrected_query else question
-        context += f"USER: {user_question}\n"
-        context += f"ASSISTANT: {answer}\n"
+    # Load rolling summary + last few turns (token-budgeted)
+    with span("load_memory"):
+        summary, context = await run_blocking(load_memory, session_id)
 
 
     # Get answer from RAG with mode
@@ -136,6 +309,31 @@ async def process_user_message(session_id: int, user_msg: str, user_id:str,mode:
     corrected_query = result.get("corrected_query", "")
     
     # Save assistant message
-    save_message(session_id, user_msg, answer,user_id, corrected_query, references)
+    with span("save_message"):
+        save_message(session_id, user_msg, answer, user_id, corrected_query, references)
+    schedule(remember_turn(session_id, summary, corrected_query or user_msg, answer))
 
     return result
+
+
+async def stream_user_message(session_id: int, user_msg: str, user_id: str, mode: str = "simple"):
+    """
+    Streaming variant of process_user_message. Events are passed through as
+    they are produced; the assembled answer is saved once the stream completes
+    (a client that disconnects early leaves nothing half-written).
+    """
+    with span("load_memory"):
+        summary, context = await run_blocking(load_memory, session_id)
+
+    yield {"event": "session", "data": {"session_id": session_id}}
+    async for event in answer_events({"context": context, "Actualquery": user_msg, "mode": mode}):
+        if event["event"] == "done":
+            result = event["data"]
+            corrected_query = result.get("corrected_query", "")
+            with span("save_message"):
+                save_message(
+                    session_id, user_msg, result["answer"], user_id,
+                    corrected_query, result.get("references", ""),
+                )
+            schedule(remember_turn(session_id, summary, corrected_query or user_msg, result["answer"]))
+        yield event
@@ -0,0 +1,246 @@
+import threading
+import time
+from collections import deque
+from cache import TTLCache
+from config import settings
+from logs import get_logger, error_fields
+from metrics import REGISTRY
+from supabaseclient import get_client
+
+log = get_logger("write_behind")
+
+
+class SessionState:
+    """Hot copy of what the chat pipeline needs from a session."""
+
+    def __init__(self, summary: str = "", turns=(), has_messages: bool = False, known: int = 0):
+        self.summary = summary
+        self.turns = deque(turns, maxlen=settings.MEMORY_RECENT_TURNS)
+        self.has_messages = has_messages
+        # messages this copy accounts for (loaded + recorded here); more in
+        # the database means another worker wrote to the session
+        self.known = known
+
+
+class WriteBehindQueue:
+    """
+    Buffers chat writes and applies them from one background thread:
+    message rows go out as batched inserts, per-session column updates
+    (title, summary) are coalesced so only the latest value is written.
+    Failed writes are retried with backoff up to WRITE_BEHIND_MAX_RETRIES.
+    Deleted sessions are tombstoned so no queued or in-flight write of this
+    process lands after the delete; before each insert the batch's sessions
+    are also checked in the database, which covers deletes made by other
+    workers.
+    """
+
+    def __init__(self, interval: float, batch_size: int, max_retries: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self._messages = []          # [(row, attempts)]
+        self._updates = {}           # (session_id, user_id, if_null) -> (fields, attempts)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        # session ids deleted recently; writes are checked against them
+        self._deleted = TTLCache(maxsize=10000, ttl=3600)
+        # held around each write so discard_session() waits out the one in flight
+        self._write_lock = threading.Lock()
+        self.written = 0
+        self.failed = 0
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="chat-write-behind", daemon=True)
+            self._thread.start()
+
+    def _is_deleted(self, session_id) -> bool:
+        return self._deleted.get(str(session_id)) is not None
+
+    def add_message(self, row: dict):
+        if self._is_deleted(row["session_id"]):
+            return
+        with self._cond:
+            self._messages.append((row, 0))
+            self._ensure_thread()
+            if len(self._messages) >= self.batch_size:
+                self._cond.notify()
+
+    def update_session(self, session_id, fields: dict, user_id=None, if_null: str = None):
+        """Coalesced column update; with if_null only applied while that column is still NULL."""
+        if self._is_deleted(session_id):
+            return
+        with self._cond:
+            key = (session_id, user_id, if_null)
+            current, attempts = self._updates.get(key, ({}, 0))
+            self._updates[key] = ({**current, **fields}, attempts)
+            self._ensure_thread()
+
+    def discard_session(self, session_id):
+        """
+        Drop pending writes for a deleted session. Returns once no write for
+        it is in flight, so rows deleted afterwards stay deleted.
+        """
+        sid = str(session_id)
+        self._deleted.set(sid, True)
+        with self._cond:
+            self._messages = [(r, a) for r, a in self._messages if str(r["session_id"]) != sid]
+            self._updates = {k: v for k, v in self._updates.items() if str(k[0]) != sid}
+        with self._write_lock:
+            pass
+
+    def pending(self):
+        with self._cond:
+            return len(self._messages) + len(self._updates)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed:
+                    self._cond.wait(self.interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def flush(self):
+        with self._cond:
+            messages, self._messages = self._messages, []
+            updates, self._updates = self._updates, {}
+        if not messages and not updates:
+            return
+
+        supabase = get_client()
+        retry_messages = []
+        for i in range(0, len(messages), self.batch_size):
+            with self._write_lock:
+                # sessions deleted since the batch was dequeued are skipped
+                batch = [(row, a) for row, a in messages[i:i + self.batch_size]
+                         if not self._is_deleted(row["session_id"])]
+                if not batch:
+                    continue
+                try:
+                    batch = self._live_sessions(supabase, batch)
+                    if not batch:
+                        continue
+                    supabase.table("chat_messages").insert([row for row, _ in batch]).execute()
+                    self.written += len(batch)
+                except Exception as e:
+                    log.warning("message insert failed", messages=len(batch), **error_fields(e))
+                    retry_messages += [(row, a + 1) for row, a in batch]
+
+        retry_updates = {}
+        for (session_id, user_id, if_null), (fields, attempts) in updates.items():
+            with self._write_lock:
+                if self._is_deleted(session_id):
+                    continue
+                try:
+                    query = supabase.table("chat_sessions").update(fields).eq("id", session_id)
+                    if user_id is not None:
+                        query = query.eq("user_id", user_id)
+                    if if_null is not None:
+                        query = query.is_(if_null, None)
+                    query.execute()
+                    self.written += 1
+                except Exception as e:
+                    log.warning("session update failed", session_id=session_id, **error_fields(e))
+                    retry_updates[(session_id, user_id, if_null)] = (fields, attempts + 1)
+
+        self._requeue(retry_messages, retry_updates)
+
+    def _live_sessions(self, supabase, batch):
+        """The batch without rows whose session no longer exists (deleted on any worker)."""
+        ids = list({str(row["session_id"]) for row, _ in batch})
+        rows = supabase.table("chat_sessions").select("id").in_("id", ids).execute().data or []
+        live = {str(r["id"]) for r in rows}
+        for sid in set(ids) - live:
+            self._deleted.set(sid, True)
+        return [(row, a) for row, a in batch if str(row["session_id"]) in live]
+
+    def _requeue(self, messages, updates):
+        keep_messages = [(r, a) for r, a in messages if a <= self.max_retries]
+        keep_updates = {k: v for k, v in updates.items() if v[1] <= self.max_retries}
+        self.failed += (len(messages) - len(keep_messages)) + (len(updates) - len(keep_updates))
+        if not keep_messages and not keep_updates:
+            return
+        attempts = max([a for _, a in keep_messages] + [a for _, a in keep_updates.values()])
+        time.sleep(min(2 ** attempts * 0.1, 5))
+        with self._cond:
+            keep_messages = [(r, a) for r, a in keep_messages if not self._is_deleted(r["session_id"])]
+            keep_updates = {k: v for k, v in keep_updates.items() if not self._is_deleted(k[0])}
+            self._messages = keep_messages + self._messages
+            for key, (fields, a) in keep_updates.items():
+                # anything queued meanwhile is newer and wins
+                newer, _ = self._updates.get(key, ({}, 0))
+                self._updates[key] = ({**fields, **newer}, a)
+
+    def close(self):
+        """Stop the writer thread after a final flush (call on shutdown)."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=settings.WRITE_BEHIND_SHUTDOWN_TIMEOUT)
+        else:
+            self.flush()
+
+
+class SessionStore:
+    """Per-session hot cache in front of Supabase plus the write-behind queue."""
+
+    def __init__(self):
+        self.sessions = TTLCache(maxsize=settings.SESSION_CACHE_SIZE, ttl=settings.SESSION_CACHE_TTL)
+        self.writer = WriteBehindQueue(
+            settings.WRITE_BEHIND_INTERVAL,
+            settings.WRITE_BEHIND_BATCH_SIZE,
+            settings.WRITE_BEHIND_MAX_RETRIES,
+        )
+
+    def get(self, session_id, loader, probe=None):
+        """
+        Cached state, or load it with loader(session_id) -> SessionState.
+        With probe(session_id) -> message count, a cached copy is reloaded
+        when another worker has added messages since it was loaded.
+        """
+        state = self.sessions.get(str(session_id))
+        if state is not None and probe is not None:
+            try:
+                if probe(session_id) > state.known:
+                    state = None
+            except Exception as e:
+                log.warning("session probe failed", session_id=session_id, **error_fields(e))
+        if state is None:
+            state = loader(session_id)
+            self.sessions.set(str(session_id), state)
+        return state
+
+    def mark_new(self, session_id):
+        self.sessions.set(str(session_id), SessionState())
+
+    def record_message(self, session_id, row: dict, question: str, answer: str):
+        state = self.sessions.get(str(session_id))
+        if state is not None:
+            state.turns.append((question, answer))
+            state.has_messages = True
+            state.known += 1
+        self.writer.add_message(row)
+
+    def set_title(self, session_id, user_id, title: str):
+        # first title wins: another worker may have titled the session already
+        self.writer.update_session(session_id, {"title": title}, user_id=user_id, if_null="title")
+
+    def set_summary(self, session_id, summary: str):
+        state = self.sessions.get(str(session_id))
+        if state is not None:
+            state.summary = summary
+        self.writer.update_session(session_id, {"summary": summary})
+
+    def forget(self, session_id):
+        self.sessions.pop(str(session_id))
+        self.writer.discard_session(session_id)
+
+
+store = SessionStore()
+REGISTRY.register_cache("session", store.sessions.stats)
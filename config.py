@@ -3,15 +3,173 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+DOMAINS = {
+    "NLP",
+    "Quantum Information Retrieval and Information Teleportation",
+    "Quantum Resistant Cryptography and Identity Based Encryption",
+    "VLSI in Power Electronics and Embedded Systems"
+}
+
 class Settings:
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
     JWT_SECRET = os.getenv("JWT_SECRET")
     JWT_ALGO = os.getenv("JWT_ALGORITHM")
 
+    # auth: bcrypt cost, hash process pool, verified-token cache
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", "2"))
+    AUTH_MAX_PENDING = int(os.getenv("AUTH_MAX_PENDING", "32"))
+    TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+    TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "300"))
+
     DB_HOST = os.getenv("DB_HOST")
     DB_PORT = os.getenv("DB_PORT")
     DB_USER = os.getenv("DB_USER")
     DB_PASSWORD = os.getenv("DB_PASSWORD")
     DB_NAME = os.getenv("DB_NAME")
+    DATABASE_URL = os.getenv("DATABASE_URL")
+    DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+    DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+    # seconds a query waits for a free pooled connection before failing
+    DB_POOL_WAIT = float(os.getenv("DB_POOL_WAIT", "5"))
+
+    # "memory" (resident numpy index) or "pgvector" (kNN in Postgres)
+    RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "memory").lower()
+    PGVECTOR_EF_SEARCH = int(os.getenv("PGVECTOR_EF_SEARCH", "100"))
+
+    # "hybrid" fuses vector and BM25 rankings (RRF); "vector" is embeddings only
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+    RRF_K = int(os.getenv("RRF_K", "60"))
+    LEXICAL_FALLBACK = os.getenv("LEXICAL_FALLBACK", "true").lower() == "true"
+    EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT", "3"))
+
+    # resident index: none (float32) | int8 | float16, with exact re-ranking
+    INDEX_QUANTIZATION = os.getenv("INDEX_QUANTIZATION", "none").lower()
+    INDEX_RERANK_FACTOR = int(os.getenv("INDEX_RERANK_FACTOR", "4"))
+    INDEX_EXACT_PATH = os.getenv("INDEX_EXACT_PATH")  # spill file dir/prefix; unset = temp dir
+
+    # shared on-disk corpus snapshot (memory-mapped by every worker); unset =
+    # each worker builds its index from Supabase. With a watermark column
+    # (see retrieval/snapshot.py for the migration) a publisher process pulls
+    # papers changed since the watermark; empty = no incremental sync.
+    SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR")
+    SNAPSHOT_SYNC_INTERVAL = float(os.getenv("SNAPSHOT_SYNC_INTERVAL", "60"))  # 0 = off
+    SNAPSHOT_SYNC_LAG = float(os.getenv("SNAPSHOT_SYNC_LAG", "30"))
+    SNAPSHOT_WATERMARK_COLUMN = os.getenv("SNAPSHOT_WATERMARK_COLUMN", "")
+    SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "3"))
+
+    # without snapshots: poll the papers table (row count, newest watermark)
+    # and drop the resident index / cached answers when it changed
+    CORPUS_POLL_INTERVAL = float(os.getenv("CORPUS_POLL_INTERVAL", "60"))  # 0 = off
+
+    # IVF coarse index: off | on | auto (on from IVF_MIN_ROWS papers). Queries
+    # scan the IVF_NPROBE nearest k-means lists; "all" queries are routed to a
+    # single domain when it leads the runner-up by IVF_ROUTE_MARGIN (< 0 = never)
+    INDEX_IVF = os.getenv("INDEX_IVF", "auto").lower()
+    IVF_MIN_ROWS = int(os.getenv("IVF_MIN_ROWS", "50000"))
+    IVF_LISTS = int(os.getenv("IVF_LISTS", "0"))  # 0 = ~sqrt(rows)
+    IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+    IVF_ROUTE_MARGIN = float(os.getenv("IVF_ROUTE_MARGIN", "0.05"))
+    IVF_ITERATIONS = int(os.getenv("IVF_ITERATIONS", "10"))
+    IVF_TRAIN_SAMPLE = int(os.getenv("IVF_TRAIN_SAMPLE", "50000"))
+    IVF_RETRAIN_FRACTION = float(os.getenv("IVF_RETRAIN_FRACTION", "0.2"))
+
+    EMBED_MODEL = os.getenv("EMBED_MODEL", "text-embedding-004")
+    EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+    EMBED_CACHE_TTL = float(os.getenv("EMBED_CACHE_TTL", str(7 * 24 * 3600)))
+    EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH")  # unset = memory only
+    EMBED_CACHE_DISK_ROWS = int(os.getenv("EMBED_CACHE_DISK_ROWS", "100000"))
+
+    AUTOCORRECT_CACHE_SIZE = int(os.getenv("AUTOCORRECT_CACHE_SIZE", "2048"))
+    AUTOCORRECT_CACHE_TTL = float(os.getenv("AUTOCORRECT_CACHE_TTL", str(24 * 3600)))
+
+    # answer_query pipeline: executor size and per-stage deadlines (seconds)
+    PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "16"))
+    AUTOCORRECT_TIMEOUT = float(os.getenv("AUTOCORRECT_TIMEOUT", "5"))
+    RETRIEVE_TIMEOUT = float(os.getenv("RETRIEVE_TIMEOUT", "10"))
+    WEB_SEARCH_TIMEOUT = float(os.getenv("WEB_SEARCH_TIMEOUT", "8"))
+    LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+
+    # Tavily result cache; WEB_FRESHNESS overrides the TTL per domain as
+    # "Domain=seconds;Other Domain=seconds"
+    WEB_CACHE_SIZE = int(os.getenv("WEB_CACHE_SIZE", "2048"))
+    WEB_CACHE_TTL = float(os.getenv("WEB_CACHE_TTL", "3600"))
+    WEB_FRESHNESS = os.getenv("WEB_FRESHNESS", "")
+    WEB_NEGATIVE_TTL = float(os.getenv("WEB_NEGATIVE_TTL", "30"))
+
+    # web search gate: "adaptive" skips Tavily when the best papers' mean
+    # cosine similarity (top WEB_GATE_TOP_N) clears WEB_GATE_THRESHOLD and
+    # goes web-only when the corpus has no match; "always" searches every
+    # request, "never" answers from the corpus alone
+    WEB_SEARCH_POLICY = os.getenv("WEB_SEARCH_POLICY", "adaptive").lower()
+    WEB_GATE_THRESHOLD = float(os.getenv("WEB_GATE_THRESHOLD", "0.75"))
+    WEB_GATE_TOP_N = int(os.getenv("WEB_GATE_TOP_N", "3"))
+
+    # LLM provider layer: Gemini primary, Groq as hedge / fallback
+    GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite")
+    GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+    LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
+    LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+    LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+    LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1.0"))
+    LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "8.0"))
+
+    # semantic answer cache (cosine similarity on the corrected-query embedding)
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+    ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+    ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(6 * 3600)))
+
+    # /answer/batch: queries per request, concurrent generations, and
+    # queries scored per matrix-matrix block on the resident index
+    BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "64"))
+    BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+    BATCH_SCORE_COLUMNS = int(os.getenv("BATCH_SCORE_COLUMNS", "64"))
+
+    # chat memory: rolling summary + last N turns within a token budget
+    MEMORY_RECENT_TURNS = int(os.getenv("MEMORY_RECENT_TURNS", "4"))
+    MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "1500"))
+    MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "250"))
+    REWRITE_TIMEOUT = float(os.getenv("REWRITE_TIMEOUT", "5"))
+
+    # chat session hot cache + write-behind queue
+    SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "1000"))
+    SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "1800"))
+    WRITE_BEHIND_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", "0.5"))
+    WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "100"))
+    WRITE_BEHIND_MAX_RETRIES = int(os.getenv("WRITE_BEHIND_MAX_RETRIES", "5"))
+    WRITE_BEHIND_SHUTDOWN_TIMEOUT = float(os.getenv("WRITE_BEHIND_SHUTDOWN_TIMEOUT", "10"))
+
+    # bulk paper ingestion (python -m ingestion)
+    INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+    INGEST_EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "100"))
+    INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "4"))
+
+    # deep mode conclusion: structured | extractive | two_call
+    DEEP_SUMMARY_STRATEGY = os.getenv("DEEP_SUMMARY_STRATEGY", "structured").lower()
+
+    # prompt context: best passages of the retrieved papers within a token
+    # budget per mode (CONTEXT_PACKING=false pastes whole enriched_text)
+    CONTEXT_PACKING = os.getenv("CONTEXT_PACKING", "true").lower() == "true"
+    CONTEXT_TOKENS_SIMPLE = int(os.getenv("CONTEXT_TOKENS_SIMPLE", "1200"))
+    CONTEXT_TOKENS_DEEP = int(os.getenv("CONTEXT_TOKENS_DEEP", "2500"))
+    PASSAGE_CHARS = int(os.getenv("PASSAGE_CHARS", "800"))
+    PASSAGES_PER_PAPER = int(os.getenv("PASSAGES_PER_PAPER", "3"))
+    PASSAGE_INDEX = os.getenv("PASSAGE_INDEX", "auto").lower()  # auto | off
+
+    # chat history endpoints: keyset page size (?limit= is capped at the max)
+    HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+    HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "200"))
+
+    # observability: structured logs (json | text), INFO/DEBUG sampling, and
+    # per-stage timings in a Server-Timing response header
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+    LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+    SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() == "true"
+
+    # startup: build clients / load indexes before /ready passes
+    WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
 
 settings = Settings()
@@ -0,0 +1,48 @@
+import argparse
+import json
+from config import settings, DOMAINS
+from ingestion.pipeline import ingest_directory, Checkpoint, SupabaseSink, JsonlSink
+from ingestion.embedder import FakeEmbeddings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest GROBID TEI/JSON output into the papers table")
+    parser.add_argument("directory")
+    parser.add_argument("--domain", required=True, choices=sorted(DOMAINS))
+    parser.add_argument("--checkpoint", help="file recording ingested documents (resume support)")
+    parser.add_argument("--batch-size", type=int, default=settings.INGEST_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=settings.INGEST_CONCURRENCY)
+    parser.add_argument("--passages", action="store_true", help="also embed passages into paper_passages")
+    parser.add_argument("--fake-embeddings", action="store_true", help="offline deterministic embeddings")
+    parser.add_argument("--dry-run", metavar="OUT.jsonl", help="write rows to a file instead of Supabase")
+    args = parser.parse_args()
+
+    if args.fake_embeddings:
+        embeddings = FakeEmbeddings()
+    else:
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        embeddings = GoogleGenerativeAIEmbeddings(model=settings.EMBED_MODEL)
+
+    if args.dry_run:
+        sink = JsonlSink(args.dry_run)
+    else:
+        from supabaseclient import get_client
+        sink = SupabaseSink(get_client())
+
+    stats = ingest_directory(
+        args.directory, args.domain, embeddings, sink,
+        checkpoint=Checkpoint(args.checkpoint),
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        passages=args.passages,
+    )
+    if settings.SNAPSHOT_DIR and not args.dry_run:
+        # publish here so the serving workers only have to map the new version
+        from retrieval.snapshot import publish, publish_lock
+        with publish_lock():
+            stats["snapshot_version"] = publish(get_client())
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from logs import get_logger
+
+log = get_logger("ingest")
+
+
+class FakeEmbeddings:
+    """Deterministic offline stand-in for GoogleGenerativeAIEmbeddings."""
+
+    def __init__(self, dim: int = 768, latency: float = 0.0):
+        self.dim = dim
+        self.latency = latency
+
+    def _vec(self, text: str):
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+        v = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return (v / np.linalg.norm(v)).tolist()
+
+    def embed_query(self, text: str):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._vec(text)
+
+    def embed_documents(self, texts):
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._vec(t) for t in texts]
+
+
+class BatchEmbedder:
+    """
+    embed_documents in batches with a bounded number of requests in flight
+    and exponential backoff on provider errors (quota / 5xx).
+    """
+
+    def __init__(self, model, batch_size: int = 100, concurrency: int = 4,
+                 max_retries: int = 5, backoff: float = 1.0):
+        self.model = model
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="embed")
+        self.calls = 0
+        self.retries = 0
+
+    def _embed_batch(self, texts):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.calls += 1
+                return self.model.embed_documents(texts)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                delay = self.backoff * 2 ** attempt
+                log.warning("embedding batch failed, retrying", error=type(e).__name__, delay=round(delay, 1))
+                time.sleep(delay)
+
+    def embed(self, texts):
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        out = []
+        for vectors in self.pool.map(self._embed_batch, batches):
+            out.extend(vectors)
+        return out
+
+    def close(self):
+        self.pool.shutdown(wait=True)
@@ -0,0 +1,70 @@
+import hashlib
+import re
+
+CHUNK_CHARS = 1200
+ENRICHED_MAX_CHARS = 6000
+
+
+def paper_id(doc: dict, source: str) -> str:
+    """
+    Stable id: hash of the normalized title (falls back to the file name).
+    Collisions merge on purpose: the same paper exported as .tei.xml and
+    .json, or re-ingested from another directory, stays one row (the last
+    one written wins), and so do distinct papers sharing a title.
+    """
+    key = re.sub(r"\W+", " ", (doc.get("title") or source).lower()).strip()
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def chunk_text(paragraphs, max_chars: int = CHUNK_CHARS):
+    """Greedy paragraph packing into chunks of roughly max_chars."""
+    chunks = []
+    current = ""
+    for p in paragraphs:
+        p = p.strip()
+        if not p:
+            continue
+        if current and len(current) + len(p) + 1 > max_chars:
+            chunks.append(current)
+            current = ""
+        while len(p) > max_chars:
+            cut = p.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            chunks.append(p[:cut])
+            p = p[cut:].strip()
+        current = f"{current}\n{p}" if current else p
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def enrich(doc: dict, max_chars: int = ENRICHED_MAX_CHARS) -> str:
+    """
+    The text stored in papers.enriched_text (and embedded): title, authors and
+    abstract up front, then body chunks with their section heads until the cap.
+    """
+    parts = [f"Title: {doc.get('title', '')}"]
+    if doc.get("authors"):
+        parts.append(f"Authors: {', '.join(doc['authors'])}")
+    if doc.get("abstract"):
+        parts.append(f"Abstract: {doc['abstract']}")
+
+    text = "\n".join(parts)
+    for section in doc.get("sections", []):
+        for chunk in chunk_text(section["paragraphs"]):
+            block = f"\n\n{section['head']}\n{chunk}" if section["head"] else f"\n\n{chunk}"
+            if len(text) + len(block) > max_chars:
+                return text
+            text += block
+    return text
+
+
+def to_row(doc: dict, source: str, domain: str) -> dict:
+    return {
+        "paperid": paper_id(doc, source),
+        "title": doc.get("title") or source,
+        "authors": doc.get("authors") or ["Unknown"],
+        "year": doc.get("year"),
+        "domain": domain,
+        "enriched_text": enrich(doc),
+    }
@@ -0,0 +1,90 @@
+import json
+import os
+import xml.etree.ElementTree as ET
+from logs import get_logger, error_fields
+
+log = get_logger("ingest")
+
+TEI = "{http://www.tei-c.org/ns/1.0}"
+
+
+def _text(el):
+    return " ".join("".join(el.itertext()).split()) if el is not None else ""
+
+
+def parse_tei(path: str) -> dict:
+    """Pull title, authors, year, abstract and body paragraphs out of GROBID TEI XML."""
+    root = ET.parse(path).getroot()
+    header = root.find(f".//{TEI}teiHeader")
+
+    title = _text(header.find(f".//{TEI}titleStmt/{TEI}title")) if header is not None else ""
+
+    authors = []
+    for pers in root.iterfind(f".//{TEI}sourceDesc//{TEI}author/{TEI}persName"):
+        name = " ".join(
+            _text(p) for p in pers if p.tag in (f"{TEI}forename", f"{TEI}surname")
+        )
+        if name:
+            authors.append(name)
+
+    year = None
+    date = root.find(f".//{TEI}sourceDesc//{TEI}date")
+    if date is not None:
+        when = date.get("when") or _text(date)
+        if when[:4].isdigit():
+            year = int(when[:4])
+
+    abstract = " ".join(_text(p) for p in root.iterfind(f".//{TEI}profileDesc/{TEI}abstract//{TEI}p"))
+
+    sections = []
+    for div in root.iterfind(f".//{TEI}text/{TEI}body/{TEI}div"):
+        head = _text(div.find(f"{TEI}head"))
+        paras = [_text(p) for p in div.iterfind(f"{TEI}p")]
+        sections.append({"head": head, "paragraphs": [p for p in paras if p]})
+
+    return {"title": title, "authors": authors, "year": year, "abstract": abstract, "sections": sections}
+
+
+def parse_json(path: str) -> dict:
+    """GROBID-derived JSON (e.g. from doc2json): same fields as parse_tei."""
+    with open(path, encoding="utf-8") as f:
+        doc = json.load(f)
+
+    authors = []
+    for a in doc.get("authors", []):
+        if isinstance(a, str):
+            authors.append(a)
+        else:
+            authors.append(" ".join(filter(None, [a.get("first"), a.get("last")])))
+
+    sections = {}
+    for p in doc.get("body_text", []) or doc.get("pdf_parse", {}).get("body_text", []):
+        sections.setdefault(p.get("section", ""), []).append(p.get("text", ""))
+
+    abstract = doc.get("abstract", "")
+    if isinstance(abstract, list):
+        abstract = " ".join(p.get("text", "") for p in abstract)
+
+    year = doc.get("year")
+    return {
+        "title": doc.get("title", ""),
+        "authors": [a for a in authors if a],
+        "year": int(year) if str(year or "").isdigit() else None,
+        "abstract": abstract,
+        "sections": [{"head": h, "paragraphs": ps} for h, ps in sections.items()],
+    }
+
+
+def iter_documents(directory: str):
+    """Stream (file name, parsed document) pairs from a GROBID output directory."""
+    with os.scandir(directory) as entries:
+        names = sorted(e.name for e in entries if e.is_file())
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            if name.endswith(".tei.xml") or name.endswith(".xml"):
+                yield name, parse_tei(path)
+            elif name.endswith(".json"):
+                yield name, parse_json(path)
+        except (ET.ParseError, ValueError, OSError) as e:
+            log.warning("skipping document", name=name, **error_fields(e))
@@ -0,0 +1,149 @@
+import json
+import os
+import time
+from config import settings, DOMAINS
+from ingestion.grobid import iter_documents
+from ingestion.enrich import to_row
+from ingestion.embedder import BatchEmbedder
+from retrieval.passages import passage_rows
+from logs import get_logger
+
+log = get_logger("ingest")
+
+
+class SupabaseSink:
+    """Bulk upsert into papers (keyed by paperid) and paper_passages."""
+
+    def __init__(self, supabase, batch_size: int = 500):
+        self.supabase = supabase
+        self.batch_size = batch_size
+
+    def _upsert(self, table, rows, on_conflict):
+        for i in range(0, len(rows), self.batch_size):
+            self.supabase.table(table).upsert(
+                rows[i:i + self.batch_size], on_conflict=on_conflict
+            ).execute()
+
+    def write(self, rows):
+        self._upsert("papers", rows, "paperid")
+
+    def write_passages(self, rows):
+        self._upsert("paper_passages", rows, "paperid,passage")
+
+
+class JsonlSink:
+    """Offline sink: append rows to a JSON-lines file (dry runs, fixtures)."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _append(self, path, rows):
+        with open(path, "a", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+
+    def write(self, rows):
+        self._append(self.path, rows)
+
+    def write_passages(self, rows):
+        self._append(self.path + ".passages", rows)
+
+
+class Checkpoint:
+    """Names of source files already upserted; lets an interrupted run resume."""
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self.done = set()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.done = {line.strip() for line in f if line.strip()}
+
+    def __contains__(self, name):
+        return name in self.done
+
+    def mark(self, names):
+        self.done.update(names)
+        if self.path:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(n + "\n" for n in names)
+
+
+def ingest_directory(directory: str, domain: str, embeddings, sink,
+                     checkpoint: Checkpoint = None, batch_size: int = None,
+                     concurrency: int = None, passages: bool = False):
+    """
+    Stream GROBID output from directory into the papers table.
+
+    Documents are enriched, embedded batch_size at a time through
+    embed_documents and upserted as one batch; the checkpoint is only
+    advanced after a batch is written. With passages, each paper's passages
+    are embedded and written to paper_passages too. Returns throughput stats.
+    """
+    if domain not in DOMAINS:
+        raise ValueError(f"Unknown domain: {domain}")
+    checkpoint = checkpoint or Checkpoint()
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+    embedder = BatchEmbedder(
+        embeddings,
+        batch_size=settings.INGEST_EMBED_BATCH_SIZE,
+        concurrency=concurrency or settings.INGEST_CONCURRENCY,
+    )
+
+    stats = {"papers": 0, "passages": 0, "skipped": 0, "merged": 0, "batches": 0,
+             "parse_s": 0.0, "embed_s": 0.0, "upsert_s": 0.0}
+    started = time.perf_counter()
+
+    def flush(rows, names):
+        # one row per paperid: Postgres rejects an upsert batch that
+        # touches the same key twice; the last document wins
+        unique = list({r["paperid"]: r for r in rows}.values())
+        stats["merged"] += len(rows) - len(unique)
+        rows = unique
+        t = time.perf_counter()
+        vectors = embedder.embed([r["enriched_text"] for r in rows])
+        chunks = [p for r in rows for p in passage_rows(r)] if passages else []
+        for chunk, vec in zip(chunks, embedder.embed([p["text"] for p in chunks])):
+            chunk["embedding"] = vec
+        stats["embed_s"] += time.perf_counter() - t
+        for row, vec in zip(rows, vectors):
+            row["embedding"] = vec
+
+        t = time.perf_counter()
+        sink.write(rows)
+        if chunks:
+            sink.write_passages(chunks)
+        stats["upsert_s"] += time.perf_counter() - t
+        stats["passages"] += len(chunks)
+
+        checkpoint.mark(names)
+        stats["papers"] += len(rows)
+        stats["batches"] += 1
+        elapsed = time.perf_counter() - started
+        log.info("progress", papers=stats["papers"], papers_per_s=round(stats["papers"] / elapsed, 1))
+
+    rows, names = [], []
+    try:
+        t = time.perf_counter()
+        for name, doc in iter_documents(directory):
+            if name in checkpoint:
+                stats["skipped"] += 1
+                continue
+            rows.append(to_row(doc, name, domain))
+            names.append(name)
+            if len(rows) >= batch_size:
+                stats["parse_s"] += time.perf_counter() - t
+                flush(rows, names)
+                rows, names = [], []
+                t = time.perf_counter()
+        stats["parse_s"] += time.perf_counter() - t
+        if rows:
+            flush(rows, names)
+    finally:
+        embedder.close()
+
+    stats["total_s"] = time.perf_counter() - started
+    stats["papers_per_s"] = stats["papers"] / stats["total_s"] if stats["total_s"] else 0.0
+    stats["embed_calls"] = embedder.calls
+    stats["embed_retries"] = embedder.retries
+    return stats
@@ -0,0 +1,90 @@
+import json
+import logging
+import random
+import sys
+from config import settings
+
+
+class SampledFilter(logging.Filter):
+    """Keep every WARNING and above; keep DEBUG/INFO with probability rate."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg + structured fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """[logger] msg key=value ... (LOG_FORMAT=text, for local runs)."""
+
+    def format(self, record):
+        fields = " ".join(f"{k}={v!r}" for k, v in getattr(record, "fields", {}).items())
+        line = f"{record.levelname} [{record.name}] {record.getMessage()}"
+        return f"{line} {fields}" if fields else line
+
+
+class StructuredLogger:
+    """log.info("msg", key=value, ...): keyword arguments become JSON fields."""
+
+    def __init__(self, logger):
+        self.logger = logger
+
+    def _log(self, level, msg, fields):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, msg, extra={"fields": fields})
+
+    def debug(self, msg, **fields):
+        self._log(logging.DEBUG, msg, fields)
+
+    def info(self, msg, **fields):
+        self._log(logging.INFO, msg, fields)
+
+    def warning(self, msg, **fields):
+        self._log(logging.WARNING, msg, fields)
+
+    def error(self, msg, **fields):
+        self._log(logging.ERROR, msg, fields)
+
+
+ROOT = "sras"
+_configured = False
+
+
+def _configure():
+    global _configured
+    root = logging.getLogger(ROOT)
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(TextFormatter() if settings.LOG_FORMAT == "text" else JsonFormatter())
+    handler.addFilter(SampledFilter(settings.LOG_SAMPLE_RATE))
+    root.addHandler(handler)
+    root.setLevel(settings.LOG_LEVEL)
+    root.propagate = False
+    _configured = True
+
+
+def get_logger(name: str) -> StructuredLogger:
+    if not _configured:
+        _configure()
+    return StructuredLogger(logging.getLogger(f"{ROOT}.{name}"))
+
+
+def error_fields(e: Exception) -> dict:
+    return {"error": type(e).__name__, "detail": str(e)}
@@ -0,0 +1,227 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from config import settings
+
+# seconds; covers a cached lookup up to a slow deep-mode generation
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (64, 256, 1024, 2048, 4096, 8192, 16384, 32768, 65536, 262144, 1048576)
+
+
+def _label_str(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(n, "") for n in self.labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_label_str(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels):
+        series = self._series.get(tuple(labels.get(n, "") for n in self.labels))
+        return series[-1] if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_label_str(self.labels + ('le',), key + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_label_str(self.labels + ('le',), key + ('+Inf',))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_label_str(self.labels, key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_label_str(self.labels, key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.caches = {}  # name -> stats() callable (TTLCache-style dict)
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def register_cache(self, name: str, stats):
+        self.caches[name] = stats
+
+    def _cache_lines(self):
+        hits, misses, entries = [], [], []
+        for name, stats in self.caches.items():
+            try:
+                s = stats()
+            except Exception:
+                continue
+            label = _label_str(("cache",), (name,))
+            hits.append(f"cache_hits_total{label} {s.get('hits', 0)}")
+            misses.append(f"cache_misses_total{label} {s.get('misses', 0)}")
+            entries.append(f"cache_entries{label} {s.get('size', 0)}")
+        return (
+            ["# HELP cache_hits_total Cache lookups that hit", "# TYPE cache_hits_total counter"] + hits
+            + ["# HELP cache_misses_total Cache lookups that missed", "# TYPE cache_misses_total counter"] + misses
+            + ["# HELP cache_entries Entries currently held", "# TYPE cache_entries gauge"] + entries
+        )
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        lines += self._cache_lines()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_SECONDS = REGISTRY.histogram(
+    "http_request_seconds", "HTTP request latency", labels=("method", "route", "status")
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "stage_seconds", "Latency of one pipeline stage", labels=("stage",)
+)
+STAGE_ERRORS = REGISTRY.counter(
+    "stage_errors_total", "Pipeline stages that timed out or failed", labels=("stage", "reason")
+)
+ROWS_SCANNED = REGISTRY.counter(
+    "retrieve_rows_scanned_total", "Corpus rows scored by retrieve()", labels=("source",)
+)
+ROWS_PER_QUERY = REGISTRY.histogram(
+    "retrieve_rows_scanned", "Corpus rows scored per query", labels=("source",), buckets=SIZE_BUCKETS
+)
+RETRIEVAL_PATHS = REGISTRY.counter(
+    "retrieval_path_total", "Answers by evidence used: corpus, corpus+web, web_only, none, cache",
+    labels=("path",)
+)
+DB_POOL_WAITS = REGISTRY.counter(
+    "db_pool_waits_total", "Pooled connection checkouts that found the pool exhausted: waited, timeout",
+    labels=("outcome",)
+)
+PROMPT_TOKENS = REGISTRY.histogram(
+    "llm_prompt_tokens", "Estimated prompt size sent to the LLM", labels=("purpose",), buckets=SIZE_BUCKETS
+)
+
+# per-request stage timings for the Server-Timing header
+_timings = ContextVar("timings", default=None)
+
+
+def record_stage(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+@contextmanager
+def span(stage: str):
+    """Time a block (sync or containing awaits) as one pipeline stage."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - t0)
+
+
+def record_rows_scanned(source: str, rows: int):
+    ROWS_SCANNED.inc(rows, source=source)
+    ROWS_PER_QUERY.observe(rows, source=source)
+
+
+def server_timing(timings, total: float) -> str:
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: request latency histogram per route, and a Server-Timing
+    header with the stages that finished before the response started (all of
+    them for plain JSON responses; the pre-generation stages for streams).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings = []
+        token = _timings.set(timings)
+        t0 = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if settings.SERVER_TIMING:
+                    header = server_timing(timings, time.perf_counter() - t0)
+                    message = {**message, "headers": list(message.get("headers", [])) + [
+                        (b"server-timing", header.encode("latin-1"))
+                    ]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _timings.reset(token)
+            route = scope.get("route")
+            HTTP_SECONDS.observe(
+                time.perf_counter() - t0,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status["code"],
+            )
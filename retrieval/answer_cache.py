@@ -0,0 +1,89 @@
+import threading
+import time
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Answers keyed on the (normalized) corrected-query embedding, bucketed by
+    (mode, domain). A lookup hits when the most similar live entry in the
+    bucket clears the threshold. Entries expire after ttl; the least recently
+    used entry is evicted once maxsize is reached.
+    """
+
+    def __init__(self, threshold: float = 0.95, maxsize: int = 1024, ttl: float = 6 * 3600):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # (mode, domain) -> {"vecs": [np.ndarray], "entries": [dict]}
+        self._buckets = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(vec):
+        v = np.asarray(vec, dtype=np.float32)
+        n = np.linalg.norm(v)
+        return v / n if n else v
+
+    def _drop(self, bucket, i):
+        del bucket["vecs"][i]
+        del bucket["entries"][i]
+        self._size -= 1
+
+    def get(self, q_emb, mode: str, domain: str):
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get((mode, domain))
+            if bucket and bucket["vecs"]:
+                sims = np.vstack(bucket["vecs"]) @ self._unit(q_emb)
+                for i in np.argsort(-sims):
+                    entry = bucket["entries"][i]
+                    if sims[i] < self.threshold:
+                        break
+                    if entry["expires"] > now:
+                        entry["used"] = now
+                        self.hits += 1
+                        return dict(entry["answer"]), float(sims[i])
+            self.misses += 1
+            return None, 0.0
+
+    def set(self, q_emb, mode: str, domain: str, answer: dict):
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.setdefault((mode, domain), {"vecs": [], "entries": []})
+            bucket["vecs"].append(self._unit(q_emb))
+            bucket["entries"].append({"answer": dict(answer), "expires": now + self.ttl, "used": now})
+            self._size += 1
+            if self._size > self.maxsize:
+                self._evict(now)
+
+    def _evict(self, now):
+        # expired entries first, then the least recently used one
+        for bucket in self._buckets.values():
+            for i in reversed(range(len(bucket["entries"]))):
+                if bucket["entries"][i]["expires"] <= now:
+                    self._drop(bucket, i)
+        while self._size > self.maxsize:
+            bucket, i = min(
+                ((b, j) for b in self._buckets.values() for j in range(len(b["entries"]))),
+                key=lambda bj: bj[0]["entries"][bj[1]]["used"],
+            )
+            self._drop(bucket, i)
+
+    def invalidate(self):
+        """Forget every answer, e.g. after the papers corpus changed."""
+        with self._lock:
+            self._buckets.clear()
+            self._size = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
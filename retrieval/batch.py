@@ -0,0 +1,112 @@
+"""
+Batch answering (/answer/batch).
+
+The query-only stages run once for the whole batch: autocorrect per distinct
+query, one embed_documents call, one matrix-matrix scoring pass over the
+resident index, and one web search per distinct (query, domain) whose
+corpus results don't clear the web search gate (retrieval_path). Generation
+then runs through answer_events with at most BATCH_CONCURRENCY in flight,
+and each result is yielded as soon as it finishes.
+"""
+import asyncio
+import time
+from autocorrect import gemini_autocorrect
+from config import settings
+from retrieval.retriever import (
+    CORPUS_WEB, WEB_ONLY, answer_query, embed_many, retrieval_path, retrieve_many, run_blocking,
+    run_stage, run_web_search,
+)
+from retrieval.web_search import normalize_query
+from logs import get_logger, error_fields
+
+log = get_logger("batch")
+
+
+async def answer_batch_events(items, mode: str = "simple"):
+    """
+    items: [{"query", "domain"}]. Yields one "result" event per query
+    ({"index", ...answer_query dict}) in completion order, an "error"
+    event for a query that failed, then "done".
+    """
+    started = time.perf_counter()
+    queries = [item["query"] for item in items]
+    domains = [item.get("domain", "all") for item in items]
+
+    # ===== AUTOCORRECT (once per distinct query) =====
+    distinct = list(dict.fromkeys(queries))
+    corrected = await asyncio.gather(*[
+        run_stage("autocorrect", run_blocking(gemini_autocorrect, q), settings.AUTOCORRECT_TIMEOUT, default=q)
+        for q in distinct
+    ])
+    corrected = dict(zip(distinct, corrected))
+    searches = [corrected[q] for q in queries]
+
+    # ===== EMBEDDING + RETRIEVAL (whole batch) =====
+    q_embs = await run_stage("embed", run_blocking(embed_many, searches), settings.EMBED_TIMEOUT)
+    results = await run_stage(
+        "retrieve", run_blocking(retrieve_many, searches, domains, q_embs), settings.RETRIEVE_TIMEOUT
+    )
+    if results is None:
+        results = [None] * len(items)
+
+    # ===== WEB SEARCH (once per distinct search the gate lets through) =====
+    web_tasks = {}
+    for q, d, rows in zip(searches, domains, results):
+        key = (normalize_query(q), d)
+        if key not in web_tasks and retrieval_path(rows) in (CORPUS_WEB, WEB_ONLY):
+            web_tasks[key] = asyncio.ensure_future(
+                run_stage("web_search", run_web_search(q, domain=d), settings.WEB_SEARCH_TIMEOUT, default="")
+            )
+
+    # ===== GENERATION (identical questions answered once) =====
+    groups = {}
+    for i, (q, d) in enumerate(zip(searches, domains)):
+        groups.setdefault((normalize_query(q), d), []).append(i)
+
+    gate = asyncio.Semaphore(max(1, settings.BATCH_CONCURRENCY))
+
+    async def answer_group(key, indexes):
+        i = indexes[0]
+        req = {
+            "Actualquery": queries[i],
+            "mode": mode,
+            "domain": domains[i],
+            "corrected_query": searches[i],
+            "q_emb": q_embs[i] if q_embs is not None else None,
+            "results": results[i],
+        }
+        if key in web_tasks:
+            req["web_task"] = web_tasks[key]
+        async with gate:
+            try:
+                return indexes, await answer_query(req), None
+            except Exception as e:
+                log.warning("batch query failed", index=i, **error_fields(e))
+                return indexes, None, f"{type(e).__name__}: {e}"
+
+    tasks = [asyncio.ensure_future(answer_group(k, ix)) for k, ix in groups.items()]
+    answered = failed = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            indexes, result, error = await next_done
+            for i in indexes:
+                if error is None:
+                    answered += 1
+                    # same answer, but each index reports its own original query
+                    yield {"event": "result", "data": {**result, "index": i, "original_query": queries[i]}}
+                else:
+                    failed += 1
+                    yield {"event": "error", "data": {"index": i, "query": queries[i], "detail": error}}
+    finally:
+        # client gone: stop the generations and searches still running
+        for task in tasks + list(web_tasks.values()):
+            task.cancel()
+
+    yield {"event": "done", "data": {
+        "queries": len(items),
+        "answered": answered,
+        "failed": failed,
+        "distinct_questions": len(groups),
+        "web_searches": len(web_tasks),
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }}
@@ -0,0 +1,196 @@
+import re
+from collections import Counter, defaultdict
+import numpy as np
+from retrieval.summarize import STOPWORDS
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_][a-z0-9]+)*")
+
+
+def tokenize(text: str):
+    # keeps acronyms and names like "bb84", "rsa-2048", "bert_base" intact
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+class BM25Partition:
+    """Okapi BM25 over one domain's documents; postings are packed numpy arrays."""
+
+    def __init__(self, docs, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.n = len(docs)
+        lengths = np.zeros(self.n, dtype=np.float32)
+
+        postings = defaultdict(lambda: ([], []))
+        for i, text in enumerate(docs):
+            counts = Counter(tokenize(text))
+            lengths[i] = sum(counts.values())
+            for term, tf in counts.items():
+                ids, tfs = postings[term]
+                ids.append(i)
+                tfs.append(tf)
+
+        avgdl = float(lengths.mean()) if self.n else 0.0
+        self.norm = (k1 * (1 - b + b * lengths / avgdl)).astype(np.float32) if avgdl else lengths
+        self.postings = {}
+        for term, (ids, tfs) in postings.items():
+            df = len(ids)
+            idf = np.log(1 + (self.n - df + 0.5) / (df + 0.5))
+            self.postings[term] = (np.asarray(ids, dtype=np.int32), np.asarray(tfs, dtype=np.float32), idf)
+
+    def pack(self):
+        """(terms, arrays): postings concatenated in term order, for snapshots."""
+        terms = list(self.postings)
+        lengths = [len(self.postings[t][0]) for t in terms]
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        empty_i, empty_f = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        return terms, {
+            "offsets": offsets,
+            "ids": np.concatenate([self.postings[t][0] for t in terms]) if terms else empty_i,
+            "tfs": np.concatenate([self.postings[t][1] for t in terms]) if terms else empty_f,
+            "idf": np.asarray([self.postings[t][2] for t in terms], dtype=np.float64),
+            "norm": np.asarray(self.norm, dtype=np.float32),
+        }
+
+    @classmethod
+    def unpack(cls, terms, arrays, k1: float = 1.2, b: float = 0.75):
+        """Partition over pack() output; the arrays may be memory-mapped."""
+        part = cls.__new__(cls)
+        part.k1 = k1
+        part.b = b
+        part.norm = arrays["norm"]
+        part.n = len(part.norm)
+        part.postings = PackedPostings(terms, arrays)
+        return part
+
+    def scores(self, terms):
+        scores = np.zeros(self.n, dtype=np.float32)
+        for term in set(terms):
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            ids, tfs, idf = entry
+            scores[ids] += idf * tfs * (self.k1 + 1) / (tfs + self.norm[ids])
+        return scores
+
+    def nbytes(self):
+        return self.norm.nbytes + sum(ids.nbytes + tfs.nbytes for ids, tfs, _ in self.postings.values())
+
+
+class PackedPostings:
+    """term -> (ids, tfs, idf) views into concatenated posting arrays."""
+
+    def __init__(self, terms, arrays):
+        self.index = {term: j for j, term in enumerate(terms)}
+        self.offsets = arrays["offsets"]
+        self.ids = arrays["ids"]
+        self.tfs = arrays["tfs"]
+        self.idf = arrays["idf"]
+
+    def get(self, term):
+        j = self.index.get(term)
+        if j is None:
+            return None
+        lo, hi = self.offsets[j], self.offsets[j + 1]
+        return self.ids[lo:hi], self.tfs[lo:hi], self.idf[j]
+
+    def values(self):
+        return (self.get(term) for term in self.index)
+
+
+class BM25Index:
+    """
+    Lexical index over title + enriched_text, one partition per domain.
+    meta/slices follow PaperIndex: rows grouped by domain, meta tuples
+    (title, authors, year, enriched_text, paperid, domain).
+    """
+
+    def __init__(self, meta, slices):
+        self.meta = meta
+        self.slices = slices
+        self.partitions = {
+            domain: BM25Partition([f"{m[0]} {m[3]}" for m in meta[start:end]])
+            for domain, (start, end) in slices.items()
+        }
+
+    @classmethod
+    def from_partitions(cls, meta, slices, partitions):
+        index = cls.__new__(cls)
+        index.meta = meta
+        index.slices = slices
+        index.partitions = partitions
+        return index
+
+    def search(self, query: str, domain: str = "all", k: int = 20):
+        """Best-first [(row index into meta, bm25 score)] with score > 0."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        domains = list(self.slices) if domain == "all" else [domain]
+
+        hits = []
+        for d in domains:
+            part = self.partitions.get(d)
+            if part is None or not part.n:
+                continue
+            scores = part.scores(terms)
+            top = np.argpartition(-scores, min(k, part.n) - 1)[:k] if part.n > k else np.arange(part.n)
+            start = self.slices[d][0]
+            hits += [(start + int(i), float(scores[i])) for i in top if scores[i] > 0]
+        hits.sort(key=lambda h: -h[1])
+        return hits[:k]
+
+    def nbytes(self):
+        return sum(p.nbytes() for p in self.partitions.values())
+
+
+def rrf_fuse(rankings, k: int = 60):
+    """Reciprocal-rank fusion of best-first key lists; returns keys best-first."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            scores[key] += 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda key: -scores[key])
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import time
+    import tracemalloc
+
+    parser = argparse.ArgumentParser(description="BM25 build time / memory / query latency")
+    parser.add_argument("--jsonl", help="rows from `python -m ingestion --dry-run` (default: Supabase papers)")
+    parser.add_argument("--queries", nargs="*", default=["transformer attention", "BB84 quantum key distribution",
+                                                          "identity based encryption lattice", "MOSFET inverter"])
+    args = parser.parse_args()
+
+    from retrieval.index import fetch_papers, group_by_domain, LEXICAL_COLUMNS
+    if args.jsonl:
+        with open(args.jsonl, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f]
+    else:
+        from supabaseclient import get_client
+        rows = fetch_papers(get_client(), columns=LEXICAL_COLUMNS)
+
+    meta, slices, _ = group_by_domain(rows)
+    tracemalloc.start()
+    t = time.perf_counter()
+    bm25 = BM25Index(meta, slices)
+    build_s = time.perf_counter() - t
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    t = time.perf_counter()
+    reps = 20
+    for _ in range(reps):
+        for q in args.queries:
+            bm25.search(q)
+    print(json.dumps({
+        "docs": len(meta),
+        "terms": sum(len(p.postings) for p in bm25.partitions.values()),
+        "build_s": build_s,
+        "postings_bytes": bm25.nbytes(),
+        "build_peak_bytes": peak,
+        "ms_per_query": (time.perf_counter() - t) * 1000 / (reps * len(args.queries)),
+    }, indent=2))
@@ -0,0 +1,135 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+from cache import TTLCache
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text.strip().lower())
+
+
+def cache_key(text: str, model_name: str) -> str:
+    """Content address: model name + normalized text."""
+    return hashlib.sha256(f"{model_name}\x00{normalize_text(text)}".encode()).hexdigest()
+
+
+class DiskTier:
+    """
+    SQLite-backed second tier so cached embeddings survive restarts.
+
+    Expired rows are deleted on open and every purge_every sets; past
+    maxrows the oldest rows are evicted, so the file stays bounded.
+    """
+
+    def __init__(self, path: str, ttl: float, maxrows: int = 100000, purge_every: int = 1000):
+        self.ttl = ttl
+        self.maxrows = maxrows
+        self.purge_every = purge_every
+        self._sets = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings "
+            "(key TEXT PRIMARY KEY, vec BLOB NOT NULL, created REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_created ON embeddings (created)")
+        self._db.commit()
+        with self._lock:
+            self._purge()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT vec, created FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        vec, created = row
+        if time.time() - created > self.ttl:
+            return None
+        return np.frombuffer(vec, dtype=np.float32).tolist()
+
+    def set(self, key: str, vec):
+        blob = np.asarray(vec, dtype=np.float32).tobytes()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO embeddings (key, vec, created) VALUES (?, ?, ?)",
+                (key, blob, time.time()),
+            )
+            self._sets += 1
+            if self._sets % self.purge_every == 0:
+                self._purge()
+            self._db.commit()
+
+    def _purge(self):
+        """Drop expired rows, then the oldest ones beyond maxrows (caller holds the lock)."""
+        self._db.execute("DELETE FROM embeddings WHERE created < ?", (time.time() - self.ttl,))
+        (rows,) = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if rows > self.maxrows:
+            self._db.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY created LIMIT ?)",
+                (rows - self.maxrows,),
+            )
+        self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+class CachedEmbeddings:
+    """
+    Drop-in wrapper around a LangChain embeddings model that serves repeated
+    queries from an in-memory LRU (and optionally an on-disk tier).
+    """
+
+    def __init__(self, model, model_name: str, maxsize: int = 4096,
+                 ttl: float = 7 * 24 * 3600, disk_path: str = None, disk_maxrows: int = 100000):
+        self.model = model
+        self.model_name = model_name
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.disk = DiskTier(disk_path, ttl, maxrows=disk_maxrows) if disk_path else None
+        self.disk_hits = 0
+
+    def _lookup(self, key: str):
+        vec = self.memory.get(key)
+        if vec is None and self.disk is not None:
+            vec = self.disk.get(key)
+            if vec is not None:
+                self.disk_hits += 1
+                self.memory.set(key, vec)
+        return vec
+
+    def _store(self, key: str, vec):
+        self.memory.set(key, vec)
+        if self.disk is not None:
+            self.disk.set(key, vec)
+
+    def embed_query(self, text: str):
+        key = cache_key(text, self.model_name)
+        vec = self._lookup(key)
+        if vec is None:
+            vec = self.model.embed_query(text)
+            self._store(key, vec)
+        return vec
+
+    def embed_documents(self, texts):
+        keys = [cache_key(t, self.model_name) for t in texts]
+        out = [self._lookup(k) for k in keys]
+
+        missing = [i for i, v in enumerate(out) if v is None]
+        if missing:
+            fresh = self.model.embed_documents([texts[i] for i in missing])
+            for i, vec in zip(missing, fresh):
+                out[i] = vec
+                self._store(keys[i], vec)
+        return out
+
+    def stats(self):
+        stats = self.memory.stats()
+        stats["disk_hits"] = self.disk_hits
+        return stats
@@ -0,0 +1,364 @@
+import json
+import threading
+import numpy as np
+from config import settings
+from retrieval.quantize import QuantizedMatrix, spill_to_disk, candidates
+from retrieval.bm25 import BM25Index
+from retrieval.ivf import IVFIndex, ivf_enabled
+from metrics import record_rows_scanned
+from logs import get_logger
+
+log = get_logger("index")
+
+PAGE_SIZE = 1000
+PAPER_COLUMNS = "title, authors, year, enriched_text, paperid, embedding, domain"
+LEXICAL_COLUMNS = "title, authors, year, enriched_text, paperid, domain"
+
+
+def parse_embedding(emb):
+    """Supabase returns pgvector columns as JSON text, decode once at load time."""
+    if isinstance(emb, str):
+        emb = json.loads(emb)
+    return np.asarray(emb, dtype=np.float32)
+
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def fetch_papers(supabase, page_size: int = PAGE_SIZE, columns: str = PAPER_COLUMNS):
+    """Page through the papers table (PostgREST caps a single response)."""
+    return fetch_rows(supabase, "papers", columns, ("paperid",), page_size)
+
+
+def fetch_rows(supabase, table: str, columns: str, order=("paperid",), page_size: int = PAGE_SIZE,
+               where=None):
+    """
+    Page through rows with an embedding; order must be unique for stable pages.
+    where: optional fn(query) -> query adding filters (e.g. a watermark).
+    """
+    rows = []
+    start = 0
+    while True:
+        query = supabase.table(table).select(columns).not_.is_("embedding", None)
+        if where is not None:
+            query = where(query)
+        for column in order:
+            query = query.order(column)
+        response = query.range(start, start + page_size - 1).execute()
+        batch = response.data or []
+        rows.extend(batch)
+        if len(batch) < page_size:
+            return rows
+        start += page_size
+
+
+def group_by_domain(rows):
+    """
+    Sort rows by domain and split them into a metadata side-table
+    (title, authors, year, enriched_text, paperid, domain) plus
+    domain -> (start, end) slices. Returns (meta, slices, sorted rows).
+    """
+    rows = sorted(rows, key=lambda r: r.get("domain") or "")
+    meta = [
+        (r["title"], r["authors"], r["year"], r["enriched_text"], r["paperid"], r.get("domain"))
+        for r in rows
+    ]
+    slices = {}
+    for i, m in enumerate(meta):
+        start, _ = slices.get(m[5], (i, i))
+        slices[m[5]] = (start, i + 1)
+    return meta, slices, rows
+
+
+class PaperIndex:
+    """
+    Resident cosine index over the papers table.
+
+    Rows are grouped by domain so every domain is a contiguous slice of one
+    pre-normalized float32 matrix; metadata lives in a parallel side-table.
+    """
+
+    def __init__(self, rows, quantization: str = None, rerank_factor: int = None):
+        meta, slices, rows = group_by_domain(rows)
+        vectors = [parse_embedding(r["embedding"]) for r in rows]
+
+        if vectors:
+            matrix = normalize_rows(np.vstack(vectors).astype(np.float32))
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        self._attach(meta, slices, matrix, quantization, rerank_factor)
+        if ivf_enabled(len(self.meta)):
+            self.ivf = IVFIndex.train(self.matrix, self.slices)
+
+    @classmethod
+    def from_snapshot(cls, snapshot, quantization: str = None, rerank_factor: int = None):
+        """
+        Index over a memory-mapped corpus snapshot (retrieval.snapshot): the
+        matrix, metadata and BM25 postings stay in the shared page cache.
+        """
+        index = cls.__new__(cls)
+        index._attach(snapshot.meta, snapshot.slices, snapshot.matrix, quantization, rerank_factor)
+        index.lexical = snapshot.lexical()
+        index.version = snapshot.version
+        index.ivf = snapshot.ivf()
+        if index.ivf is None and ivf_enabled(len(index.meta)):
+            index.ivf = IVFIndex.train(index.matrix, index.slices)
+        return index
+
+    def _attach(self, meta, slices, matrix, quantization, rerank_factor):
+        quantization = quantization or settings.INDEX_QUANTIZATION
+        self.rerank_factor = rerank_factor or settings.INDEX_RERANK_FACTOR
+        self.meta, self.slices, self.matrix = meta, slices, matrix
+
+        # quantized mode: scan the compact codes, re-rank candidates against
+        # the exact float32 rows, which move to a memory-mapped file
+        self.quantized = None
+        if quantization != "none" and len(self.matrix):
+            self.quantized = QuantizedMatrix(np.asarray(self.matrix), quantization)
+            if not isinstance(self.matrix, np.memmap):
+                self.matrix = spill_to_disk(self.matrix, settings.INDEX_EXACT_PATH)
+
+        self.lexical = None
+        self.ivf = None         # IVF coarse index (retrieval.ivf), None = exact scan
+        self.version = None     # snapshot version, None when built from rows
+
+    def __len__(self):
+        return len(self.meta)
+
+    def _span(self, domain: str):
+        if domain == "all":
+            return 0, len(self.meta)
+        return self.slices.get(domain, (0, 0))
+
+    @staticmethod
+    def _unit(q_emb):
+        q = np.asarray(q_emb, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        return q / norm if norm else q
+
+    def scores(self, q_emb, domain: str = "all"):
+        """
+        Cosine similarity of the query against every row in the domain slice
+        (approximate when the index is quantized).
+        """
+        start, end = self._span(domain)
+        if end <= start:
+            return start, np.zeros(0, dtype=np.float32)
+        q = self._unit(q_emb)
+        if self.quantized is not None:
+            return start, self.quantized.scores(q, start, end)
+        return start, self.matrix[start:end] @ q
+
+    def search(self, q_emb, domain: str = "all", k: int = 20, min_sim: float = 0.0):
+        """
+        Return up to k rows shaped like the old SQL result
+        [title, authors, year, enriched_text, paperid, distance], best first.
+        """
+        if self.ivf is not None:
+            return self.ivf_search(q_emb, domain, k, min_sim)
+        start, sims = self.scores(q_emb, domain)
+        return self._rank(start, sims, self._unit(q_emb), k, min_sim)
+
+    def search_many(self, q_embs, domains, k: int = 20, min_sim: float = 0.0):
+        """
+        search() for a batch of queries: each domain slice is scored against
+        all of its queries in one matrix-matrix product (BATCH_SCORE_COLUMNS
+        queries at a time, bounding the (rows, queries) score block).
+        """
+        if self.ivf is not None:
+            # each query probes its own lists: nothing to share
+            return [self.ivf_search(q, d, k, min_sim) for q, d in zip(q_embs, domains)]
+        queries = normalize_rows(np.asarray(q_embs, dtype=np.float32).reshape(len(domains), -1))
+        by_domain = {}
+        for i, domain in enumerate(domains):
+            by_domain.setdefault(domain, []).append(i)
+
+        out = [[] for _ in domains]
+        step = max(1, settings.BATCH_SCORE_COLUMNS)
+        for domain, ids in by_domain.items():
+            start, end = self._span(domain)
+            if end <= start:
+                continue
+            for lo in range(0, len(ids), step):
+                chunk = ids[lo:lo + step]
+                block = np.ascontiguousarray(queries[chunk].T)
+                if self.quantized is not None:
+                    sims = self.quantized.scores(block, start, end)
+                else:
+                    sims = self.matrix[start:end] @ block
+                for col, i in enumerate(chunk):
+                    out[i] = self._rank(start, np.ascontiguousarray(sims[:, col]), queries[i], k, min_sim)
+        return out
+
+    def ivf_search(self, q_emb, domain: str = "all", k: int = 20, min_sim: float = 0.0,
+                   nprobe: int = None):
+        """search() over the rows of the nprobe nearest IVF lists only (exact float32)."""
+        q = self._unit(q_emb)
+        ids = self.ivf.probe(q, domain, nprobe)
+        record_rows_scanned("ivf", len(ids))
+        if not len(ids):
+            return []
+        sims = np.asarray(self.matrix[ids]) @ q
+        return self.top_k(0, sims, k, min_sim, ids)
+
+    def _rank(self, start, sims, q, k, min_sim):
+        """top_k of first-pass sims, re-ranked exactly when the scan was quantized."""
+        if self.quantized is None or not len(sims):
+            return self.top_k(start, sims, k, min_sim)
+
+        # exact float32 re-rank of the best first-pass candidates
+        ids = candidates(sims, k * 2 * self.rerank_factor)
+        exact = np.asarray(self.matrix[start + ids]) @ q
+        return self.top_k(start, exact, k, min_sim, ids)
+
+    def top_k(self, start, sims, k, min_sim, ids=None):
+        """Best-first rows for sims; ids maps sims positions to slice offsets."""
+        n = len(sims)
+        if n == 0 or k <= 0:
+            return []
+
+        # over-fetch a little so duplicate paperids don't starve the top-k
+        fetch = min(n, k * 2)
+        if fetch < n:
+            idx = np.argpartition(-sims, fetch - 1)[:fetch]
+        else:
+            idx = np.arange(n)
+        idx = idx[np.argsort(-sims[idx], kind="stable")]
+
+        seen = set()
+        good = []
+        for i in idx:
+            sim = float(sims[i])
+            if sim < min_sim:
+                break
+            row = start + (ids[i] if ids is not None else i)
+            title, authors, year, text, pid, _ = self.meta[row]
+            if pid in seen:
+                continue
+            seen.add(pid)
+            good.append([title, authors, year, text, pid, 1 - sim])
+            if len(good) >= k:
+                break
+        return good
+
+    def similarity(self, row_ids, q_emb):
+        """Exact cosine similarity of specific rows (e.g. lexical hits) with the query."""
+        if not len(row_ids):
+            return np.zeros(0, dtype=np.float32)
+        return np.asarray(self.matrix[np.asarray(row_ids)]) @ self._unit(q_emb)
+
+    def row(self, i, sim=None):
+        """Result row for meta index i; distance is None when sim is unknown."""
+        title, authors, year, text, pid, _ = self.meta[i]
+        return [title, authors, year, text, pid, None if sim is None else 1 - sim]
+
+    def memory_bytes(self):
+        """Resident bytes of the scan structure (the memory-mapped exact rows excluded)."""
+        ivf = self.ivf.nbytes() if self.ivf is not None else 0
+        if self.quantized is not None:
+            return self.quantized.nbytes() + ivf
+        return self.matrix.nbytes + ivf
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_index(supabase):
+    """Build the index on first use and keep it resident for the process."""
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                if settings.SNAPSHOT_DIR:
+                    # map the shared on-disk snapshot (published on first use)
+                    from retrieval.snapshot import load_index
+                    index = load_index(supabase)
+                else:
+                    index = build_index(supabase)
+                _index = index
+                log.info("index loaded", papers=len(_index), version=_index.version,
+                         memory_mb=round(_index.memory_bytes() / 1e6, 1))
+    return _index
+
+
+def build_index(supabase):
+    """PaperIndex + BM25 over the whole papers table (no snapshot)."""
+    index = PaperIndex(fetch_papers(supabase))
+    index.lexical = BM25Index(index.meta, index.slices)
+    return index
+
+
+def swap_index(index):
+    """Replace the resident index, e.g. with a newer snapshot. Queries already
+    running keep the index they started with."""
+    global _index
+    with _lock:
+        _index = index
+
+
+_lexical = None
+
+
+def get_lexical_index(supabase):
+    """
+    BM25 index over title + enriched_text. Shares the resident PaperIndex
+    metadata; with the pgvector backend it is loaded on its own (no vectors).
+    """
+    global _lexical
+    if settings.RETRIEVAL_BACKEND != "pgvector":
+        return get_index(supabase).lexical
+    if _lexical is None:
+        with _lock:
+            if _lexical is None:
+                meta, slices, _ = group_by_domain(fetch_papers(supabase, columns=LEXICAL_COLUMNS))
+                _lexical = BM25Index(meta, slices)
+                log.info("bm25 index loaded", papers=len(meta))
+    return _lexical
+
+
+def corpus_version(supabase):
+    """
+    Cheap change probe for the papers table: (row count, newest watermark).
+    Without SNAPSHOT_WATERMARK_COLUMN only inserts and deletes are seen.
+    """
+    resp = supabase.table("papers").select("paperid", count="exact").limit(1).execute()
+    newest = None
+    column = settings.SNAPSHOT_WATERMARK_COLUMN
+    if column:
+        rows = (supabase.table("papers").select(column).not_.is_(column, None)
+                .order(column, desc=True).limit(1).execute().data)
+        newest = rows[0][column] if rows else None
+    return resp.count, newest
+
+
+def rebuild_index(supabase):
+    """
+    Rebuild the resident index(es) from the papers table without holding
+    the lock, then swap: queries keep using the old index until the new
+    one is complete. Only rebuilds what has been loaded.
+    """
+    global _lexical
+    if settings.RETRIEVAL_BACKEND == "pgvector":
+        if _lexical is not None:
+            meta, slices, _ = group_by_domain(fetch_papers(supabase, columns=LEXICAL_COLUMNS))
+            lexical = BM25Index(meta, slices)
+            with _lock:
+                _lexical = lexical
+            log.info("bm25 index rebuilt", papers=len(meta))
+        return
+    if _index is not None:
+        index = build_index(supabase)
+        swap_index(index)
+        log.info("index rebuilt", papers=len(index), memory_mb=round(index.memory_bytes() / 1e6, 1))
+
+
+def invalidate_index():
+    """Drop the resident index so the next query reloads the papers table."""
+    global _index, _lexical
+    with _lock:
+        _index = None
+        _lexical = None
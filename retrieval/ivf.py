@@ -0,0 +1,214 @@
+"""
+IVF coarse quantizer over the resident paper matrix.
+
+Every domain slice gets its own spherical k-means centroids, so an inverted
+list never mixes domains and a domain filter only probes its own lists.
+A query scans the rows of its nprobe nearest lists instead of the whole
+slice. With domain="all" it is first compared with the per-domain mean
+vectors: when one domain leads the runner-up by IVF_ROUTE_MARGIN, only that
+domain's lists are probed.
+
+New rows are assigned to the nearest trained centroid of their domain
+(add), so corpus updates don't re-run k-means; once IVF_RETRAIN_FRACTION of
+the rows were added that way the next full build / snapshot retrains.
+"""
+import numpy as np
+from config import settings
+
+ASSIGN_BLOCK = 65536  # rows per centroid-assignment product
+TRAIN_PER_LIST = 64   # k-means sample size per centroid (capped by IVF_TRAIN_SAMPLE)
+
+
+def normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def assign_nearest(vectors, centroids):
+    """Index of the most similar centroid for every (unit) row."""
+    out = np.empty(len(vectors), dtype=np.int64)
+    for lo in range(0, len(vectors), ASSIGN_BLOCK):
+        block = np.asarray(vectors[lo:lo + ASSIGN_BLOCK])
+        out[lo:lo + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+def split_lists(assign, k: int, offset: int = 0):
+    """Row ids (offset + position) grouped by assigned list, as k arrays."""
+    order = np.argsort(assign, kind="stable")
+    bounds = np.cumsum(np.bincount(assign, minlength=k))[:-1]
+    return [ids + offset for ids in np.split(order.astype(np.int64), bounds)]
+
+
+def kmeans(vectors, k: int, iterations: int = 10, seed: int = 0):
+    """Spherical k-means (unit centroids, cosine assignment) over unit rows."""
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    k = max(1, min(k, n))
+    centroids = vectors[rng.choice(n, k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        assign = assign_nearest(vectors, centroids)
+        counts = np.bincount(assign, minlength=k)
+        filled = counts > 0
+        order = np.argsort(assign, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+        centroids[filled] = normalize(np.add.reduceat(vectors[order], starts, axis=0))
+        # re-seed empty clusters on random rows
+        empty = int((~filled).sum())
+        if empty:
+            centroids[~filled] = vectors[rng.choice(n, empty, replace=False)]
+    return centroids
+
+
+def default_lists(rows: int) -> int:
+    """IVF_LISTS, or ~sqrt(rows) lists when unset."""
+    return settings.IVF_LISTS or max(1, int(np.sqrt(rows)))
+
+
+def ivf_enabled(rows: int) -> bool:
+    mode = settings.INDEX_IVF
+    if mode == "auto":
+        return rows >= settings.IVF_MIN_ROWS
+    return mode == "on" and rows > 0
+
+
+class IVFIndex:
+    def __init__(self, centroids, list_domains, lists, domains, domain_centroids,
+                 trained_rows: int, added: int = 0):
+        self.centroids = centroids                  # (nlist, dim) unit rows
+        self.list_domains = list_domains            # (nlist,) index into domains
+        self.lists = lists                          # [row ids] per list
+        self.domains = domains                      # domain names
+        self.domain_centroids = domain_centroids    # (len(domains), dim) unit rows
+        self.trained_rows = trained_rows
+        self.added = added
+        self.domain_lists = {
+            d: np.flatnonzero(list_domains == i) for i, d in enumerate(domains)
+        }
+        self.all_lists = np.arange(len(lists))
+
+    @classmethod
+    def train(cls, matrix, slices, nlist: int = None, iterations: int = None,
+              sample: int = None, seed: int = 0):
+        """k-means per domain slice; lists split in proportion to slice size."""
+        total = sum(end - start for start, end in slices.values())
+        nlist = nlist or default_lists(total)
+        iterations = iterations or settings.IVF_ITERATIONS
+        sample = sample or settings.IVF_TRAIN_SAMPLE
+        rng = np.random.default_rng(seed)
+
+        centroids, list_domains, lists, domains, domain_centroids = [], [], [], [], []
+        # papers may have no domain (None): order it after the named ones
+        for domain, (start, end) in sorted(slices.items(), key=lambda kv: (kv[0] is None, kv[0] or "")):
+            n = end - start
+            if n <= 0:
+                continue
+            rows = np.asarray(matrix[start:end], dtype=np.float32)
+            k = max(1, round(nlist * n / total))
+            size = min(sample, k * TRAIN_PER_LIST)
+            train_rows = rows[np.sort(rng.choice(n, size, replace=False))] if n > size else rows
+            cents = kmeans(train_rows, k, iterations, seed)
+
+            lists += split_lists(assign_nearest(rows, cents), len(cents), offset=start)
+            centroids.append(cents)
+            list_domains += [len(domains)] * len(cents)
+            domains.append(domain)
+            domain_centroids.append(normalize(rows.mean(axis=0)))
+
+        dim = matrix.shape[1] if len(matrix) else 0
+        return cls(
+            np.vstack(centroids) if centroids else np.zeros((0, dim), np.float32),
+            np.asarray(list_domains, dtype=np.int32),
+            lists,
+            domains,
+            np.vstack(domain_centroids).astype(np.float32) if domain_centroids else np.zeros((0, dim), np.float32),
+            trained_rows=total,
+        )
+
+    def __len__(self):
+        return len(self.lists)
+
+    def route(self, q, margin: float = None):
+        """The domain an "all" query clearly belongs to, or None to probe every domain."""
+        margin = settings.IVF_ROUTE_MARGIN if margin is None else margin
+        if margin < 0 or len(self.domains) < 2:
+            return None
+        sims = self.domain_centroids @ q
+        best, second = np.argsort(-sims)[:2]
+        return self.domains[best] if sims[best] - sims[second] >= margin else None
+
+    def probe(self, q, domain: str = "all", nprobe: int = None, margin: float = None):
+        """Sorted row ids in the nprobe lists nearest to unit query q."""
+        nprobe = nprobe or settings.IVF_NPROBE
+        if domain == "all":
+            domain = self.route(q, margin)
+        candidates = self.all_lists if domain is None else self.domain_lists.get(domain)
+        if candidates is None or not len(candidates):
+            return np.zeros(0, dtype=np.int64)
+
+        if nprobe < len(candidates):
+            sims = self.centroids[candidates] @ q
+            candidates = candidates[np.argpartition(-sims, nprobe - 1)[:nprobe]]
+        # sorted ids keep the gather sequential (memory-mapped matrices)
+        return np.sort(np.concatenate([self.lists[c] for c in candidates]))
+
+    def add(self, vectors, row_ids, domains):
+        """Insert unit rows into the nearest existing list of their domain (no retraining)."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        domains = np.asarray(domains, dtype=object)
+        for domain in dict.fromkeys(domains):
+            mask = domains == domain
+            if domain not in self.domain_lists:
+                self._new_domain(domain, vectors[mask])
+            candidates = self.domain_lists[domain]
+            assign = candidates[assign_nearest(vectors[mask], self.centroids[candidates])]
+            for c in np.unique(assign):
+                self.lists[c] = np.concatenate([self.lists[c], row_ids[mask][assign == c]])
+        self.added += len(row_ids)
+
+    def _new_domain(self, domain, vectors):
+        # a domain unseen at training time starts as a single list
+        centroid = normalize(vectors.mean(axis=0)).astype(np.float32)
+        self.domains.append(domain)
+        self.domain_centroids = np.vstack([self.domain_centroids, centroid])
+        self.centroids = np.vstack([self.centroids, centroid])
+        self.list_domains = np.append(self.list_domains, len(self.domains) - 1).astype(np.int32)
+        self.lists.append(np.zeros(0, dtype=np.int64))
+        self.domain_lists[domain] = np.asarray([len(self.lists) - 1])
+        self.all_lists = np.arange(len(self.lists))
+
+    def remap(self, mapping):
+        """Renumber rows after a re-layout: mapping[old id] = new id, -1 if dropped."""
+        self.lists = [mapping[ids][mapping[ids] >= 0] for ids in self.lists]
+
+    def stale(self) -> bool:
+        """True once enough rows were added without retraining."""
+        return self.added > settings.IVF_RETRAIN_FRACTION * max(1, self.trained_rows)
+
+    def pack(self):
+        """(info, arrays) for the snapshot; inverse of unpack()."""
+        offsets = np.zeros(len(self.lists) + 1, dtype=np.int64)
+        np.cumsum([len(ids) for ids in self.lists], out=offsets[1:])
+        rows = np.concatenate(self.lists) if self.lists else np.zeros(0, dtype=np.int64)
+        info = {"domains": self.domains, "trained_rows": self.trained_rows, "added": self.added}
+        return info, {
+            "centroids": self.centroids,
+            "list_domains": self.list_domains,
+            "offsets": offsets,
+            "rows": rows.astype(np.int64),
+            "domain_centroids": self.domain_centroids,
+        }
+
+    @classmethod
+    def unpack(cls, info, arrays):
+        offsets = arrays["offsets"]
+        lists = [arrays["rows"][offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+        return cls(np.asarray(arrays["centroids"]), np.asarray(arrays["list_domains"]), lists,
+                   list(info["domains"]), np.asarray(arrays["domain_centroids"]),
+                   info["trained_rows"], info.get("added", 0))
+
+    def nbytes(self):
+        return (self.centroids.nbytes + self.domain_centroids.nbytes
+                + sum(ids.nbytes for ids in self.lists))
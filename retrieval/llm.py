@@ -0,0 +1,237 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from config import settings
+from logs import get_logger
+
+log = get_logger("llm")
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies (seconds)."""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, p: float):
+        with self._lock:
+            data = sorted(self.samples)
+        if not data:
+            return None
+        idx = min(len(data) - 1, int(round(p / 100 * (len(data) - 1))))
+        return data[idx]
+
+    def hedge_delay(self):
+        """How long to wait on the primary before firing the backup request."""
+        if len(self.samples) < settings.LLM_HEDGE_MIN_SAMPLES:
+            return settings.LLM_HEDGE_DEFAULT_DELAY
+        return max(settings.LLM_HEDGE_MIN_DELAY, self.percentile(settings.LLM_HEDGE_PERCENTILE))
+
+
+async def _cancel(tasks):
+    for t in tasks:
+        t.cancel()
+    for t in tasks:
+        try:
+            await t
+        except BaseException:
+            pass
+
+
+class LLMProvider:
+    """
+    Long-lived Gemini (primary) + Groq (backup) clients.
+
+    complete() and stream() hedge: if Gemini hasn't answered (or produced its
+    first token) by its recent latency percentile, the same prompt is sent to
+    Groq and whichever succeeds first wins. Gemini errors fall back to Groq.
+    """
+
+    def __init__(self):
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        from groq import AsyncGroq
+
+        self.gemini = ChatGoogleGenerativeAI(
+            model=settings.GEMINI_MODEL, max_retries=settings.LLM_MAX_RETRIES
+        )
+        self.groq = AsyncGroq(
+            api_key=settings.GROQ_API_KEY, max_retries=settings.LLM_MAX_RETRIES
+        ) if settings.GROQ_API_KEY else None
+        self.latency = LatencyTracker()
+        self.ttft = LatencyTracker()
+        self.hedges = 0
+        self.fallbacks = 0
+
+    @property
+    def can_hedge(self):
+        return self.groq is not None and settings.LLM_HEDGE_ENABLED
+
+    # ----- primary / backup calls -----
+
+    async def _gemini_complete(self, prompt: str) -> str:
+        t0 = time.perf_counter()
+        try:
+            resp = await self.gemini.ainvoke(prompt)
+        except asyncio.CancelledError:
+            # lost a hedge race: still a (lower-bound) latency sample, otherwise
+            # the percentile would only ever see the fast calls
+            self.latency.add(time.perf_counter() - t0)
+            raise
+        self.latency.add(time.perf_counter() - t0)
+        return resp.content
+
+    async def _groq_complete(self, prompt: str) -> str:
+        resp = await self.groq.chat.completions.create(
+            model=settings.GROQ_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+        )
+        return resp.choices[0].message.content or ""
+
+    async def _gemini_stream(self, prompt: str):
+        t0 = time.perf_counter()
+        first = True
+        async for chunk in self.gemini.astream(prompt):
+            if first:
+                self.ttft.add(time.perf_counter() - t0)
+                first = False
+            if chunk.content:
+                yield chunk.content
+
+    async def _groq_stream(self, prompt: str):
+        stream = await self.groq.chat.completions.create(
+            model=settings.GROQ_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            stream=True,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    # ----- public API -----
+
+    async def complete(self, prompt: str, timeout: float = None) -> str:
+        return await asyncio.wait_for(self._hedged(prompt), timeout or settings.LLM_TIMEOUT)
+
+    async def _hedged(self, prompt: str) -> str:
+        primary = asyncio.ensure_future(self._gemini_complete(prompt))
+        if not self.can_hedge:
+            return await primary
+
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.latency.hedge_delay())
+            if primary in done and primary.exception() is None:
+                return primary.result()
+            if primary in done:
+                self.fallbacks += 1
+                log.warning("gemini failed, falling back to groq", error=repr(primary.exception()))
+                tasks = set()
+            else:
+                self.hedges += 1
+            tasks.add(asyncio.ensure_future(self._groq_complete(prompt)))
+
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is None:
+                        return t.result()
+                    error = t.exception()
+            raise error
+        finally:
+            await _cancel([t for t in tasks | {primary} if not t.done()])
+
+    async def stream(self, prompt: str, timeout: float = None):
+        """Yield text chunks; each chunk must arrive within the deadline."""
+        timeout = timeout or settings.LLM_TIMEOUT
+        source, first = await self._first_chunk(prompt, timeout)
+        if first is None:
+            return
+        yield first
+        while True:
+            try:
+                chunk = await asyncio.wait_for(source.__anext__(), timeout)
+            except StopAsyncIteration:
+                return
+            yield chunk
+
+    async def _first_chunk(self, prompt: str, timeout: float):
+        """Race the first token of Gemini (and Groq if hedged); return the winner."""
+        sources = {}
+        primary = self._gemini_stream(prompt)
+        task = asyncio.ensure_future(primary.__anext__())
+        sources[task] = primary
+        deadline = time.monotonic() + timeout
+
+        try:
+            wait = self.ttft.hedge_delay() if self.can_hedge else timeout
+            done, _ = await asyncio.wait({task}, timeout=wait)
+            if not done and not self.can_hedge:
+                raise asyncio.TimeoutError()
+            if done and task.exception() is None:
+                return primary, task.result()
+            if done and isinstance(task.exception(), StopAsyncIteration):
+                return primary, None
+            if not self.can_hedge:
+                raise task.exception()
+
+            if done:
+                self.fallbacks += 1
+                log.warning("gemini stream failed, falling back to groq", error=repr(task.exception()))
+                del sources[task]
+            else:
+                self.hedges += 1
+            backup = self._groq_stream(prompt)
+            sources[asyncio.ensure_future(backup.__anext__())] = backup
+
+            error = None
+            while sources:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                done, _ = await asyncio.wait(
+                    set(sources), timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+                )
+                for t in done:
+                    gen = sources.pop(t)
+                    if t.exception() is None:
+                        return gen, t.result()
+                    if isinstance(t.exception(), StopAsyncIteration):
+                        return gen, None
+                    error = t.exception()
+            raise error
+        finally:
+            await _cancel([t for t in sources if not t.done()])
+
+    def stats(self):
+        return {
+            "gemini_p50": self.latency.percentile(50),
+            "gemini_p95": self.latency.percentile(95),
+            "gemini_ttft_p95": self.ttft.percentile(95),
+            "hedges": self.hedges,
+            "fallbacks": self.fallbacks,
+        }
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_provider() -> LLMProvider:
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = LLMProvider()
+    return _provider
+
+
+def get_chat_model():
+    """Shared Gemini chat client for sync callers (e.g. autocorrect)."""
+    return get_provider().gemini
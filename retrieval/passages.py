@@ -0,0 +1,207 @@
+"""
+Passage-level context selection.
+
+Papers are split into passages of ~PASSAGE_CHARS. When the paper_passages
+table is populated (python -m ingestion --passages) each passage has its own
+embedding; otherwise the retrieved papers are split on the fly and ranked
+lexically. pack_context() then fills a per-mode token budget with the best
+passages, keeping track of which paper each one cites.
+
+    CREATE TABLE paper_passages (
+        paperid text NOT NULL, passage int NOT NULL, text text NOT NULL,
+        domain text, embedding vector(768), PRIMARY KEY (paperid, passage)
+    );
+"""
+import re
+import threading
+import time
+import numpy as np
+from config import settings
+from chat.memory import count_tokens, truncate_tokens
+from ingestion.enrich import chunk_text
+from retrieval.bm25 import BM25Partition, tokenize, rrf_fuse
+from retrieval.index import fetch_rows, parse_embedding, normalize_rows
+from logs import get_logger, error_fields
+
+log = get_logger("passages")
+
+PASSAGE_COLUMNS = "paperid, passage, text, embedding"
+MIN_PASSAGE_TOKENS = 48   # don't bother packing a clipped tail shorter than this
+DUPLICATE_OVERLAP = 0.8   # token-set Jaccard above which two passages are the same
+RETRY_BASE_S = 5          # first retry after a failed passage load, doubling
+RETRY_MAX_S = 300
+
+
+def split_passages(text: str, max_chars: int = None):
+    """Paragraph-aware split of enriched_text into passages of ~max_chars."""
+    paragraphs = re.split(r"\n\s*\n", text or "")
+    return chunk_text(paragraphs, max_chars or settings.PASSAGE_CHARS)
+
+
+def passage_rows(paper: dict, max_chars: int = None):
+    """paper_passages rows (without embeddings) for one papers row."""
+    return [
+        {"paperid": paper["paperid"], "passage": i, "text": text, "domain": paper.get("domain")}
+        for i, text in enumerate(split_passages(paper["enriched_text"], max_chars))
+    ]
+
+
+class PassageIndex:
+    """Resident passage embeddings, contiguous per paper."""
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda r: (str(r["paperid"]), r["passage"]))
+        self.texts = [r["text"] for r in rows]
+        self.by_paper = {}  # str(paperid) -> (start, end)
+        for i, r in enumerate(rows):
+            pid = str(r["paperid"])
+            start, _ = self.by_paper.get(pid, (i, i))
+            self.by_paper[pid] = (start, i + 1)
+        vectors = [parse_embedding(r["embedding"]) for r in rows]
+        self.matrix = normalize_rows(np.vstack(vectors).astype(np.float32)) if vectors else None
+
+    def __len__(self):
+        return len(self.texts)
+
+    def passages(self, pid):
+        start, end = self.by_paper.get(str(pid), (0, 0))
+        return list(range(start, end))
+
+    def similarity(self, ids, q_emb):
+        q = np.asarray(q_emb, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        return self.matrix[np.asarray(ids)] @ (q / norm if norm else q)
+
+
+_index = None      # None = not loaded yet, False = no passage rows
+_failures = 0
+_retry_at = 0.0    # after a failed load, papers are split on the fly until then
+_lock = threading.Lock()
+
+
+def get_passage_index(supabase):
+    """The resident PassageIndex, or None when passages aren't ingested (or can't be loaded yet)."""
+    global _index, _failures, _retry_at
+    if settings.PASSAGE_INDEX == "off":
+        return None
+    if _index is None and time.monotonic() >= _retry_at:
+        with _lock:
+            if _index is None and time.monotonic() >= _retry_at:
+                try:
+                    rows = fetch_rows(supabase, "paper_passages", PASSAGE_COLUMNS, ("paperid", "passage"))
+                except Exception as e:
+                    # transient errors must not disable passage embeddings for good
+                    _failures += 1
+                    delay = min(RETRY_BASE_S * 2 ** (_failures - 1), RETRY_MAX_S)
+                    _retry_at = time.monotonic() + delay
+                    log.warning("passage table unavailable, splitting papers on the fly",
+                                retry_s=delay, **error_fields(e))
+                    return None
+                _failures = 0
+                _index = PassageIndex(rows) if rows else False
+                log.info("passage index loaded", passages=len(rows))
+    return _index or None
+
+
+def invalidate_passages():
+    global _index, _failures, _retry_at
+    with _lock:
+        _index = None
+        _failures = 0
+        _retry_at = 0.0
+
+
+def rank_passages(query: str, results, q_emb=None, index: PassageIndex = None):
+    """
+    Best-first passages [(result row, passage text)] of the retrieved papers.
+    Reciprocal-rank fusion of: the paper's retrieval rank, BM25 of the
+    passage against the query, and (with a passage index) passage cosine.
+    """
+    candidates = []     # (paper rank, result row, text, passage index row or None)
+    for rank, row in enumerate(results or []):
+        ids = index.passages(row[4]) if index is not None else []
+        if ids:
+            candidates += [(rank, row, index.texts[i], i) for i in ids]
+        else:
+            candidates += [(rank, row, text, None) for text in split_passages(row[3])]
+    if not candidates:
+        return []
+
+    keys = list(range(len(candidates)))
+    rankings = [keys]   # already in paper-rank order
+    terms = tokenize(query)
+    if terms:
+        bm25 = BM25Partition([c[2] for c in candidates]).scores(terms)
+        rankings.append([int(i) for i in np.argsort(-bm25, kind="stable") if bm25[i] > 0])
+    if q_emb is not None and index is not None:
+        embedded = [k for k in keys if candidates[k][3] is not None]
+        if embedded:
+            sims = index.similarity([candidates[k][3] for k in embedded], q_emb)
+            rankings.append([embedded[i] for i in np.argsort(-sims, kind="stable")])
+
+    return [(candidates[k][1], candidates[k][2]) for k in rrf_fuse(rankings, k=settings.RRF_K)]
+
+
+class PackedContext:
+    def __init__(self, text: str, papers, tokens: int, passages: int):
+        self.text = text
+        self.papers = papers        # result rows in citation order ([n] -> papers[n-1])
+        self.tokens = tokens
+        self.passages = passages
+
+
+def _overlaps(tokens, seen):
+    for other in seen:
+        union = len(tokens | other)
+        if union and len(tokens & other) / union >= DUPLICATE_OVERLAP:
+            return True
+    return False
+
+
+def pack_context(passages, budget: int, max_papers: int, per_paper: int = None,
+                 numbered: bool = False) -> PackedContext:
+    """
+    Greedily take best-first passages until the token budget is spent:
+    at most max_papers papers and per_paper passages each, skipping
+    near-duplicate passages (e.g. the same abstract on two records).
+    With numbered, each paper's block is prefixed [n] matching papers[n-1].
+    """
+    per_paper = per_paper or settings.PASSAGES_PER_PAPER
+    order = []          # paperids in first-use order
+    rows = {}
+    chosen = {}         # paperid -> [text]
+    seen = []
+    remaining = budget
+
+    for row, text in passages:
+        pid = row[4]
+        if pid not in chosen and len(order) >= max_papers:
+            continue
+        if len(chosen.get(pid, [])) >= per_paper:
+            continue
+        tokens = set(tokenize(text))
+        if _overlaps(tokens, seen):
+            continue
+        cost = count_tokens(text) + 4
+        if cost > remaining:
+            if remaining < MIN_PASSAGE_TOKENS:
+                break
+            text = truncate_tokens(text, remaining - 4)
+            cost = remaining
+        if pid not in chosen:
+            order.append(pid)
+            rows[pid] = row
+            chosen[pid] = []
+        chosen[pid].append(text)
+        seen.append(tokens)
+        remaining -= cost
+        if remaining <= 0:
+            break
+
+    blocks = []
+    for n, pid in enumerate(order, 1):
+        body = "\n...\n".join(chosen[pid])
+        blocks.append(f"[{n}] {body}" if numbered else body)
+    text = "\n\n".join(blocks)
+    return PackedContext(text, [rows[pid] for pid in order], count_tokens(text),
+                         sum(len(v) for v in chosen.values()))
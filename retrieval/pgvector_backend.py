@@ -0,0 +1,105 @@
+"""
+kNN retrieval inside Postgres (RETRIEVAL_BACKEND=pgvector).
+
+The ANN index is not created by the app; run once per database, after the
+papers table is loaded:
+
+    python -m retrieval.pgvector_backend create-indexes --kind hnsw
+    python -m retrieval.pgvector_backend create-indexes --kind ivfflat --lists 1000
+"""
+import numpy as np
+from config import settings
+from database.connection import pooled_conn
+
+KNN_SQL = """
+SELECT title, authors, year, enriched_text, paperid, embedding <=> %s AS dist
+FROM papers
+WHERE embedding IS NOT NULL {domain_filter}
+ORDER BY embedding <=> %s
+LIMIT %s
+"""
+
+INDEX_SQL = {
+    "hnsw": "CREATE INDEX IF NOT EXISTS papers_embedding_hnsw "
+            "ON papers USING hnsw (embedding vector_cosine_ops)",
+    "ivfflat": "CREATE INDEX IF NOT EXISTS papers_embedding_ivfflat "
+               "ON papers USING ivfflat (embedding vector_cosine_ops) WITH (lists = %s)",
+}
+DOMAIN_INDEX_SQL = "CREATE INDEX IF NOT EXISTS papers_domain_idx ON papers (domain)"
+
+
+def create_indexes(kind: str = "hnsw", lists: int = 100):
+    """One-off DDL: ANN index on embedding plus a btree on domain."""
+    if kind not in INDEX_SQL:
+        raise ValueError(f"Unknown index kind: {kind}")
+    with pooled_conn() as conn:
+        with conn.cursor() as cur:
+            if kind == "ivfflat":
+                cur.execute(INDEX_SQL[kind], (lists,))
+            else:
+                cur.execute(INDEX_SQL[kind])
+            cur.execute(DOMAIN_INDEX_SQL)
+            cur.execute("ANALYZE papers")
+
+
+SIM_SQL = "SELECT paperid, 1 - (embedding <=> %s) FROM papers WHERE paperid = ANY(%s)"
+
+
+def similarity(q_emb, paperids):
+    """{paperid: cosine similarity} for specific papers (e.g. BM25 hits)."""
+    if not paperids:
+        return {}
+    vec = np.asarray(q_emb, dtype=np.float32)
+    with pooled_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(SIM_SQL, (vec, list(paperids)))
+            return {pid: float(sim) for pid, sim in cur.fetchall() if sim is not None}
+
+
+def search(q_emb, domain: str = "all", k: int = 20, min_sim: float = 0.0):
+    """
+    kNN over papers inside Postgres. Returns rows shaped like
+    [title, authors, year, enriched_text, paperid, distance], best first,
+    keeping only rows with similarity >= min_sim.
+    """
+    vec = np.asarray(q_emb, dtype=np.float32)
+
+    params = [vec]
+    domain_filter = ""
+    if domain != "all":
+        domain_filter = "AND domain = %s"
+        params.append(domain)
+    params += [vec, k * 2]  # headroom for duplicate paperids
+
+    with pooled_conn() as conn:
+        with conn.cursor() as cur:
+            # filtered HNSW scans need a wider candidate list to still fill k
+            cur.execute("SET LOCAL hnsw.ef_search = %s", (settings.PGVECTOR_EF_SEARCH,))
+            cur.execute(KNN_SQL.format(domain_filter=domain_filter), params)
+            rows = cur.fetchall()
+
+    seen = set()
+    good = []
+    for title, authors, year, text, pid, dist in rows:
+        if 1 - dist < min_sim:
+            break
+        if pid in seen:
+            continue
+        seen.add(pid)
+        good.append([title, authors, year, text, pid, dist])
+        if len(good) >= k:
+            break
+    return good
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Create the pgvector ANN and domain indexes on papers")
+    parser.add_argument("command", choices=["create-indexes"])
+    parser.add_argument("--kind", choices=sorted(INDEX_SQL), default="hnsw")
+    parser.add_argument("--lists", type=int, default=100, help="ivfflat lists (~rows / 1000)")
+    args = parser.parse_args()
+
+    create_indexes(args.kind, args.lists)
+    print(f"created {args.kind} index on papers.embedding and papers_domain_idx")
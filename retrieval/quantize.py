@@ -0,0 +1,134 @@
+import json
+import os
+import tempfile
+import numpy as np
+
+KINDS = {"none", "int8", "float16"}
+BLOCK_ROWS = 16384  # rows upcast per block, bounds the temporary float32 copy
+
+
+class QuantizedMatrix:
+    """
+    Compact copy of a row-normalized float32 matrix for a first-pass scan.
+
+    int8: symmetric per-row scalar quantization, x ~= codes * scale[row]
+    float16: plain half precision
+    """
+
+    def __init__(self, matrix, kind: str = "int8"):
+        if kind not in ("int8", "float16"):
+            raise ValueError(f"Unknown quantization: {kind}")
+        self.kind = kind
+        if kind == "int8":
+            absmax = np.abs(matrix).max(axis=1)
+            absmax[absmax == 0] = 1.0
+            self.scale = (absmax / 127.0).astype(np.float32)
+            self.codes = np.round(matrix / self.scale[:, None]).astype(np.int8)
+        else:
+            self.scale = None
+            self.codes = matrix.astype(np.float16)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def scores(self, q, start: int = 0, end: int = None):
+        """
+        Approximate dot products of rows [start, end) with unit query q, or
+        with every column of a (dim, n) query matrix.
+        """
+        end = len(self.codes) if end is None else end
+        out = np.empty((end - start,) + q.shape[1:], dtype=np.float32)
+        for lo in range(start, end, BLOCK_ROWS):
+            hi = min(lo + BLOCK_ROWS, end)
+            out[lo - start:hi - start] = self.codes[lo:hi].astype(np.float32) @ q
+        if self.scale is not None:
+            scale = self.scale[start:end]
+            out *= scale[:, None] if q.ndim > 1 else scale
+        return out
+
+    def nbytes(self):
+        return self.codes.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+
+def spill_to_disk(matrix, path: str = None):
+    """
+    Move the exact float32 rows to a memory-mapped file: only the candidate
+    rows touched during re-ranking get paged in. Each build writes its own
+    file (path only sets the directory and name prefix) and unlinks it once
+    mapped, so the space is freed with the mapping and workers never share it.
+    """
+    directory, prefix = os.path.split(path) if path else (None, "papers-exact")
+    fd, name = tempfile.mkstemp(prefix=f"{prefix}-", suffix=".f32", dir=directory or None)
+    os.close(fd)
+    try:
+        mm = np.memmap(name, dtype=np.float32, mode="w+", shape=matrix.shape)
+        mm[:] = matrix
+        mm.flush()
+        del mm
+        return np.memmap(name, dtype=np.float32, mode="r", shape=matrix.shape)
+    finally:
+        os.unlink(name)
+
+
+def candidates(approx, n: int):
+    """Indices of the n highest approximate scores (unordered)."""
+    if n >= len(approx):
+        return np.arange(len(approx))
+    return np.argpartition(-approx, n - 1)[:n]
+
+
+def recall_at_k(exact_ids, approx_ids):
+    hits = sum(len(set(e) & set(a)) for e, a in zip(exact_ids, approx_ids))
+    total = sum(len(e) for e in exact_ids)
+    return hits / total if total else 1.0
+
+
+def _bench(rows: int, dim: int, queries: int, k: int, rerank: int, seed: int = 0):
+    import time
+    from retrieval.index import normalize_rows
+
+    rng = np.random.default_rng(seed)
+    # clustered data is closer to real embeddings than iid noise
+    centers = rng.standard_normal((64, dim)).astype(np.float32)
+    matrix = centers[rng.integers(0, 64, rows)] + 0.6 * rng.standard_normal((rows, dim)).astype(np.float32)
+    matrix = normalize_rows(matrix)
+    qs = normalize_rows(matrix[rng.integers(0, rows, queries)] + 0.3 * rng.standard_normal((queries, dim)).astype(np.float32))
+
+    def exact_top(q):
+        return candidates(matrix @ q, k)
+
+    t = time.perf_counter()
+    truth = [set(exact_top(q)) for q in qs]
+    report = {"rows": rows, "dim": dim, "k": k, "rerank_candidates": k * rerank,
+              "exact": {"bytes": matrix.nbytes, "ms_per_query": (time.perf_counter() - t) * 1000 / queries}}
+
+    for kind in ("float16", "int8"):
+        qm = QuantizedMatrix(matrix, kind)
+        first_pass, reranked = [], []
+        t = time.perf_counter()
+        for q in qs:
+            approx = qm.scores(q)
+            cand = candidates(approx, k * rerank)
+            first_pass.append(cand[np.argsort(-approx[cand])][:k])
+            exact = matrix[cand] @ q
+            reranked.append(cand[np.argsort(-exact)][:k])
+        report[kind] = {
+            "bytes": qm.nbytes(),
+            "ms_per_query": (time.perf_counter() - t) * 1000 / queries,
+            "recall_first_pass": recall_at_k(truth, first_pass),
+            "recall_reranked": recall_at_k(truth, reranked),
+        }
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="recall@K / memory of quantized vs exact scan")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--rerank", type=int, default=4)
+    args = parser.parse_args()
+    print(json.dumps(_bench(args.rows, args.dim, args.queries, args.k, args.rerank), indent=2))
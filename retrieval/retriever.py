@@ -1,49 +1,99 @@
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-from groq import Groq
-from autocorrect import gemini_autocorrect  # autocorrect module
+from autocorrect import gemini_autocorrect, invalidate_vocabulary  # autocorrect module
 from supabaseclient import get_client
-from config import settings
+from retrieval.index import get_index, get_lexical_index
+from retrieval.bm25 import rrf_fuse
+from retrieval import pgvector_backend
+from retrieval.embedding_cache import CachedEmbeddings
+from retrieval.summarize import extractive_summary
+from retrieval.llm import get_provider
+from retrieval.answer_cache import SemanticAnswerCache
+from retrieval.web_search import web_cache
+from retrieval.index import corpus_version, invalidate_index, rebuild_index
+from retrieval.passages import (
+    PackedContext, get_passage_index, invalidate_passages, rank_passages, pack_context,
+)
+from config import settings, DOMAINS
+from chat.memory import count_tokens
+from logs import get_logger, error_fields
+from metrics import REGISTRY, PROMPT_TOKENS, RETRIEVAL_PATHS, STAGE_ERRORS, span, record_rows_scanned
 from dotenv import load_dotenv
 load_dotenv()
-from langchain_community.tools.tavily_search import TavilySearchResults
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
-DOMAINS = {
-    "NLP",
-    "Quantum Information Retrieval and Information Teleportation",
-    "Quantum Resistant Cryptography and Identity Based Encryption",
-    "VLSI in Power Electronics and Embedded Systems"
-}
-
 TOP_K = 20
 MIN_SIM = 0.64
 
-print("Loading model BAAI/bge-small-en-v1.5...")
-model = GoogleGenerativeAIEmbeddings(model="text-embedding-004")
-
-client = Groq(api_key=settings.GROQ_API_KEY)
-
-
-
-async def run_web_search(query: str, k: int = 4) -> str:
-    try:
-        tavily = TavilySearchResults(k=k)
-        results = tavily.run(query)
-
-        if not results:
-            return ""
-
-        formatted = "\n\n".join(
-            [
-                f"Title: {item.get('title')}\nURL: {item.get('url')}\nSnippet: {item.get('content')}"
-                for item in results
-            ]
-        )
-
-        return formatted
-
-    except Exception as e:
-        return f"Web search error: {str(e)}"
+# deep-mode conclusion: "structured" (one generation), "extractive" (local)
+# or "two_call" (separate summary LLM call)
+SUMMARY_STRATEGIES = {"structured", "extractive", "two_call"}
+CONCLUSION_MARKER = "### Conclusion"
+
+log = get_logger("retriever")
+
+# embedding client, built on first use / during warmup (see get_model)
+model = None
+_model_lock = threading.Lock()
+
+
+def get_model() -> CachedEmbeddings:
+    global model
+    if model is None:
+        with _model_lock:
+            if model is None:
+                from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+                log.info("loading embedding model", model=settings.EMBED_MODEL)
+                model = CachedEmbeddings(
+                    GoogleGenerativeAIEmbeddings(model=settings.EMBED_MODEL),
+                    model_name=settings.EMBED_MODEL,
+                    maxsize=settings.EMBED_CACHE_SIZE,
+                    ttl=settings.EMBED_CACHE_TTL,
+                    disk_path=settings.EMBED_CACHE_PATH,
+                    disk_maxrows=settings.EMBED_CACHE_DISK_ROWS,
+                )
+    return model
+
+answer_cache = SemanticAnswerCache(
+    threshold=settings.ANSWER_CACHE_THRESHOLD,
+    maxsize=settings.ANSWER_CACHE_SIZE,
+    ttl=settings.ANSWER_CACHE_TTL,
+)
+
+REGISTRY.register_cache("embedding", lambda: model.stats() if model is not None else {})
+REGISTRY.register_cache("answer", answer_cache.stats)
+
+# bounded pool for the sync SDK calls (embeddings, Supabase) so they never
+# run on the event loop
+executor = ThreadPoolExecutor(
+    max_workers=settings.PIPELINE_WORKERS, thread_name_prefix="pipeline"
+)
+
+
+async def run_blocking(fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, fn, *args)
+
+
+async def run_stage(name: str, aw, timeout: float, default=None):
+    """Await one pipeline stage with its own deadline; fall back to default."""
+    with span(name):
+        try:
+            return await asyncio.wait_for(aw, timeout)
+        except asyncio.TimeoutError:
+            STAGE_ERRORS.inc(stage=name, reason="timeout")
+            log.warning("stage timed out", stage=name, timeout=timeout)
+        except Exception as e:
+            STAGE_ERRORS.inc(stage=name, reason="error")
+            log.warning("stage failed", stage=name, **error_fields(e))
+    return default
+
+
+async def run_web_search(query: str, k: int = 4, domain: str = "all") -> str:
+    """Formatted Tavily results ("" when none or on provider error), cached."""
+    return await web_cache.search(query, k, domain)
 
 def make_ref(title, authors, year):
     a = authors[0] + (" et al." if len(authors) > 1 else "")
@@ -64,166 +114,525 @@ def cosine_similarity(vec1, vec2):
     
     return np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
 
-def retrieve(q: str, domain: str = "all"):
+def on_corpus_changed():
+    """Call after papers are inserted/updated: drop the index and cached answers."""
+    invalidate_index()
+    on_corpus_rebuilt()
+
+
+def on_corpus_rebuilt():
+    """A rebuilt index is live: cached answers, passages and the vocabulary may be stale."""
+    invalidate_passages()
+    invalidate_vocabulary()
+    answer_cache.invalidate()
+
+
+async def watch_corpus():
+    """
+    Background task without snapshots: every CORPUS_POLL_INTERVAL seconds
+    probe the papers table and, when it moved (e.g. after an ingestion run
+    in another process), rebuild the index in the background and swap it
+    in; the old index keeps serving meanwhile.
+    """
+    last = None
+    while True:
+        try:
+            version = await run_blocking(corpus_version, get_client())
+            if last is not None and version != last:
+                log.info("corpus changed", rows=version[0], watermark=version[1])
+                await run_blocking(rebuild_index, get_client())
+                on_corpus_rebuilt()
+            last = version
+        except Exception as e:
+            log.warning("corpus poll failed", **error_fields(e))
+        await asyncio.sleep(settings.CORPUS_POLL_INTERVAL)
+
+
+def on_snapshot_swapped():
+    """A newer corpus snapshot is live: cached answers, passages and the vocabulary may be stale."""
+    invalidate_passages()
+    invalidate_vocabulary()
+    answer_cache.invalidate()
+
+
+def store_answer(q_emb, mode: str, domain: str, result: dict):
+    if q_emb is not None and settings.ANSWER_CACHE_ENABLED:
+        answer_cache.set(q_emb, mode, domain, result)
+
+
+def domain_rows(slices, domain: str) -> int:
+    """Rows an index scores for a domain filter (slices as in group_by_domain)."""
+    return sum(end - start for d, (start, end) in slices.items() if domain in ("all", d))
+
+
+def lexical_search(q: str, domain: str = "all", q_emb=None):
+    """
+    BM25 hits as result rows. With a query vector the exact cosine distance
+    is filled in (resident index or Postgres); otherwise the distance is None.
+    """
     supabase = get_client()
+    # one index reference: hit row ids must not cross a snapshot swap
+    index = get_index(supabase) if settings.RETRIEVAL_BACKEND != "pgvector" else None
+    lexical = index.lexical if index is not None else get_lexical_index(supabase)
+    hits = lexical.search(q, domain, k=TOP_K)
+    record_rows_scanned("lexical", domain_rows(lexical.slices, domain))
+    if q_emb is not None and index is not None:
+        sims = index.similarity([i for i, _ in hits], q_emb)
+        return [index.row(i, float(sim)) for (i, _), sim in zip(hits, sims)]
+    rows = [[m[0], m[1], m[2], m[3], m[4], None] for m in (lexical.meta[i] for i, _ in hits)]
+    if q_emb is not None:
+        sims = pgvector_backend.similarity(q_emb, [r[4] for r in rows])
+        for r in rows:
+            r[5] = 1 - sims[r[4]] if r[4] in sims else None
+    return rows
+
+
+def retrieve(q: str, domain: str = "all", q_emb=None, lexical_only: bool = False):
+    if q_emb is None and not lexical_only:
+        try:
+            q_emb = get_model().embed_query(q)
+        except Exception as e:
+            if not settings.LEXICAL_FALLBACK:
+                raise
+            log.warning("embedding failed, using BM25 only", **error_fields(e))
+
+    if q_emb is None:
+        # embedding provider slow or down: keyword retrieval only
+        good = lexical_search(q, domain)
+        return good if good else None
+
+    if settings.RETRIEVAL_BACKEND == "pgvector":
+        # kNN + domain filter run inside Postgres on the ANN index
+        good = pgvector_backend.search(q_emb, domain, k=TOP_K, min_sim=MIN_SIM)
+    else:
+        # scores the whole domain slice in one matrix-vector product (or only
+        # the nearest IVF lists) and returns rows sorted by similarity
+        index = get_index(get_client())
+        good = index.search(q_emb, domain, k=TOP_K, min_sim=MIN_SIM)
+        if index.ivf is None:
+            record_rows_scanned("vector", domain_rows(index.slices, domain))
+
+    return fuse_lexical(q, domain, q_emb, good)
+
+
+def fuse_lexical(q: str, domain: str, q_emb, good):
+    """Vector hits fused with BM25 in hybrid mode; None when nothing matched."""
+    if settings.RETRIEVAL_MODE == "hybrid":
+        # reciprocal-rank fusion with BM25 (acronyms, names, exact terms);
+        # a keyword hit joins only if it also clears the MIN_SIM cosine gate
+        lexical = [
+            r for r in lexical_search(q, domain, q_emb)
+            if r[5] is not None and 1 - r[5] >= MIN_SIM
+        ]
+        rows = {r[4]: r for r in lexical}
+        rows.update({r[4]: r for r in good})
+        fused = rrf_fuse([[r[4] for r in good], [r[4] for r in lexical]], k=settings.RRF_K)
+        good = [rows[pid] for pid in fused[:TOP_K]]
+
+    return good if good else None
 
-    q_emb = model.embed_query(q)
 
-    query_builder = (
-        supabase.table("papers")
-        .select("title, authors, year, enriched_text, paperid, embedding")
-        .not_.is_("embedding", None)
-    )
+def embed_many(queries):
+    """One embed_documents call for a batch of queries (cached per text)."""
+    return get_model().embed_documents(list(queries))
+
+
+def retrieve_many(queries, domains, q_embs=None):
+    """
+    retrieve() for a batch of queries. On the resident index all queries are
+    scored in one matrix-matrix pass per domain slice; pgvector runs one
+    kNN query each. Without embeddings every query goes BM25 only.
+    """
+    if q_embs is None:
+        return [retrieve(q, d, lexical_only=True) for q, d in zip(queries, domains)]
+    if settings.RETRIEVAL_BACKEND == "pgvector":
+        return [retrieve(q, d, e) for q, d, e in zip(queries, domains, q_embs)]
+
+    index = get_index(get_client())
+    goods = index.search_many(q_embs, domains, k=TOP_K, min_sim=MIN_SIM)
+    if index.ivf is None:
+        for d in domains:
+            record_rows_scanned("vector", domain_rows(index.slices, d))
+    return [fuse_lexical(q, d, e, good) for q, d, e, good in zip(queries, domains, q_embs, goods)]
+
+# evidence behind an answer, reported as retrieval_path
+CORPUS = "corpus"           # confident paper matches, no web search
+CORPUS_WEB = "corpus+web"   # papers plus Tavily results
+WEB_ONLY = "web_only"       # no paper cleared MIN_SIM
+NO_EVIDENCE = "none"        # neither source had anything
+
+
+def evidence_rows(results):
+    """
+    Retrieved papers an answer may use and cite: vector hits at or above
+    MIN_SIM. Unscored rows count only when nothing was scored (BM25
+    fallback while the embedding provider is down).
+    """
+    rows = results or []
+    if any(r[5] is not None for r in rows):
+        return [r for r in rows if r[5] is not None and 1 - r[5] >= MIN_SIM]
+    return list(rows)
+
+
+def corpus_confidence(results):
+    """Mean cosine similarity of the best WEB_GATE_TOP_N papers (None without vector scores)."""
+    sims = sorted((1 - r[5] for r in evidence_rows(results) if r[5] is not None), reverse=True)
+    top = sims[:max(1, settings.WEB_GATE_TOP_N)]
+    return float(np.mean(top)) if top else None
+
+
+def retrieval_path(results) -> str:
+    """Which evidence to gather for these retrieval results (WEB_SEARCH_POLICY)."""
+    policy = settings.WEB_SEARCH_POLICY
+    results = evidence_rows(results)
+    if not results:
+        return NO_EVIDENCE if policy == "never" else WEB_ONLY
+    if policy == "never":
+        return CORPUS
+    if policy == "always":
+        return CORPUS_WEB
+    # BM25-only results (no embedding) carry no similarity: not confident
+    confidence = corpus_confidence(results)
+    if confidence is not None and confidence >= settings.WEB_GATE_THRESHOLD:
+        return CORPUS
+    return CORPUS_WEB
+
+
+SIMPLE_MAX_PAPERS = 8
+DEEP_MAX_PAPERS = 4
+
+
+def whole_paper_context(results, mode: str) -> PackedContext:
+    """Unpacked context: full enriched_text of the top papers (CONTEXT_PACKING=false)."""
+    if mode == "simple":
+        papers = list(results or [])[:SIMPLE_MAX_PAPERS]
+        text = "\n\n".join(r[3] for r in papers)
+    else:
+        papers, used = [], set()
+        for row in results or []:
+            if row[4] not in used and len(papers) < DEEP_MAX_PAPERS:
+                used.add(row[4])
+                papers.append(row)
+        text = "".join(r[3] + "\n\n" for r in papers)
+    return PackedContext(text, papers, count_tokens(text), len(papers))
+
+
+def build_context(question: str, results, q_emb, mode: str) -> PackedContext:
+    """Sources for the prompt: best passages within the mode's token budget."""
+    if not settings.CONTEXT_PACKING:
+        return whole_paper_context(results, mode)
+    ranked = rank_passages(question, results, q_emb, get_passage_index(get_client()))
+    if mode == "simple":
+        return pack_context(ranked, settings.CONTEXT_TOKENS_SIMPLE, SIMPLE_MAX_PAPERS)
+    return pack_context(ranked, settings.CONTEXT_TOKENS_DEEP, DEEP_MAX_PAPERS, numbered=True)
+
+
+async def complete_llm(prompt: str, purpose: str, timeout: float = None) -> str:
+    PROMPT_TOKENS.observe(count_tokens(prompt), purpose=purpose)
+    with span(purpose):
+        return await get_provider().complete(prompt, timeout or settings.LLM_TIMEOUT)
+
+
+async def stream_llm(prompt: str, purpose: str = "generate"):
+    """Yield completion text chunks; each chunk must arrive within LLM_TIMEOUT."""
+    PROMPT_TOKENS.observe(count_tokens(prompt), purpose=purpose)
+    with span(purpose):
+        async for chunk in get_provider().stream(prompt, settings.LLM_TIMEOUT):
+            yield chunk
+
+
+async def split_on_marker(tokens, marker: str):
+    """
+    Re-chunk a token stream into ("answer", text) pieces until the marker
+    appears and ("conclusion", text) pieces after it. A tail shorter than the
+    marker is held back so a marker split across chunks is still found.
+    """
+    buf = ""
+    found = False
+    async for token in tokens:
+        if found:
+            yield "conclusion", token
+            continue
+        buf += token
+        pos = buf.find(marker)
+        if pos >= 0:
+            found = True
+            if buf[:pos]:
+                yield "answer", buf[:pos]
+            if buf[pos + len(marker):]:
+                yield "conclusion", buf[pos + len(marker):]
+            buf = ""
+            continue
+        keep = len(marker) - 1
+        if len(buf) > keep:
+            yield "answer", buf[:-keep]
+            buf = buf[-keep:]
+    if buf:
+        yield "answer", buf
+
+
+async def rewrite_standalone(question: str, context: str) -> str:
+    """Turn a follow-up into a self-contained question for embedding / web search."""
+    prompt = f"""
+Rewrite the user's latest question as a single standalone question that can be
+understood without the conversation. Return ONLY the rewritten question.
 
-    if domain != "all":
-        query_builder = query_builder.eq("domain", domain)
+Conversation:
+{context}
+Latest question: {question}
+Standalone question:
+"""
+    rewritten = await complete_llm(prompt, "rewrite", settings.REWRITE_TIMEOUT)
+    return rewritten.strip() or question
 
-    # sql += " ORDER BY embedding <=> %s LIMIT %s"
-    # cur.execute(sql, params + [q_emb, TOP_K])
-    # results = cur.fetchall()
-    # cur.close(); conn.close()
-    
-    response = query_builder.execute()
-    rows = response.data
-
-    # Convert rows into same structure as old SQL result:
-    results = []
-    for r in rows:
-        emb = r["embedding"]
-
-        # compute cosine distance manually
-        similarity = cosine_similarity(q_emb, emb)
-        dist = 1 - similarity
-
-        results.append([
-            r["title"],
-            r["authors"],
-            r["year"],
-            r["enriched_text"],
-            r["paperid"],
-            dist   # equivalent to SQL embedding <=> %s
-        ])
-
-    seen = set()
-    good = []
-
-    for row in results:
-        dist = row[5]
-        if 1 - dist >= MIN_SIM and row[4] not in seen:
-            seen.add(row[4])
-            good.append(row)
 
-    return good if good else None
+async def answer_events(req):
+    """
+    Run the RAG pipeline as a stream of events:
+    corrected_query -> token* -> references -> conclusion (deep) -> done.
+    The "done" event carries the same dict answer_query returns.
 
-async def answer_query(req):
-    
+    Batch callers (retrieval.batch) may pass stages they already ran for
+    many queries at once: "corrected_query", "q_emb", "results", and a
+    shared "web_task" future (awaited only if the web search gate opens).
+    """
     original_query = req["Actualquery"]
     mode = req.get("mode", "simple").lower()
     domain = req.get("domain", "all")
     context = req.get("context", "")
+    standalone = not context
+    strategy = req.get("summary_strategy") or settings.DEEP_SUMMARY_STRATEGY
+    if strategy not in SUMMARY_STRATEGIES:
+        strategy = "structured"
+    # deep answers are cached per summary strategy
+    cache_mode = mode if mode == "simple" else f"{mode}:{strategy}"
 
     # ===== AUTOCORRECT =====
-    corrected_query = gemini_autocorrect(original_query)
+    if "corrected_query" in req:
+        corrected_query = req["corrected_query"]
+    else:
+        corrected_query = await run_stage(
+            "autocorrect",
+            run_blocking(gemini_autocorrect, original_query),
+            settings.AUTOCORRECT_TIMEOUT,
+            default=original_query,
+        )
     if corrected_query != original_query:
-        print(f"[Retriever] Autocorrected: '{original_query}' → '{corrected_query}'")
+        log.info("autocorrected", original=original_query, corrected=corrected_query)
         query = context + f"USER: {corrected_query}\nASSISTANT:"
     else:
         query = context + f"USER: {original_query}\nASSISTANT:"
-    results = retrieve(query, domain)
+    yield {"event": "corrected_query", "data": {
+        "original_query": original_query,
+        "corrected_query": corrected_query,
+    }}
+
+    # ===== STANDALONE QUESTION =====
+    # only the question (not the transcript) is embedded and web-searched
+    search_query = corrected_query
+    if context:
+        search_query = await run_stage(
+            "rewrite",
+            rewrite_standalone(corrected_query, context),
+            settings.REWRITE_TIMEOUT,
+            default=corrected_query,
+        )
 
-    
-    web_content= await run_web_search(query)
-    if not web_content:
-        return {
+    # with WEB_SEARCH_POLICY=always the search doesn't wait for the gate:
+    # start it now, concurrent with embedding and retrieval
+    web_task = req.get("web_task")
+    owns_web = web_task is None and settings.WEB_SEARCH_POLICY == "always"
+    if owns_web:
+        web_task = asyncio.ensure_future(
+            run_stage("web_search", run_web_search(search_query, domain=domain), settings.WEB_SEARCH_TIMEOUT, default="")
+        )
+
+    # ===== EMBEDDING =====
+    # a slow or failing embedding provider degrades retrieval to BM25 only
+    if "q_emb" in req:
+        q_emb = req["q_emb"]
+    else:
+        q_emb = await run_stage(
+            "embed", run_blocking(lambda: get_model().embed_query(search_query)), settings.EMBED_TIMEOUT
+        )
+
+    # ===== SEMANTIC ANSWER CACHE =====
+    # only standalone questions: with chat context the answer depends on it
+    if standalone and settings.ANSWER_CACHE_ENABLED and q_emb is not None:
+        cached, sim = answer_cache.get(q_emb, cache_mode, domain)
+        if cached is not None:
+            if owns_web:
+                web_task.cancel()
+            RETRIEVAL_PATHS.inc(path="cache")
+            cached.update(original_query=original_query, corrected_query=corrected_query,
+                          cache_hit=True, cache_similarity=round(sim, 4))
+            yield {"event": "token", "data": cached["answer"]}
+            yield {"event": "references", "data": cached["references"]}
+            yield {"event": "done", "data": cached}
+            return
+
+    # ===== RETRIEVAL =====
+    if "results" in req:
+        results = req["results"]
+    else:
+        results = await run_stage(
+            "retrieve",
+            run_blocking(retrieve, search_query, domain, q_emb, q_emb is None),
+            settings.RETRIEVE_TIMEOUT,
+        )
+
+    # ===== WEB SEARCH GATE =====
+    # confident paper matches skip the external search; no matches go web-only.
+    # Papers below MIN_SIM are never packed or cited, whichever path is taken
+    results = evidence_rows(results)
+    path = retrieval_path(results)
+    confidence = corpus_confidence(results)
+    web_content = ""
+    if path in (CORPUS_WEB, WEB_ONLY):
+        if web_task is not None:
+            web_content = await (web_task if owns_web else asyncio.shield(web_task))
+        else:
+            web_content = await run_stage(
+                "web_search", run_web_search(search_query, domain=domain), settings.WEB_SEARCH_TIMEOUT, default=""
+            )
+        if not web_content:
+            # nothing from Tavily: answer from the papers alone
+            path = CORPUS if results else NO_EVIDENCE
+    elif owns_web:
+        web_task.cancel()
+    RETRIEVAL_PATHS.inc(path=path)
+    log.debug("retrieval path", path=path, confidence=confidence, web_chars=len(web_content))
+
+    if path == NO_EVIDENCE:
+        yield {"event": "done", "data": {
             "original_query": original_query,
             "corrected_query": corrected_query,
-            "answer": "Sorry, I couldn't find relevant web content.",
+            "answer": "Sorry, I couldn't find relevant papers or web content.",
             "references": [],
-            "mode": mode
-        }
-    print(web_content)
+            "mode": mode,
+            "retrieval_path": path,
+            "cache_hit": False
+        }}
+        return
+
+    # ===== CONTEXT PACKING =====
+    packed = PackedContext("", [], 0, 0)
+    if results:
+        packed = await run_stage(
+            "pack_context",
+            run_blocking(build_context, search_query, results, q_emb, mode),
+            settings.RETRIEVE_TIMEOUT,
+        )
+        if packed is None:
+            packed = whole_paper_context(results, mode)
+    sources = f"Sources:\n{packed.text}\n" if packed.text else ""
+    web_results = f"web search results: {web_content}\n" if web_content else ""
+    path_fields = {"retrieval_path": path,
+                   "corpus_confidence": None if confidence is None else round(confidence, 4)}
+
     # -------- SIMPLE MODE --------
     if mode == "simple":
-        context = "\n\n".join([r[3] for r in results[:8]])
-        best = results[0]
-
-        
         prompt = f"""
 Answer in 15-20 short sentences using only these sources.
 Do NOT mention titles, authors, or years.
 
 Question: {query}
-Sources: {context}
-web search results: {web_content}
-Answer:
+{sources}{web_results}Answer:
 """
 
-        
-        
-        llm= ChatGoogleGenerativeAI(model="gemini-2.5-flash-lite")
-        resp= llm.invoke(prompt)
+        answer_text = ""
+        async for token in stream_llm(prompt, "generate_simple"):
+            answer_text += token
+            yield {"event": "token", "data": token}
 
-        answer_text = resp.content
+        # web-only answers have no paper to cite
+        refs = [make_ref(best[0], best[1], best[2]) for best in results[:1]] if results else []
+        yield {"event": "references", "data": refs}
         # Add the single reference for simple mode
-        answer_text += f"\n\nReference: {make_ref(best[0], best[1], best[2])}"
+        if refs:
+            answer_text += f"\n\nReference: {refs[0]}"
 
-        return {
+        result = {
             "original_query": original_query,
             "corrected_query": corrected_query,
             "answer": answer_text,
-            "references": [make_ref(best[0], best[1], best[2])],
-            "mode": "simple"
+            "references": refs,
+            "mode": "simple",
+            "prompt_tokens": count_tokens(prompt),
+            **path_fields,
+            "cache_hit": False
         }
+        if standalone:
+            store_answer(q_emb, cache_mode, domain, result)
+        yield {"event": "done", "data": result}
+        return
 
     # -------- DEEP MODE --------
-    context = ""
-    refs = []
-    used = set()
-
-    if results:
-        for row in results:
-            pid = row[4]
-            if pid in used or len(refs) >= 4:
-                continue
-            used.add(pid)
-            context += row[3] + "\n\n"
-            refs.append(make_ref(row[0], row[1], row[2]))
+    # sources are numbered [n] in citation order: [n] -> refs[n - 1]
+    refs = [make_ref(row[0], row[1], row[2]) for row in packed.papers]
 
     prompt = f"""
 You are an expert researcher.
 Give a detailed answer 30-35 lines using only these sources.
 
 Question: {query}
-Sources:
-{context}
-web search results: {web_content}
-
-Answer in clear paragraphs.
+{sources}{web_results}
+Answer in clear paragraphs, citing sources by their [n] number.
 End with "References are listed below."
+"""
+    if strategy == "structured":
+        prompt += f"""Then, on a new line, write "{CONCLUSION_MARKER}" followed by a 3-4 line summary of your answer.
 """
 
-    llm= ChatGoogleGenerativeAI(model="gemini-2.5-flash-lite")
-    resp= llm.invoke(prompt)
-
-    answer_text = resp.content
+    answer_text = ""
+    summary_text = ""
+    async for part, token in split_on_marker(stream_llm(prompt, "generate_deep"), CONCLUSION_MARKER):
+        if part == "conclusion":
+            summary_text += token
+            continue
+        answer_text += token
+        yield {"event": "token", "data": token}
+    answer_text = answer_text.rstrip()
+    summary_text = summary_text.strip()
+    yield {"event": "references", "data": refs}
 
     # Summarize
-    summary_prompt = f"""
+    if strategy == "two_call":
+        summary_prompt = f"""
 Summarize the above answer in 3-4 lines.
 Answer:
 {answer_text}
 Summary:
 """
-    llm= ChatGoogleGenerativeAI(model="gemini-2.5-flash-lite")
-    resp= llm.invoke(summary_prompt)
+        summary_text = await complete_llm(summary_prompt, "summarize")
+    elif not summary_text:
+        # extractive strategy, or the model skipped the conclusion section
+        with span("summarize"):
+            summary_text = extractive_summary(answer_text)
 
-    summary_text = resp.content
+    yield {"event": "conclusion", "data": summary_text}
     answer_text += f"\n\nConclusion:\n{summary_text}"
 
-    return {
+    result = {
         "original_query": original_query,
         "corrected_query": corrected_query,
         "answer": answer_text,
         "references": refs,
-        "mode": "deep"
-    }
\ No newline at end of file
+        "mode": "deep",
+        "summary_strategy": strategy,
+        "prompt_tokens": count_tokens(prompt),
+        **path_fields,
+        "cache_hit": False
+    }
+    if standalone:
+        store_answer(q_emb, cache_mode, domain, result)
+    yield {"event": "done", "data": result}
+
+
+async def answer_query(req):
+    result = None
+    with span("answer_query"):
+        async for event in answer_events(req):
+            if event["event"] == "done":
+                result = event["data"]
+    return result
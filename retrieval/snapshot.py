@@ -0,0 +1,478 @@
+"""
+Versioned, memory-mapped corpus snapshots shared by all workers on a host.
+
+    SNAPSHOT_DIR/
+        CURRENT                 name of the live version (replaced atomically)
+        .publish.lock           flock held by the one process publishing
+        v0000000042/
+            manifest.json       version, watermark, rows, dim, domain slices
+            embeddings.npy      row-normalized float32 (rows, dim), grouped by domain
+            meta.bin/.idx.npy   per-row JSON [title, authors, year, paperid, domain, watermark]
+            text.bin/.idx.npy   enriched_text, utf-8 blob + int64 offset table
+            bm25-<k>.*          packed BM25 postings per domain partition
+            ivf.*.npy           IVF centroids and inverted lists (retrieval.ivf)
+
+Every file is opened with mmap, so loading costs a few syscalls and the pages
+are shared through the OS page cache instead of copied into each worker.
+A version directory is written under a temporary name and renamed into
+place before CURRENT is switched, so readers never see a partial snapshot.
+
+Publishing runs outside the serving workers: the background sync
+(sync_forever) starts a publisher process (python -m retrieval.snapshot
+sync) when none is running, which re-fetches papers whose watermark column
+is newer than the snapshot's (minus SNAPSHOT_SYNC_LAG, for writers that
+commit late), merges them by paperid and publishes the next version; every
+worker then swaps to it without a restart. An ingestion run publishes on
+its own when it finishes (publish()). The IVF lists are carried over:
+changed papers are assigned to the trained centroids instead of re-running
+k-means (until the lists go stale). Deletions need a full rebuild
+(python -m retrieval.snapshot build). The watermark column:
+
+    ALTER TABLE papers ADD COLUMN updated_at timestamptz NOT NULL DEFAULT now();
+    CREATE INDEX papers_updated_at ON papers (updated_at);
+    CREATE FUNCTION touch_updated_at() RETURNS trigger AS $$
+        BEGIN NEW.updated_at = now(); RETURN NEW; END $$ LANGUAGE plpgsql;
+    CREATE TRIGGER papers_touch BEFORE UPDATE ON papers
+        FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+"""
+import asyncio
+import fcntl
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from config import settings
+from retrieval.bm25 import BM25Index, BM25Partition
+from retrieval.ivf import IVFIndex, ivf_enabled
+from retrieval.index import (
+    PAPER_COLUMNS, PaperIndex, fetch_papers, fetch_rows, group_by_domain, normalize_rows,
+    parse_embedding,
+)
+from logs import get_logger, error_fields
+
+log = get_logger("snapshot")
+
+FORMAT = 1
+CURRENT = "CURRENT"
+LOCK_FILE = ".publish.lock"
+
+
+def _domain_pairs(value):
+    """Per-domain manifest entries as [domain, ...] lists (older manifests used objects)."""
+    return [[d, *(v if isinstance(v, list) else [v])] for d, v in value.items()] if isinstance(value, dict) else value
+
+
+class StringTable:
+    """utf-8 strings in one blob plus an int64 offsets table, both memory-mapped."""
+
+    def __init__(self, prefix: str):
+        self.offsets = np.load(prefix + ".idx.npy", mmap_mode="r")
+        size = int(self.offsets[-1])
+        self.blob = np.memmap(prefix + ".bin", dtype=np.uint8, mode="r") if size else b""
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    @staticmethod
+    def write(strings, prefix: str):
+        offsets = [0]
+        with open(prefix + ".bin", "wb") as f:
+            for s in strings:
+                data = s.encode("utf-8")
+                f.write(data)
+                offsets.append(offsets[-1] + len(data))
+            _sync(f)
+        _save(prefix + ".idx.npy", np.asarray(offsets, dtype=np.int64))
+
+
+class SnapshotMeta:
+    """PaperIndex.meta over the mapped tables: (title, authors, year, text, paperid, domain)."""
+
+    def __init__(self, meta: StringTable, text: StringTable):
+        self.table = meta
+        self.text = text
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, i):
+        title, authors, year, pid, domain, _ = json.loads(self.table[i])
+        return title, authors, year, self.text[i], pid, domain
+
+    def key(self, i):
+        """(paperid, watermark column value) without decoding the text."""
+        record = json.loads(self.table[i])
+        return record[3], record[5]
+
+
+class Snapshot:
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest["format"] != FORMAT:
+            raise ValueError(f"Unsupported snapshot format: {self.manifest['format']}")
+        self.version = self.manifest["version"]
+        self.watermark = self.manifest["watermark"]
+        self.slices = {d: tuple(span) for d, *span in _domain_pairs(self.manifest["slices"])}
+        self.matrix = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        self.meta = SnapshotMeta(StringTable(os.path.join(path, "meta")),
+                                 StringTable(os.path.join(path, "text")))
+
+    def __len__(self):
+        return len(self.meta)
+
+    def lexical(self) -> BM25Index:
+        bm25 = self.manifest["bm25"]
+        partitions = {}
+        for domain, k in _domain_pairs(bm25["partitions"]):
+            prefix = os.path.join(self.path, f"bm25-{k}")
+            with open(prefix + ".terms.json", encoding="utf-8") as f:
+                terms = json.load(f)
+            arrays = {name: np.load(f"{prefix}.{name}.npy", mmap_mode="r")
+                      for name in ("offsets", "ids", "tfs", "idf", "norm")}
+            partitions[domain] = BM25Partition.unpack(terms, arrays, bm25["k1"], bm25["b"])
+        return BM25Index.from_partitions(self.meta, self.slices, partitions)
+
+    def ivf(self):
+        """The published IVF index, or None when the snapshot has none."""
+        info = self.manifest.get("ivf")
+        if info is None:
+            return None
+        arrays = {name: np.load(os.path.join(self.path, f"ivf.{name}.npy"), mmap_mode="r")
+                  for name in ("centroids", "list_domains", "offsets", "rows", "domain_centroids")}
+        return IVFIndex.unpack(info, arrays)
+
+    def row(self, i) -> dict:
+        """papers-table row i (embedding as a mapped vector), for merging."""
+        title, authors, year, text, pid, domain = self.meta[i]
+        return {"title": title, "authors": authors, "year": year, "enriched_text": text,
+                "paperid": pid, "domain": domain, "embedding": self.matrix[i],
+                watermark_column(): self.meta.key(i)[1], "_row": i}
+
+
+def _sync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def _save(path: str, array):
+    with open(path, "wb") as f:
+        np.save(f, array)
+        _sync(f)
+
+
+def _write_json(path: str, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+        _sync(f)
+
+
+def watermark_column():
+    return settings.SNAPSHOT_WATERMARK_COLUMN or "updated_at"
+
+
+def snapshot_columns():
+    if settings.SNAPSHOT_WATERMARK_COLUMN:
+        return f"{PAPER_COLUMNS}, {settings.SNAPSHOT_WATERMARK_COLUMN}"
+    return PAPER_COLUMNS
+
+
+def versions(directory: str):
+    """Published version numbers, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(int(name[1:]) for name in os.listdir(directory)
+                  if name.startswith("v") and name[1:].isdigit())
+
+
+def current_version(directory: str = None):
+    try:
+        with open(os.path.join(directory or settings.SNAPSHOT_DIR, CURRENT), encoding="utf-8") as f:
+            return int(f.read().strip()[1:])
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def open_snapshot(directory: str = None, version: int = None):
+    """The live (or a given) snapshot, or None when nothing is published yet."""
+    directory = directory or settings.SNAPSHOT_DIR
+    version = current_version(directory) if version is None else version
+    if version is None:
+        return None
+    return Snapshot(os.path.join(directory, f"v{version:010d}"))
+
+
+@contextmanager
+def publish_lock(directory: str = None, blocking: bool = True):
+    """Host-wide publisher lock; yields False when non-blocking and held elsewhere."""
+    directory = directory or settings.SNAPSHOT_DIR
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_FILE), "a+") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def carry_ivf(previous, matrix, meta, rows):
+    """
+    The previous version's IVF renumbered to the new layout, with rows that
+    have no "_row" (new or changed papers) assigned to its trained centroids.
+    """
+    mapping = np.full(max((int(ids.max()) + 1 for ids in previous.lists if len(ids)), default=0), -1)
+    fresh = []
+    for i, r in enumerate(rows):
+        old = r.get("_row")
+        if old is None:
+            fresh.append(i)
+        elif old < len(mapping):
+            mapping[old] = i
+    previous.remap(mapping)
+    if fresh:
+        previous.add(matrix[fresh], fresh, [meta[i][5] for i in fresh])
+    return previous
+
+
+def write_snapshot(directory: str, rows, watermark=None, ivf=None) -> int:
+    """
+    Write rows (papers-table dicts) as the next version and make it live.
+    ivf: the previous version's IVFIndex to carry over. Call under publish_lock.
+    """
+    started = time.perf_counter()
+    meta, slices, rows = group_by_domain(rows)
+    vectors = [parse_embedding(r["embedding"]) for r in rows]
+    matrix = normalize_rows(np.vstack(vectors).astype(np.float32)) if vectors else np.zeros((0, 0), np.float32)
+
+    version = max(versions(directory), default=0) + 1
+    name = f"v{version:010d}"
+    tmp = os.path.join(directory, f".tmp-{name}-{os.getpid()}")
+    os.makedirs(tmp)
+
+    _save(os.path.join(tmp, "embeddings.npy"), matrix)
+    column = watermark_column()
+    StringTable.write((json.dumps([m[0], m[1], m[2], m[4], m[5], r.get(column)], default=str)
+                       for m, r in zip(meta, rows)), os.path.join(tmp, "meta"))
+    StringTable.write((m[3] or "" for m in meta), os.path.join(tmp, "text"))
+
+    lexical = BM25Index(meta, slices)
+    partitions = []
+    for k, (domain, part) in enumerate(lexical.partitions.items()):
+        prefix = os.path.join(tmp, f"bm25-{k}")
+        terms, arrays = part.pack()
+        _write_json(prefix + ".terms.json", terms)
+        for array_name, array in arrays.items():
+            _save(f"{prefix}.{array_name}.npy", array)
+        partitions.append([domain, k])
+
+    if not ivf_enabled(len(meta)):
+        ivf = None
+    elif ivf is None or ivf.stale():
+        ivf = IVFIndex.train(matrix, slices)
+    else:
+        ivf = carry_ivf(ivf, matrix, meta, rows)
+    ivf_info = None
+    if ivf is not None:
+        ivf_info, arrays = ivf.pack()
+        for array_name, array in arrays.items():
+            _save(os.path.join(tmp, f"ivf.{array_name}.npy"), array)
+
+    _write_json(os.path.join(tmp, "manifest.json"), {
+        "format": FORMAT,
+        "version": version,
+        "watermark": watermark,
+        "rows": len(meta),
+        "dim": int(matrix.shape[1]) if len(matrix) else 0,
+        # [domain, ...] lists rather than objects: a paper's domain may be None
+        "slices": [[d, *span] for d, span in slices.items()],
+        "bm25": {"k1": 1.2, "b": 0.75, "partitions": partitions},
+        "ivf": ivf_info,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    })
+
+    # the version directory appears complete or not at all, then goes live
+    os.rename(tmp, os.path.join(directory, name))
+    pointer = os.path.join(directory, f".{CURRENT}.{os.getpid()}")
+    with open(pointer, "w", encoding="utf-8") as f:
+        f.write(name)
+        _sync(f)
+    os.replace(pointer, os.path.join(directory, CURRENT))
+
+    # workers still on an old version keep their mappings after the unlink
+    for old in versions(directory)[:-max(1, settings.SNAPSHOT_KEEP)]:
+        shutil.rmtree(os.path.join(directory, f"v{old:010d}"), ignore_errors=True)
+
+    log.info("snapshot published", version=version, rows=len(meta), watermark=watermark,
+             seconds=round(time.perf_counter() - started, 3))
+    return version
+
+
+def _max_watermark(rows, current=None):
+    stamps = [r[watermark_column()] for r in rows if r.get(watermark_column()) is not None]
+    if current is not None:
+        stamps.append(current)
+    return max(stamps, default=None)
+
+
+def build(supabase, directory: str = None) -> int:
+    """Full rebuild from the papers table (also drops deleted papers). Call under publish_lock."""
+    directory = directory or settings.SNAPSHOT_DIR
+    rows = fetch_papers(supabase, columns=snapshot_columns())
+    return write_snapshot(directory, rows, _max_watermark(rows) if settings.SNAPSHOT_WATERMARK_COLUMN else None)
+
+
+def _since(watermark):
+    """The watermark minus SNAPSHOT_SYNC_LAG, as the same ISO timestamp text."""
+    try:
+        stamp = datetime.fromisoformat(str(watermark).replace("Z", "+00:00"))
+    except ValueError:
+        return watermark
+    return (stamp - timedelta(seconds=settings.SNAPSHOT_SYNC_LAG)).isoformat()
+
+
+def publish_changes(supabase, directory: str = None):
+    """
+    Merge papers changed since the live snapshot's watermark into a new
+    version. Returns the new version, or None when nothing changed. Call
+    under publish_lock.
+    """
+    directory = directory or settings.SNAPSHOT_DIR
+    current = open_snapshot(directory)
+    if current is None:
+        return build(supabase, directory)
+    column = settings.SNAPSHOT_WATERMARK_COLUMN
+    if not column or current.watermark is None:
+        return None
+
+    since = _since(current.watermark)
+    changed = fetch_rows(supabase, "papers", snapshot_columns(), order=(column, "paperid"),
+                         where=lambda q: q.gte(column, since))
+    if not changed:
+        return None
+
+    # the lag window re-reads rows already in the snapshot: keep only real changes
+    position, stamps = {}, {}
+    for i in range(len(current)):
+        pid, stamp = current.meta.key(i)
+        position[str(pid)] = i
+        stamps[str(pid)] = str(stamp)
+    fresh = [r for r in changed if stamps.get(str(r["paperid"])) != str(r[column])]
+    if not fresh:
+        return None
+
+    replaced = {str(r["paperid"]) for r in fresh}
+    rows = [current.row(i) for pid, i in position.items() if pid not in replaced] + fresh
+    log.info("snapshot sync", changed=len(fresh), since=since)
+    return write_snapshot(directory, rows, _max_watermark(changed, current.watermark), ivf=current.ivf())
+
+
+def publish(supabase, directory: str = None):
+    """
+    After an ingestion run: merge the changes, or rebuild when there is no
+    watermark to sync from (no column, or no snapshot with one yet). Call
+    under publish_lock.
+    """
+    current = open_snapshot(directory) if settings.SNAPSHOT_WATERMARK_COLUMN else None
+    if current is not None and current.watermark is not None:
+        return publish_changes(supabase, directory)
+    return build(supabase, directory)
+
+
+def load_index(supabase) -> PaperIndex:
+    """PaperIndex over the live snapshot; the first process on the host publishes it."""
+    snapshot = open_snapshot()
+    if snapshot is None:
+        # one worker downloads the papers table, the others wait and map it
+        with publish_lock():
+            if current_version(settings.SNAPSHOT_DIR) is None:
+                build(supabase)
+        snapshot = open_snapshot()
+    return PaperIndex.from_snapshot(snapshot)
+
+
+def publisher_idle(directory: str = None) -> bool:
+    """True when no process on the host holds the publish lock."""
+    with publish_lock(directory, blocking=False) as held:
+        return held
+
+
+async def run_publisher(directory: str = None):
+    """Publish pending changes in a child process (python -m retrieval.snapshot sync)."""
+    directory = directory or settings.SNAPSHOT_DIR
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "retrieval.snapshot", "sync", "--dir", directory,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    _, err = await proc.communicate()
+    if proc.returncode:
+        log.warning("snapshot publisher failed", code=proc.returncode, detail=err.decode()[-500:])
+
+
+def follow_current() -> bool:
+    """Swap to CURRENT if it is newer than the loaded index. Returns True on a swap."""
+    from retrieval import index as index_mod
+
+    version = current_version()
+    loaded = index_mod._index
+    if version is None or loaded is None or loaded.version == version:
+        return False
+    index_mod.swap_index(PaperIndex.from_snapshot(open_snapshot(version=version)))
+    log.info("swapped to snapshot", version=version, previous=loaded.version)
+    return True
+
+
+async def sync_forever(run_blocking, on_swap=None):
+    """
+    Background task: every SNAPSHOT_SYNC_INTERVAL seconds start a publisher
+    process unless one is running (the fetch, merge and rebuild never use
+    this worker's threads), then follow CURRENT.
+    """
+    while True:
+        await asyncio.sleep(settings.SNAPSHOT_SYNC_INTERVAL)
+        try:
+            if settings.SNAPSHOT_WATERMARK_COLUMN and publisher_idle():
+                await run_publisher()
+            if await run_blocking(follow_current) and on_swap is not None:
+                on_swap()
+        except Exception as e:
+            log.warning("snapshot sync failed", **error_fields(e))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build / sync / inspect the corpus snapshot")
+    parser.add_argument("command", choices=["build", "sync", "info"])
+    parser.add_argument("--dir", default=settings.SNAPSHOT_DIR)
+    args = parser.parse_args()
+    if not args.dir:
+        parser.error("set SNAPSHOT_DIR or pass --dir")
+
+    if args.command == "info":
+        snapshot = open_snapshot(args.dir)
+        print(json.dumps(snapshot.manifest if snapshot else None, indent=2))
+    else:
+        from supabaseclient import get_client
+        # a build waits for the lock; a sync has nothing to do while another runs
+        with publish_lock(args.dir, blocking=args.command == "build") as held:
+            if not held:
+                version = None
+            elif args.command == "build":
+                version = build(get_client(), args.dir)
+            else:
+                version = publish_changes(get_client(), args.dir)
+        print(json.dumps({"version": version, "versions": versions(args.dir), "busy": not held}))
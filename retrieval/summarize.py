@@ -0,0 +1,44 @@
+import re
+from collections import Counter
+
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+WORD_RE = re.compile(r"[a-z][a-z\-]+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "been", "but", "by", "can", "for",
+    "from", "has", "have", "in", "into", "is", "it", "its", "of", "on", "or",
+    "that", "the", "their", "these", "this", "those", "to", "was", "were",
+    "which", "while", "with", "also", "such", "more", "may", "not", "than",
+    "they", "them", "there", "other", "use", "used", "using", "both", "each",
+}
+
+
+def split_sentences(text: str):
+    text = re.sub(r"\s+", " ", text).strip()
+    return [s for s in SENTENCE_RE.split(text) if len(s.split()) >= 4]
+
+
+def extractive_summary(text: str, n: int = 3) -> str:
+    """
+    Pick the n most central sentences (average content-word frequency)
+    and return them in their original order.
+    """
+    sentences = [s for s in split_sentences(text) if "references are listed below" not in s.lower()]
+    if len(sentences) <= n:
+        return " ".join(sentences)
+
+    freq = Counter(
+        w for w in WORD_RE.findall(text.lower()) if w not in STOPWORDS
+    )
+    if not freq:
+        return " ".join(sentences[:n])
+    top = max(freq.values())
+
+    def score(sentence):
+        words = [w for w in WORD_RE.findall(sentence.lower()) if w not in STOPWORDS]
+        if not words:
+            return 0.0
+        return sum(freq[w] / top for w in words) / len(words) ** 0.5
+
+    ranked = sorted(range(len(sentences)), key=lambda i: score(sentences[i]), reverse=True)
+    return " ".join(sentences[i] for i in sorted(ranked[:n]))
@@ -0,0 +1,107 @@
+import asyncio
+import re
+import time
+from cache import TTLCache
+from config import settings
+from logs import get_logger, error_fields
+from metrics import REGISTRY
+
+log = get_logger("web_search")
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query.strip().lower())
+
+
+def parse_freshness(spec: str):
+    """'NLP=3600;VLSI in Power Electronics and Embedded Systems=86400' -> dict."""
+    windows = {}
+    for part in (spec or "").split(";"):
+        if "=" in part:
+            domain, seconds = part.rsplit("=", 1)
+            windows[domain.strip()] = float(seconds)
+    return windows
+
+
+def format_results(results) -> str:
+    return "\n\n".join(
+        [
+            f"Title: {item.get('title')}\nURL: {item.get('url')}\nSnippet: {item.get('content')}"
+            for item in results
+        ]
+    )
+
+
+class WebSearchCache:
+    """
+    Tavily results by normalized query, with:
+    - LRU + TTL eviction and a per-domain freshness window on reads
+    - single-flight: concurrent identical searches share one outbound call
+    - negative caching: provider errors are remembered briefly as "no results"
+    """
+
+    def __init__(self):
+        self.freshness = parse_freshness(settings.WEB_FRESHNESS)
+        max_window = max([settings.WEB_CACHE_TTL] + list(self.freshness.values()))
+        self.results = TTLCache(maxsize=settings.WEB_CACHE_SIZE, ttl=max_window)
+        self.inflight = {}
+        self.tools = {}
+        self.calls = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def window(self, domain: str) -> float:
+        return self.freshness.get(domain, settings.WEB_CACHE_TTL)
+
+    def tool(self, k: int):
+        if k not in self.tools:
+            from langchain_community.tools.tavily_search import TavilySearchResults
+
+            self.tools[k] = TavilySearchResults(k=k)
+        return self.tools[k]
+
+    async def _fetch(self, key, query: str, k: int) -> str:
+        self.calls += 1
+        try:
+            results = await self.tool(k).ainvoke(query)
+            if isinstance(results, str):
+                # the LangChain tool reports provider errors as a string
+                raise RuntimeError(results)
+            formatted = format_results(results) if results else ""
+            self.results.set(key, (formatted, time.monotonic()))
+            return formatted
+        except Exception as e:
+            self.errors += 1
+            log.warning("tavily error, caching empty result", **error_fields(e))
+            self.results.set(key, ("", time.monotonic()), ttl=settings.WEB_NEGATIVE_TTL)
+            return ""
+        finally:
+            self.inflight.pop(key, None)
+
+    async def search(self, query: str, k: int = 4, domain: str = "all") -> str:
+        key = (normalize_query(query), k)
+
+        cached = self.results.get(key)
+        if cached is not None:
+            formatted, fetched = cached
+            if time.monotonic() - fetched <= self.window(domain):
+                return formatted
+
+        task = self.inflight.get(key)
+        if task is None:
+            # run the call as its own task so a caller timing out or
+            # disconnecting doesn't cancel it for the other waiters
+            task = asyncio.ensure_future(self._fetch(key, query, k))
+            self.inflight[key] = task
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self):
+        stats = self.results.stats()
+        stats.update(calls=self.calls, coalesced=self.coalesced, errors=self.errors)
+        return stats
+
+
+web_cache = WebSearchCache()
+REGISTRY.register_cache("web", web_cache.stats)
@@ -0,0 +1,23 @@
+import json
+from fastapi.responses import StreamingResponse
+
+
+def format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _encode(events):
+    try:
+        async for e in events:
+            yield format_sse(e["event"], e["data"])
+    except Exception as e:
+        yield format_sse("error", {"detail": f"{type(e).__name__}: {str(e)}"})
+
+
+def event_stream(events):
+    """Wrap an async generator of {"event", "data"} dicts as a text/event-stream."""
+    return StreamingResponse(
+        _encode(events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,10 +1,26 @@
 import os
-from supabase import create_client, Client
+import threading
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_API_KEY = os.getenv("SUPABASE_KEY")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_API_KEY)
+# created on first use (or during warmup) rather than at import, so a worker
+# starts fast and a missing setting fails the request / readiness check
+# instead of the import
+supabase = None
+_lock = threading.Lock()
+
 
 def get_client():
-    return supabase
\ No newline at end of file
+    global supabase
+    if supabase is None:
+        with _lock:
+            if supabase is None:
+                from supabase import create_client
+
+                url = SUPABASE_URL or os.getenv("SUPABASE_URL")
+                key = SUPABASE_API_KEY or os.getenv("SUPABASE_KEY")
+                if not url or not key:
+                    raise RuntimeError("SUPABASE_URL and SUPABASE_KEY must be set")
+                supabase = create_client(url, key)
+    return supabase
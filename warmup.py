@@ -0,0 +1,123 @@
+import asyncio
+import time
+from config import settings
+from logs import get_logger, error_fields
+from metrics import record_stage
+
+# first import of this module ~ start of the worker's app import
+IMPORT_STARTED = time.perf_counter()
+
+log = get_logger("warmup")
+
+state = {
+    "ready": False,
+    "attempts": 0,
+    "import_s": None,      # app import, up to the lifespan hook
+    "warmup_s": None,      # lifespan hook -> ready
+    "cold_start_s": None,  # app import -> ready
+    "steps": {},
+}
+
+
+def _supabase():
+    from supabaseclient import get_client
+    get_client()
+
+
+def _index():
+    from supabaseclient import get_client
+    from retrieval.index import get_index, get_lexical_index
+    from retrieval.passages import get_passage_index
+    if settings.RETRIEVAL_BACKEND == "pgvector":
+        from database.connection import get_pool
+        get_pool()
+        get_lexical_index(get_client())
+    else:
+        get_index(get_client())
+    get_passage_index(get_client())
+
+
+def _embeddings():
+    from retrieval.retriever import get_model
+    # one real call opens the HTTP connection; the vector is cached afterwards
+    get_model().embed_query("warmup")
+
+
+def _llm():
+    from retrieval.llm import get_provider
+    get_provider()
+
+
+def _web():
+    from retrieval.web_search import web_cache
+    web_cache.tool(4)
+
+
+def _vocabulary():
+    from autocorrect import load_vocabulary
+    load_vocabulary()
+
+
+def _auth():
+    from auth.utils import get_hash_pool
+    # spawns a hashing worker now instead of on the first login
+    get_hash_pool().submit(abs, 0).result()
+
+
+# (name, fn, required): readiness waits for the required steps; the others
+# only log a warning and are retried lazily on first use
+STEPS = [
+    ("supabase", _supabase, True),
+    ("index", _index, True),
+    ("embeddings", _embeddings, False),
+    ("llm", _llm, False),
+    ("web_search", _web, False),
+    ("vocabulary", _vocabulary, False),
+    ("auth", _auth, False),
+]
+
+
+async def _run_step(name, fn, run_blocking):
+    t0 = time.perf_counter()
+    try:
+        await run_blocking(fn)
+        ok, error = True, None
+    except Exception as e:
+        ok, error = False, error_fields(e)
+    seconds = time.perf_counter() - t0
+    record_stage(f"warmup_{name}", seconds)
+    state["steps"][name] = {"ok": ok, "seconds": round(seconds, 3), **({"error": error} if error else {})}
+    return ok
+
+
+async def warm_up():
+    """
+    Build clients, load the resident indexes and open connections before the
+    worker reports ready. Required steps are retried with backoff until they
+    succeed; optional ones are attempted once.
+    """
+    from retrieval.retriever import run_blocking
+
+    started = time.perf_counter()
+    state["import_s"] = round(started - IMPORT_STARTED, 3)
+    if not settings.WARMUP_ENABLED:
+        state["ready"] = True
+        return
+
+    pending = STEPS
+    while True:
+        state["attempts"] += 1
+        oks = await asyncio.gather(*[_run_step(name, fn, run_blocking) for name, fn, _ in pending])
+        failed = [step for step, ok in zip(pending, oks) if not ok]
+        for name, _, required in failed:
+            log.warning("warmup step failed", step=name, required=required, **state["steps"][name]["error"])
+        pending = [step for step in failed if step[2]]
+        if not pending:
+            break
+        await asyncio.sleep(min(2 ** state["attempts"], 30))
+
+    now = time.perf_counter()
+    state["warmup_s"] = round(now - started, 3)
+    state["cold_start_s"] = round(now - IMPORT_STARTED, 3)
+    state["ready"] = True
+    log.info("ready", warmup_s=state["warmup_s"], cold_start_s=state["cold_start_s"])